@@ -0,0 +1,105 @@
+import logging
+import time
+from collections import Counter
+
+from telegram import Update
+from telegram.ext import ApplicationHandlerStop, ContextTypes, TypeHandler
+
+logger = logging.getLogger(__name__)
+
+
+class AntiFlood:
+    """
+    Фильтр перед всеми обработчиками (группа -1):
+    - повторное нажатие той же кнопки тем же пользователем в течение duplicate_window
+      отбрасывается, на callback_query отвечаем пустым answer();
+    - команды и нажатия кнопок ограничены token bucket на пользователя:
+      burst запросов сразу, дальше rate запросов в секунду.
+    Отброшенные обновления не доходят до БД и не вызывают edit_message_text.
+    """
+
+    # Как часто чистить записи неактивных пользователей
+    PRUNE_EVERY = 1000
+
+    def __init__(self, rate=1.0, burst=5, duplicate_window=2.0, exempt_ids=()):
+        self.rate = rate
+        self.burst = burst
+        self.duplicate_window = duplicate_window
+        self.exempt_ids = set(exempt_ids)
+        # user_id -> [tokens, last_refill]
+        self._buckets = {}
+        # user_id -> (callback_data, message_id, time)
+        self._last_callbacks = {}
+        self._checks = 0
+        self.stats = Counter()
+
+    def _take_token(self, user_id, now):
+        tokens, last = self._buckets.get(user_id, (self.burst, now))
+        tokens = min(self.burst, tokens + (now - last) * self.rate)
+        if tokens < 1:
+            self._buckets[user_id] = [tokens, now]
+            return False
+        self._buckets[user_id] = [tokens - 1, now]
+        return True
+
+    def _prune(self, now):
+        # Полное восстановление ведра занимает burst / rate секунд
+        idle = max(self.burst / self.rate, self.duplicate_window)
+        self._buckets = {k: v for k, v in self._buckets.items() if now - v[1] < idle}
+        self._last_callbacks = {
+            k: v for k, v in self._last_callbacks.items() if now - v[2] < self.duplicate_window
+        }
+
+    def check(self, user_id, callback_data=None, message_id=None, now=None):
+        """None - пропустить, иначе причина: 'duplicate' или 'throttled'"""
+        now = time.monotonic() if now is None else now
+        self._checks += 1
+        if self._checks % self.PRUNE_EVERY == 0:
+            self._prune(now)
+
+        if callback_data is not None:
+            last = self._last_callbacks.get(user_id)
+            self._last_callbacks[user_id] = (callback_data, message_id, now)
+            if last and last[0] == callback_data and last[1] == message_id \
+                    and now - last[2] < self.duplicate_window:
+                return "duplicate"
+
+        if not self._take_token(user_id, now):
+            return "throttled"
+        return None
+
+    async def __call__(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        user = update.effective_user
+        if not user or user.id in self.exempt_ids:
+            return
+
+        query = update.callback_query
+        if query:
+            kind = "callbacks"
+            message_id = query.message.message_id if query.message else None
+            verdict = self.check(user.id, query.data, message_id)
+        elif update.message and update.message.text and update.message.text.startswith("/"):
+            kind = "commands"
+            verdict = self.check(user.id)
+        else:
+            # Обычный текст (ответы в диалогах) не ограничиваем
+            return
+
+        if verdict is None:
+            self.stats[f"{kind}_passed"] += 1
+            return
+
+        self.stats[f"{kind}_{verdict}"] += 1
+        if query:
+            try:
+                # Дубликат просто гасим, при превышении лимита показываем подсказку
+                await query.answer("⏳ Слишком часто, подожди пару секунд" if verdict == "throttled" else None)
+            except Exception as e:
+                logger.debug(f"Не удалось ответить на отброшенный callback: {str(e)}")
+        raise ApplicationHandlerStop
+
+    def handler(self) -> TypeHandler:
+        return TypeHandler(Update, self)
+
+    def shed_total(self):
+        return sum(v for k, v in self.stats.items() if not k.endswith("_passed"))
@@ -0,0 +1,170 @@
+import io
+from datetime import datetime, timedelta
+
+# strftime('%w'): 0 - воскресенье
+WEEKDAY_NAMES = ["Вс", "Пн", "Вт", "Ср", "Чт", "Пт", "Сб"]
+
+TOTALS = '''
+    SUM(events), SUM(capacity), SUM(participants), SUM(registrations),
+    SUM(cancellations), SUM(full_events), SUM(minutes_to_full)
+'''
+
+# Мероприятия, начавшиеся за период: от дня since до текущего часа
+PERIOD = "day >= ? AND (day < ? OR (day = ? AND hour <= ?))"
+
+
+def period_params(days, now):
+    since = (now - timedelta(days=days)).strftime("%Y-%m-%d")
+    today = now.strftime("%Y-%m-%d")
+    return since, today, today, now.hour
+
+
+def build_report(conn, days=30, now=None):
+    """Сводка из attendance_daily и event_stats за последние days дней"""
+    now = now or datetime.now()
+    params = period_params(days, now)
+    totals = conn.execute(f"SELECT {TOTALS} FROM attendance_daily WHERE {PERIOD}", params).fetchone()
+    by_weekday = conn.execute(f'''
+        SELECT CAST(strftime('%w', day) AS INTEGER), {TOTALS}
+        FROM attendance_daily WHERE {PERIOD}
+        GROUP BY 1 HAVING SUM(events) > 0 ORDER BY 1
+    ''', params).fetchall()
+    by_hour = conn.execute(f'''
+        SELECT hour, {TOTALS}
+        FROM attendance_daily WHERE {PERIOD}
+        GROUP BY hour HAVING SUM(events) > 0 ORDER BY hour
+    ''', params).fetchall()
+    top_cancelled = conn.execute('''
+        SELECT s.event_id, s.starts_at, s.cancellations, s.registrations, COALESCE(e.info, '')
+        FROM event_stats s
+        LEFT JOIN events e ON e.id = s.event_id
+        WHERE s.starts_at >= ? AND s.starts_at <= ? AND NOT s.cancelled AND s.cancellations > 0
+        ORDER BY s.cancellations DESC, s.starts_at DESC
+        LIMIT 5
+    ''', (params[0], now.strftime("%Y-%m-%d %H:%M:%S"))).fetchall()
+    return {
+        "days": days,
+        "totals": totals,
+        "by_weekday": by_weekday,
+        "by_hour": by_hour,
+        "top_cancelled": top_cancelled,
+    }
+
+
+def fill_ratio(capacity, participants):
+    return participants / capacity if capacity else 0.0
+
+
+def format_row(label, totals):
+    events, capacity, participants, registrations, cancellations, full_events, _ = totals
+    return (
+        f"{label}: {events} сесс., заполнено {fill_ratio(capacity, participants):.0%}, "
+        f"полных {full_events}, отмен {cancellations}"
+    )
+
+
+def format_report(report):
+    events, capacity, participants, registrations, cancellations, full_events, minutes_to_full = report["totals"]
+    if not events:
+        return f"📈 За последние {report['days']} дн. прошедших сессий нет."
+
+    lines = [
+        f"📈 Статистика за {report['days']} дн.",
+        f"Сессий: {events}, мест: {capacity}, участников: {participants}",
+        f"Заполненность: {fill_ratio(capacity, participants):.0%}",
+        f"Заполнились полностью: {full_events} ({full_events / events:.0%})",
+    ]
+    if full_events:
+        lines.append(f"Среднее время до заполнения: {format_minutes(minutes_to_full / full_events)}")
+    if registrations:
+        lines.append(f"Отмен записей: {cancellations} ({cancellations / registrations:.0%} записей)")
+
+    lines.append("\nПо дням недели:")
+    # С понедельника
+    for weekday, *totals in sorted(report["by_weekday"], key=lambda row: (row[0] - 1) % 7):
+        lines.append(format_row(WEEKDAY_NAMES[weekday], totals))
+
+    lines.append("\nПо времени начала:")
+    for hour, *totals in report["by_hour"]:
+        lines.append(format_row(f"{hour:02d}:00", totals))
+
+    if report["top_cancelled"]:
+        lines.append("\nБольше всего отмен:")
+        for event_id, starts_at, cancellations, registrations, info in report["top_cancelled"]:
+            lines.append(f"{starts_at[:16]} {info[:30] or f'#{event_id}'}: {cancellations} из {registrations}")
+    return "\n".join(lines)
+
+
+def format_minutes(minutes):
+    if minutes < 60:
+        return f"{minutes:.0f} мин"
+    if minutes < 24 * 60:
+        return f"{minutes / 60:.1f} ч"
+    return f"{minutes / 1440:.1f} дн"
+
+
+def render_chart(conn, days=30, now=None):
+    """
+    PNG: заполненность по дням и тепловая карта день недели x час.
+    numpy и matplotlib - из requirements-dev.txt, в Docker-образе их нет: ImportError
+    """
+    import numpy as np
+    # Figure без pyplot: нет глобального состояния, можно из рабочего потока
+    from matplotlib.figure import Figure
+
+    now = now or datetime.now()
+    rows = conn.execute(f'''
+        SELECT day, hour, capacity, participants FROM attendance_daily
+        WHERE {PERIOD} AND events > 0
+    ''', period_params(days, now)).fetchall()
+    if not rows:
+        return None
+
+    day = np.array([row[0] for row in rows], dtype="datetime64[D]")
+    hour = np.array([row[1] for row in rows])
+    capacity = np.array([row[2] for row in rows], dtype=float)
+    participants = np.array([row[3] for row in rows], dtype=float)
+
+    # По дням: суммы по одинаковым датам
+    days_axis, day_index = np.unique(day, return_inverse=True)
+    daily_fill = np.bincount(day_index, participants) / np.maximum(np.bincount(day_index, capacity), 1)
+
+    # День недели (0 - понедельник; 1970-01-01 - четверг) x час
+    weekday = (day.astype(np.int64) + 3) % 7
+    grid_capacity = np.zeros((7, 24))
+    grid_participants = np.zeros((7, 24))
+    np.add.at(grid_capacity, (weekday, hour), capacity)
+    np.add.at(grid_participants, (weekday, hour), participants)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        grid = np.where(grid_capacity > 0, grid_participants / grid_capacity, np.nan)
+
+    figure = Figure(figsize=(9, 8))
+    top, bottom = figure.subplots(2, 1)
+    top.plot(days_axis.astype(object), daily_fill * 100, marker="o")
+    top.set_title("Заполненность по дням, %")
+    top.set_ylim(0, 105)
+    top.grid(alpha=0.3)
+    figure.autofmt_xdate()
+
+    image = bottom.imshow(grid * 100, aspect="auto", cmap="viridis", vmin=0, vmax=100)
+    bottom.set_title("Заполненность по дню недели и часу, %")
+    bottom.set_yticks(range(7), WEEKDAY_NAMES[1:] + WEEKDAY_NAMES[:1])
+    bottom.set_xticks(range(0, 24, 2))
+    figure.colorbar(image, ax=bottom)
+    figure.tight_layout()
+
+    buffer = io.BytesIO()
+    figure.savefig(buffer, format="png", dpi=100)
+    buffer.seek(0)
+    return buffer
+
+
+def build(conn, days=30):
+    """(текст отчета, PNG или None) - для вызова в отдельном потоке"""
+    now = datetime.now()
+    text = format_report(build_report(conn, days, now))
+    try:
+        chart = render_chart(conn, days, now)
+    except ImportError:
+        chart = None
+    return text, chart
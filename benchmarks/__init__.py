@@ -0,0 +1 @@
+"""Бенчмарки и нагрузочные утилиты бота. Запуск: python -m benchmarks.<модуль>"""
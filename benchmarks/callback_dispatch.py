@@ -0,0 +1,165 @@
+"""
+Маршрутизация callback-кнопок: проверка и микробенчмарк.
+
+1. Для каждой кнопки, которую выдает бот, проверяет, что нажатие попадает
+   в нужный обработчик (с учетом состояний ConversationHandler).
+2. Сравнивает стоимость выбора обработчика: таблица префиксов против
+   прежней цепочки регулярных выражений.
+
+    python -m benchmarks.callback_dispatch
+"""
+import argparse
+import re
+import sys
+import timeit
+from datetime import datetime
+
+from telegram import CallbackQuery, Chat, Message, Update, User
+from telegram.ext import CallbackQueryHandler, ConversationHandler
+
+import event_bot_main as bot
+from callback_router import pack
+
+# callback_data -> (диалог и его состояние или None, ожидаемый обработчик)
+EXPECTED_ROUTES = [
+    ("menu", None, "menu_command"),
+    ("events", None, "show_events"),
+    ("myevents", None, "my_events"),
+    ("help", None, "help_command"),
+    ("adminevents", None, "admin_events"),
+    ("createevent", None, "create_event"),
+    ("export_history", None, "start_export_flow"),
+    (pack(bot.CB_EVENT, 42), None, "event_button"),
+    (pack(bot.CB_EVENTS_NEXT, 42), None, "show_events"),
+    (pack(bot.CB_EVENTS_PREV, 42), None, "show_events"),
+    (pack(bot.CB_UNREG_CONFIRM, 42), None, "handle_unregistration"),
+    (pack(bot.CB_UNREG_CANCEL), None, "handle_unregistration"),
+    (pack(bot.CB_DETAIL, 42), None, "show_event_details"),
+    (pack(bot.CB_CANCEL_REG, 42), None, "cancel_registration"),
+    (pack(bot.CB_ADMIN_PAGE), None, "admin_events"),
+    (pack(bot.CB_ADMIN_NEXT, 42), None, "admin_events"),
+    (pack(bot.CB_ADMIN_PREV, 42), None, "admin_events"),
+    (pack(bot.CB_VIEW, 42), None, "admin_actions"),
+    (pack(bot.CB_EDIT, 42), None, "edit_event_start"),
+    (pack(bot.CB_EDIT_FIELD, 2), ("edit_event_conv", bot.EDIT_CHOICE), "edit_choice"),
+    (pack(bot.CB_EDIT_CANCEL), ("edit_event_conv", bot.EDIT_CHOICE), "cancel_edit"),
+    (pack(bot.CB_DELETE, 42), None, "admin_actions"),
+    (pack(bot.CB_DELETE_CONFIRM), ("delete_event_conv", bot.DELETE_CONFIRM), "confirm_delete"),
+    (pack(bot.CB_DELETE_CANCEL), ("delete_event_conv", bot.DELETE_CONFIRM), "cancel_edit"),
+    (pack(bot.CB_SENDMSG, 42), None, "send_message_to_participants"),
+    (pack(bot.CB_SENDLINK, 42), None, "send_link_to_participants"),
+    (pack(bot.CB_LINK_CONFIRM), ("send_link_conv", bot.CONFIRM_LINK), "confirm_link_sending"),
+    (pack(bot.CB_LINK_CANCEL), ("send_link_conv", bot.CONFIRM_LINK), "cancel_link"),
+    (pack(bot.CB_REMOVE_USER_START, 42), None, "remove_user_start"),
+    (pack(bot.CB_REMOVE_USER, 123456789), ("remove_user_conv", bot.REMOVE_USER_SELECT), "remove_user_finish"),
+    (pack(bot.CB_EXPORT_ALL), ("export_conv", bot.EXPORT_CHOICE), "handle_export_choice"),
+    (pack(bot.CB_EXPORT_CUSTOM), ("export_conv", bot.EXPORT_CHOICE), "handle_export_choice"),
+    (pack(bot.CB_EXPORT_CHANGES), ("export_conv", bot.EXPORT_CHOICE), "handle_export_choice"),
+    ("bulkevents", None, "bulk_create_start"),
+    (pack(bot.CB_BULK_CONFIRM), ("bulk_create_conv", bot.BULK_CONFIRM), "bulk_create_confirm"),
+    (pack(bot.CB_BULK_CANCEL), ("bulk_create_conv", bot.BULK_CONFIRM), "bulk_create_confirm"),
+    (pack(bot.CB_BULK_SELECT), None, "bulk_select"),
+    (pack(bot.CB_BULK_TOGGLE, 42), ("bulk_admin_conv", bot.BULK_SELECT), "bulk_select"),
+    (pack(bot.CB_BULK_TOGGLE_PAGE), ("bulk_admin_conv", bot.BULK_SELECT), "bulk_select"),
+    (pack(bot.CB_BULK_SELECT_NEXT, 42), ("bulk_admin_conv", bot.BULK_SELECT), "bulk_select"),
+    (pack(bot.CB_BULK_SELECT_PREV, 42), ("bulk_admin_conv", bot.BULK_SELECT), "bulk_select"),
+    (pack(bot.CB_BULK_CLOSE), ("bulk_admin_conv", bot.BULK_SELECT), "bulk_select"),
+    (pack(bot.CB_BULK_ACTION, 1), ("bulk_admin_conv", bot.BULK_SELECT), "bulk_action"),
+    (pack(bot.CB_BULK_DELETE_CONFIRM), ("bulk_admin_conv", bot.BULK_DELETE_CONFIRM), "bulk_delete_confirm"),
+    (pack(bot.CB_BULK_DELETE_CANCEL), ("bulk_admin_conv", bot.BULK_DELETE_CONFIRM), "bulk_delete_confirm"),
+]
+
+# Цепочка регулярок из прежнего main() в порядке регистрации
+LEGACY_PATTERNS = [
+    r"^createevent$", r"^edit_\d+$", r"^delete_\d+$", r"^sendmsg_\d+$", r"^sendlink_\d+$",
+    r"^removeuser_\d+$", r"^export_history$", r"^(confirm_unreg_\d+|cancel_unreg)$", r"^event_",
+    r"^edit_", r"^detail_", r"^cancel_", r"^delete_\d+$", r"^view_\d+$", r"^sendmsg_\d+$", r".*",
+]
+LEGACY_SAMPLES = ["event_42", "detail_42", "cancel_42", "view_42", "myevents", "confirm_unreg_42"]
+
+
+def make_update(data):
+    user = User(id=1, first_name="Bench", is_bot=False)
+    message = Message(message_id=1, date=datetime.now(), chat=Chat(id=1, type="private"))
+    query = CallbackQuery(id="1", from_user=user, chat_instance="bench", data=data, message=message)
+    return Update(update_id=1, callback_query=query)
+
+
+def resolve(application, data, conversation=None):
+    """Имя обработчика, который получит нажатие (как при обходе handlers группы 0)"""
+    update = make_update(data)
+    for handler in application.handlers[0]:
+        if isinstance(handler, ConversationHandler):
+            if conversation and handler.name == conversation[0]:
+                candidates = handler.states[conversation[1]] + handler.fallbacks
+            else:
+                candidates = handler.entry_points
+            for candidate in candidates:
+                if isinstance(candidate, CallbackQueryHandler) and candidate.check_update(update):
+                    return candidate.callback.__name__
+        elif isinstance(handler, CallbackQueryHandler) and handler.check_update(update):
+            router = getattr(handler.callback, "__self__", None)
+            if router is not None:
+                callback = router.resolve(data)
+                return callback.__name__ if callback else None
+            return handler.callback.__name__
+    return None
+
+
+def check_routes(application):
+    errors = []
+    for data, conversation, expected in EXPECTED_ROUTES:
+        actual = resolve(application, data, conversation)
+        if actual != expected:
+            errors.append(f"{data!r} ({conversation}): ожидался {expected}, получен {actual}")
+
+    # Каждый префикс CB_* должен быть покрыт проверкой
+    covered = {data.split(":")[0] for data, _, _ in EXPECTED_ROUTES}
+    for name in dir(bot):
+        if name.startswith("CB_") and getattr(bot, name) not in covered:
+            errors.append(f"{name} не покрыт EXPECTED_ROUTES")
+    return errors
+
+
+def benchmark(application, number):
+    router = next(
+        h.callback.__self__ for h in application.handlers[0]
+        if isinstance(h, CallbackQueryHandler) and hasattr(h.callback, "__self__")
+    )
+    samples = [pack(bot.CB_EVENT, 42), pack(bot.CB_DETAIL, 42), pack(bot.CB_CANCEL_REG, 42),
+               pack(bot.CB_VIEW, 42), "myevents", pack(bot.CB_UNREG_CONFIRM, 42)]
+    legacy = [re.compile(p) for p in LEGACY_PATTERNS]
+
+    def table_dispatch():
+        for data in samples:
+            router.resolve(data)
+
+    def regex_chain():
+        for data in LEGACY_SAMPLES:
+            for pattern in legacy:
+                if pattern.match(data):
+                    break
+
+    for name, func in (("таблица префиксов", table_dispatch), ("цепочка регулярок", regex_chain)):
+        seconds = min(timeit.repeat(func, number=number, repeat=5))
+        print(f"{name:18} {seconds / (number * len(samples)) * 1e9:8.1f} нс на callback")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--number", type=int, default=20000)
+    args = parser.parse_args()
+
+    application = bot.build_application(token="123456:BENCH")
+    errors = check_routes(application)
+    if errors:
+        print("❌ Ошибки маршрутизации:")
+        print("\n".join(errors))
+        sys.exit(1)
+    print(f"✅ Все {len(EXPECTED_ROUTES)} кнопок попадают в свои обработчики")
+
+    benchmark(application, args.number)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+Генератор синтетической базы для бенчмарков.
+
+Мероприятия равномерно распределены от двух лет назад до трех месяцев вперед,
+число участников скошено по закону Ципфа: несколько популярных сессий собирают
+тысячи записей, большинство - единицы. Вставка идет через обычную схему Database
+(с триггерами change_log), поэтому размер журнала изменений тоже реалистичный.
+
+    python -m benchmarks.datagen --preset medium --db bench.db
+"""
+import argparse
+import itertools
+import os
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+from database import Database
+from query_stats import QUERY_STATS
+
+# name -> (мероприятий, регистраций, пользователей)
+PRESETS = {
+    "small": (1_000, 20_000, 5_000),
+    "medium": (100_000, 1_000_000, 100_000),
+    "large": (100_000, 10_000_000, 1_000_000),
+}
+
+BATCH = 50_000
+
+
+def participant_counts(events, registrations, users, skew, rng):
+    """Число участников по мероприятиям: вес ранга r равен 1 / r^skew"""
+    weights = [1 / (rank ** skew) for rank in range(1, events + 1)]
+    total = sum(weights)
+    counts = [min(users, int(registrations * weight / total)) for weight in weights]
+    # Остаток от округления - по одному в случайные мероприятия
+    for index in rng.sample(range(events), min(events, registrations - sum(counts))):
+        counts[index] = min(users, counts[index] + 1)
+    rng.shuffle(counts)
+    return counts
+
+
+def generate(db_path, events, registrations, users, skew=1.1, seed=42, progress=print):
+    if os.path.exists(db_path):
+        os.remove(db_path)
+    rng = random.Random(seed)
+    QUERY_STATS.threshold_ms = None
+    Database(db_path).conn.close()
+
+    conn = sqlite3.connect(db_path, isolation_level=None)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = OFF")
+    started = time.perf_counter()
+
+    counts = participant_counts(events, registrations, users, skew, rng)
+    first_day = datetime.now() - timedelta(days=730)
+    span_minutes = (730 + 90) * 24 * 60
+
+    conn.execute("BEGIN")
+    event_rows = []
+    for event_id, count in enumerate(counts, start=1):
+        starts = first_day + timedelta(minutes=rng.randrange(span_minutes))
+        event_rows.append((
+            event_id,
+            count + rng.randint(0, 10),
+            starts.strftime("%Y-%m-%d"),
+            starts.strftime("%H:%M"),
+            f"Сессия #{event_id}: " + " ".join(rng.choices(["йога", "бег", "зал", "бассейн", "игра"], k=3))
+        ))
+    conn.executemany(
+        "INSERT INTO events (id, max_participants, end_date, event_time, info) VALUES (?, ?, ?, ?, ?)",
+        event_rows
+    )
+    conn.execute("COMMIT")
+    progress(f"мероприятий: {events}")
+
+    def registration_rows():
+        for event_id, count in enumerate(counts, start=1):
+            for user_id in rng.sample(range(1, users + 1), count):
+                yield user_id, event_id, f"user{user_id}"
+
+    inserted = 0
+    rows = registration_rows()
+    while True:
+        batch = list(itertools.islice(rows, BATCH))
+        if not batch:
+            break
+        conn.execute("BEGIN")
+        conn.executemany("INSERT INTO registrations (user_id, event_id, username) VALUES (?, ?, ?)", batch)
+        conn.execute("COMMIT")
+        inserted += len(batch)
+        progress(f"регистраций: {inserted}/{sum(counts)}")
+
+    conn.execute("ANALYZE")
+    conn.close()
+    progress(f"готово за {time.perf_counter() - started:.1f} с: {db_path}")
+    return {"events": events, "registrations": inserted, "users": users, "skew": skew, "seed": seed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="bench.db")
+    parser.add_argument("--preset", choices=PRESETS, default="small")
+    parser.add_argument("--events", type=int, help="Переопределить число мероприятий")
+    parser.add_argument("--registrations", type=int, help="Переопределить число регистраций")
+    parser.add_argument("--users", type=int, help="Переопределить число пользователей")
+    parser.add_argument("--skew", type=float, default=1.1, help="Показатель распределения Ципфа")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    events, registrations, users = PRESETS[args.preset]
+    generate(
+        args.db,
+        args.events or events,
+        args.registrations or registrations,
+        args.users or users,
+        skew=args.skew,
+        seed=args.seed
+    )
+
+
+if __name__ == "__main__":
+    main()
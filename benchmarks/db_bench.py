@@ -0,0 +1,227 @@
+"""
+Бенчмарк методов Database, экспортов и past_events_manager.get_events.
+
+Каждая операция выполняется --repeat раз, в JSON сохраняются min/median/p95 (мс)
+и метаданные прогона (коммит, размер базы, версии). С --compare медианы
+сравниваются с прошлым прогоном: рост больше --threshold считается регрессией
+(код выхода 1).
+
+    python -m benchmarks.datagen --preset medium --db bench.db
+    python -m benchmarks.db_bench --db bench.db --output results.json
+    python -m benchmarks.db_bench --db bench.db --compare results.json --threshold 0.2
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta
+
+import attendance_stats
+import past_events_manager as pem
+from benchmarks.datagen import PRESETS, generate
+from database import Database
+from export_handler import generate_changes_export, generate_export_file
+from query_stats import QUERY_STATS
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def measure(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        "runs": repeat,
+        "min_ms": round(min(timings), 4),
+        "median_ms": round(statistics.median(timings), 4),
+        "p95_ms": round(percentile(timings, 95), 4),
+    }
+
+
+def pick_samples(conn, rng):
+    """Типичные аргументы: самое популярное мероприятие, случайное, активный пользователь"""
+    popular_event = conn.execute(
+        "SELECT event_id FROM registrations GROUP BY event_id ORDER BY COUNT(*) DESC LIMIT 1"
+    ).fetchone()[0]
+    max_id = conn.execute("SELECT MAX(id) FROM events").fetchone()[0]
+    user_id, username = conn.execute(
+        "SELECT user_id, username FROM registrations WHERE event_id = ? LIMIT 1", (popular_event,)
+    ).fetchone()
+    future_event = conn.execute(
+        "SELECT id FROM events WHERE starts_at > datetime('now', 'localtime') ORDER BY starts_at LIMIT 1 OFFSET 5"
+    ).fetchone()
+    return {
+        "popular_event": popular_event,
+        "random_event": rng.randint(1, max_id),
+        "future_event": future_event[0] if future_event else popular_event,
+        "user_id": user_id,
+        "username": username,
+        "new_user": 10 ** 12 + rng.randint(0, 10 ** 6),
+    }
+
+
+def build_cases(db, samples):
+    """name -> функция без аргументов. Пишущие операции возвращают базу в исходное состояние"""
+    popular, random_event, future = samples["popular_event"], samples["random_event"], samples["future_event"]
+    new_user = samples["new_user"]
+    original_info = db.get_event_by_id(random_event).info
+    _, _, has_next = db.get_events_page()
+    first_page = db.get_events_page()[0]
+    after_id = first_page[-1].id if has_next and first_page else None
+
+    def add_and_delete_event():
+        event_id = db.add_event(10, "2099-01-01", "10:00", "benchmark")
+        db.delete_event(event_id)
+
+    def register_and_unregister():
+        db.register_user(new_user, "bench", future)
+        db.delete_registration(new_user, future)
+
+    reader = db.open_reader()
+    month_ago = (datetime.now() - timedelta(days=30)).strftime("%Y-%m-%d %H:%M")
+    now = datetime.now().strftime("%Y-%m-%d %H:%M")
+    last_seq = db.conn.execute("SELECT COALESCE(MAX(seq), 0) FROM change_log").fetchone()[0]
+    pem_conn = pem.connect(db.database_name)
+
+    return {
+        "Database.get_all_events": db.get_all_events,
+        "Database.get_events_page(first)": db.get_events_page,
+        "Database.get_events_page(next)": lambda: db.get_events_page(after_id=after_id),
+        "Database.get_event_by_id": lambda: db.get_event_by_id(random_event),
+        "Database.check_available_slots(popular)": lambda: db.check_available_slots(popular),
+        "Database.check_available_slots(random)": lambda: db.check_available_slots(random_event),
+        "Database.get_event_participants(popular)": lambda: db.get_event_participants(popular),
+        "Database.get_event_participant_rows(popular)": lambda: db.get_event_participant_rows(popular),
+        "Database.get_event_participant_ids(popular)": lambda: db.get_event_participant_ids(popular),
+        "Database.get_user_events": lambda: db.get_user_events(samples["user_id"]),
+        "Database.get_user_id_by_username": lambda: db.get_user_id_by_username(samples["username"]),
+        "Database.search_events(common)": lambda: db.search_events("йога"),
+        "Database.search_events(two words)": lambda: db.search_events("бег зал"),
+        "Database.search_events(no match)": lambda: db.search_events("йога бег зал бассейн"),
+        "Database.get_export_cursor": lambda: db.get_export_cursor("bench"),
+        "Database.set_export_cursor": lambda: db.set_export_cursor("bench", 0),
+        "Database.update_event_field": lambda: db.update_event_field(random_event, "info", original_info),
+        "Database.add_event+delete_event": add_and_delete_event,
+        "Database.register_user+delete_registration": register_and_unregister,
+        "export.generate_export_file(all)": lambda: generate_export_file(reader, "all", "all"),
+        "export.generate_export_file(30 days)": lambda: generate_export_file(reader, month_ago, now),
+        "export.generate_changes_export(last 1000)": lambda: generate_changes_export(reader, max(0, last_seq - 1000)),
+        "past_events_manager.get_events(past)": lambda: pem.get_events(conn=pem_conn),
+        "past_events_manager.get_events(all, page)": lambda: pem.get_events(show_all=True, conn=pem_conn, limit=50),
+        "past_events_manager.get_events(search)": lambda: pem.get_events(show_all=True, conn=pem_conn, search="бег"),
+        "attendance_stats.build_report(30 days)": lambda: attendance_stats.build_report(reader, 30),
+        "attendance_stats.build_report(year)": lambda: attendance_stats.build_report(reader, 366),
+    }
+
+
+# Полная выгрузка на больших базах занимает минуты, для нее свое число повторов
+HEAVY = ("export.generate_export_file(all)",)
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline, threshold, min_delta_ms):
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get("results", {}).get(name)
+        if not previous or not previous["median_ms"]:
+            continue
+        change = current["median_ms"] / previous["median_ms"] - 1
+        marker = ""
+        # Для быстрых операций относительный шум велик, учитываем и абсолютный рост
+        if change > threshold and current["median_ms"] - previous["median_ms"] > min_delta_ms:
+            marker = "  ❌ регрессия"
+            regressions.append(name)
+        print(f"{name:48} {previous['median_ms']:10.3f} -> {current['median_ms']:10.3f} мс ({change:+.0%}){marker}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", default="bench.db")
+    parser.add_argument("--preset", choices=PRESETS, default="small", help="Если базы --db нет, сгенерировать")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--heavy-repeat", type=int, default=3, help="Повторы для полной выгрузки")
+    parser.add_argument("--only", help="Только операции, в имени которых есть эта подстрока")
+    parser.add_argument("--output", help="Сохранить результаты в JSON")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Допустимый рост медианы (0.2 = +20%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=0.05,
+                        help="Рост медианы меньше этого (мс) не считается регрессией")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    # Замеряем сами запросы, без записи slow-query лога
+    QUERY_STATS.threshold_ms = None
+
+    if not os.path.exists(args.db):
+        generate(args.db, *PRESETS[args.preset], seed=args.seed)
+
+    db = Database(args.db)
+    samples = pick_samples(db.conn, random.Random(args.seed))
+    cases = build_cases(db, samples)
+
+    results = {}
+    for name, func in cases.items():
+        if args.only and args.only not in name:
+            continue
+        func()  # прогрев кэша страниц
+        results[name] = measure(func, args.heavy_repeat if name in HEAVY else args.repeat)
+        r = results[name]
+        print(f"{name:48} min={r['min_ms']:10.3f} median={r['median_ms']:10.3f} p95={r['p95_ms']:10.3f} мс")
+
+    counts = {
+        table: db.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        for table in ("events", "registrations", "change_log")
+    }
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "db": os.path.abspath(args.db),
+            "rows": counts,
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены: {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        if baseline["meta"].get("rows") != counts:
+            print(f"⚠️ Базы различаются: {baseline['meta'].get('rows')} против {counts}")
+        regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+        if regressions:
+            print(f"❌ Регрессии ({len(regressions)}): {', '.join(regressions)}")
+            sys.exit(1)
+        print("✅ Регрессий нет")
+
+
+if __name__ == "__main__":
+    main()
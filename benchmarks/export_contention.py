@@ -0,0 +1,154 @@
+"""
+Записи на сессии во время выгрузки: основная база против снимка (read_snapshot).
+
+Выгрузка (export_handler.generate_export_file) идет в отдельном потоке, как в
+боте, а основной поток все это время записывает и отменяет записи через
+Database.apply_registrations - по одной транзакции на запрос. Для каждого режима
+печатаются перцентили времени записи и время выгрузки:
+
+  без выгрузки   - базовая линия;
+  основная база  - выгрузка читает events.db через Database.open_reader;
+  снимок+копия   - снимок обновляется перед каждой выгрузкой (худший случай:
+                   прежний снимок не подошел по возрасту);
+  снимок         - выгрузки читают готовый снимок (обычный случай: снимок
+                   моложе MAX_AGE_SEC, обновление - плановое, раз в интервал).
+
+База копируется в --dir, исходный файл не меняется. --journal-mode DELETE -
+прежний журнал отката: выгрузка из основной базы держит разделяемую блокировку,
+и записи ждут ее снятия.
+
+    python -m benchmarks.datagen --preset small --db bench.db
+    python -m benchmarks.export_contention --db bench.db --dir /var/tmp
+"""
+import argparse
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+from benchmarks.db_bench import percentile
+from database import Database
+from export_handler import generate_export_file
+from query_stats import QUERY_STATS
+from read_snapshot import ReadSnapshot
+
+WRITER_USER_BASE = 10_000_000
+
+
+def prepare(source, directory):
+    path = os.path.join(directory, "contention.db")
+    shutil.copyfile(source, path)
+    return path
+
+
+def write_while(db, event_ids, running, pause):
+    """
+    Записать и отменить записи, пока running(), с паузой pause секунд между запросами.
+    Время каждой транзакции в мс
+    """
+    latencies = []
+    user_id = WRITER_USER_BASE
+    while running():
+        user_id += 1
+        event_id = event_ids[user_id % len(event_ids)]
+        for request in (("register", user_id, f"user{user_id}", event_id), ("unregister", user_id, event_id)):
+            started = time.perf_counter()
+            db.apply_registrations([request])
+            latencies.append((time.perf_counter() - started) * 1000)
+            time.sleep(pause)
+    return latencies
+
+
+def run_mode(db, event_ids, export, duration, pause):
+    """(время записей, время выгрузок, ошибки выгрузок)"""
+    deadline = time.perf_counter() + duration
+    if export is None:
+        return write_while(db, event_ids, lambda: time.perf_counter() < deadline, pause), [], []
+
+    done = threading.Event()
+    export_ms = []
+    errors = []
+
+    def exporter():
+        # Выгрузки подряд до deadline, последняя - целиком
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                export()
+            except Exception as e:
+                errors.append(str(e))
+            else:
+                export_ms.append((time.perf_counter() - started) * 1000)
+        done.set()
+
+    thread = threading.Thread(target=exporter)
+    thread.start()
+    latencies = write_while(db, event_ids, lambda: not done.is_set(), pause)
+    thread.join()
+    return latencies, export_ms, errors
+
+
+def export_live(db):
+    reader = db.open_reader()
+    try:
+        generate_export_file(reader).close()
+    finally:
+        reader.close()
+
+
+def export_snapshot(snapshot, refresh):
+    if refresh:
+        snapshot.refresh()
+    reader = snapshot.connect()
+    try:
+        generate_export_file(reader).close()
+    finally:
+        reader.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", required=True, help="База из benchmarks.datagen")
+    parser.add_argument("--dir", help="Каталог для копии базы (по умолчанию временный)")
+    parser.add_argument("--duration", type=float, default=5.0, help="Секунд записи на режим")
+    parser.add_argument("--pause-ms", type=float, default=20.0, help="Пауза между записями")
+    parser.add_argument("--journal-mode", default="WAL", choices=["WAL", "DELETE"], help="Режим журнала базы")
+    args = parser.parse_args()
+
+    QUERY_STATS.threshold_ms = None
+    directory = args.dir or tempfile.mkdtemp()
+    path = prepare(args.db, directory)
+    try:
+        db = Database(path, journal_mode=args.journal_mode)
+        snapshot = ReadSnapshot(path, factory=sqlite3.Connection)
+        event_ids = [row[0] for row in db.conn.execute("SELECT id FROM events ORDER BY id DESC LIMIT 50")]
+        modes = [
+            ("без выгрузки", None),
+            ("основная база", lambda: export_live(db)),
+            ("снимок+копия", lambda: export_snapshot(snapshot, refresh=True)),
+            ("снимок", lambda: export_snapshot(snapshot, refresh=False)),
+        ]
+        for name, export in modes:
+            latencies, export_ms, errors = run_mode(db, event_ids, export, args.duration, args.pause_ms / 1000)
+            line = (
+                f"{name:14} записей {len(latencies):6d}  p50 {percentile(latencies, 50):7.2f}мс  "
+                f"p99 {percentile(latencies, 99):7.2f}мс  max {max(latencies):8.2f}мс"
+            )
+            if export_ms:
+                line += f"  выгрузка {percentile(export_ms, 50) / 1000:.2f}с x{len(export_ms)}"
+            if errors:
+                line += f"  ошибок выгрузки {len(errors)}: {errors[0]}"
+            print(line)
+        db.conn.close()
+    finally:
+        for name in os.listdir(directory):
+            if name.startswith("contention.db"):
+                os.remove(os.path.join(directory, name))
+        if not args.dir:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
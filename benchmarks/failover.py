@@ -0,0 +1,119 @@
+"""
+Время переключения лидера: два процесса на одной базе (или lock-файле).
+
+Процесс A становится лидером, B ждет в резерве, A убивается (SIGKILL -
+аренда не освобождается, или SIGTERM с --graceful - освобождается).
+Замеряется время от убийства A до захвата лидерства процессом B.
+Для lease ожидаемая граница - LEASE_TTL + RENEW_INTERVAL.
+
+    python -m benchmarks.failover --mode lease --ttl 3 --interval 0.5 --runs 5
+    python -m benchmarks.failover --mode lock --interval 0.2
+"""
+import argparse
+import json
+import os
+import shutil
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from leader_election import LeaseElection, LockElection
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def worker(args):
+    """Пытается захватить/продлить лидерство каждые interval секунд, пишет смену роли в stdout"""
+    if args.mode == "lease":
+        election = LeaseElection(args.path, instance_id=args.worker, ttl=args.ttl)
+    else:
+        election = LockElection(args.path, instance_id=args.worker)
+
+    def stop(signum, frame):
+        election.release()
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, stop)
+    role = None
+    while True:
+        new_role = "leader" if election.try_acquire() else "standby"
+        if new_role != role:
+            role = new_role
+            print(json.dumps({"role": role, "t": time.time()}), flush=True)
+        time.sleep(args.interval)
+
+
+def spawn(args, name):
+    command = [
+        sys.executable, "-m", "benchmarks.failover", "--worker", name, "--mode", args.mode,
+        "--path", args.path, "--ttl", str(args.ttl), "--interval", str(args.interval)
+    ]
+    return subprocess.Popen(command, cwd=ROOT, stdout=subprocess.PIPE, text=True)
+
+
+def wait_role(process, role):
+    for line in process.stdout:
+        event = json.loads(line)
+        if event["role"] == role:
+            return event["t"]
+    raise RuntimeError(f"Процесс завершился, не дождавшись роли {role}")
+
+
+def run_once(args):
+    first = spawn(args, "A")
+    wait_role(first, "leader")
+    second = spawn(args, "B")
+    try:
+        wait_role(second, "standby")
+        # Даем A продлить аренду: худший случай для lease - смерть сразу после продления
+        time.sleep(args.interval)
+        killed_at = time.time()
+        first.send_signal(signal.SIGTERM if args.graceful else signal.SIGKILL)
+        first.wait()
+        return wait_role(second, "leader") - killed_at
+    finally:
+        for process in (first, second):
+            if process.poll() is None:
+                process.kill()
+            process.wait()
+            process.stdout.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=("lease", "lock"), default="lease")
+    parser.add_argument("--ttl", type=float, default=3.0, help="Срок аренды (lease), сек")
+    parser.add_argument("--interval", type=float, default=0.5, help="Период продления/попыток, сек")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--graceful", action="store_true", help="SIGTERM с освобождением вместо SIGKILL")
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args)
+        return
+
+    workdir = tempfile.mkdtemp(prefix="eventsbot-failover-")
+    args.path = os.path.join(workdir, "events.db" if args.mode == "lease" else "leader.lock")
+    try:
+        times = []
+        for run in range(args.runs):
+            if args.mode == "lease" and os.path.exists(args.path):
+                os.remove(args.path)
+            times.append(run_once(args))
+            print(f"прогон {run + 1}: переключение за {times[-1]:.2f} с")
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    bound = args.interval if args.mode == "lock" or args.graceful else args.ttl + args.interval
+    print(f"\n{args.mode}{' (graceful)' if args.graceful else ''}: min {min(times):.2f} с, "
+          f"медиана {statistics.median(times):.2f} с, max {max(times):.2f} с, "
+          f"граница без накладных расходов {bound:.2f} с")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""
+Локальная замена Telegram Bot API для бенчмарков.
+
+Понимает getMe, getUpdates (long polling), setWebhook/deleteWebhook,
+sendMessage/editMessageText/answerCallbackQuery/sendDocument (сообщения бота
+хранятся, чтобы нагрузочный тест мог нажимать их кнопки) и отвечает успехом
+на остальные методы. Обновления кладутся через inject_update().
+
+Исходящие вызовы можно замедлить и сломать (Faults): задержка, 429 RetryAfter,
+403 Forbidden с заданной вероятностью.
+"""
+import asyncio
+import json
+import random
+import time
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+from urllib.parse import parse_qsl
+
+import tornado.httpserver
+import tornado.netutil
+import tornado.web
+
+BOT_USER = {
+    "id": 100000,
+    "is_bot": True,
+    "first_name": "FakeBot",
+    "username": "fake_bot",
+    "can_join_groups": False,
+    "can_read_all_group_messages": False,
+    "supports_inline_queries": False
+}
+
+
+# Служебные методы, на которые не действуют задержки и ошибки
+SERVICE_METHODS = {"getMe", "getUpdates", "setWebhook", "deleteWebhook", "getWebhookInfo", "close", "logOut"}
+
+
+@dataclass
+class Faults:
+    latency: float = 0.0  # секунды на каждый исходящий вызов
+    jitter: float = 0.0  # +- случайная добавка к latency
+    retry_after_rate: float = 0.0  # доля вызовов с ответом 429
+    retry_after: int = 1  # значение retry_after в ответе 429
+    forbidden_rate: float = 0.0  # доля вызовов с ответом 403 (пользователь заблокировал бота)
+
+
+def decode_params(request):
+    content_type = request.headers.get("Content-Type", "")
+    if content_type.startswith("application/json"):
+        return json.loads(request.body or b"{}")
+
+    if content_type.startswith("multipart/form-data"):
+        raw = {key: values[0].decode() for key, values in request.body_arguments.items()}
+    else:
+        raw = dict(parse_qsl(request.body.decode()))
+
+    # PTB кодирует все не-строковые значения в JSON
+    params = {}
+    for key, value in raw.items():
+        try:
+            params[key] = json.loads(value)
+        except (TypeError, ValueError):
+            params[key] = value
+    return params
+
+
+class FakeBotAPI:
+    def __init__(self, token="123456:FAKE", host="127.0.0.1", port=0, faults=None, seed=None):
+        self.token = token
+        self.host = host
+        self.port = port
+        self.faults = faults or Faults()
+        self.calls = Counter()
+        # chat_id -> Counter(method) для подсчета вызовов на действие пользователя
+        self.calls_by_chat = defaultdict(Counter)
+        # Результаты внесенных ошибок: Counter("retry_after" / "forbidden")
+        self.injected = Counter()
+        # (chat_id, message_id) -> сообщение бота
+        self.messages = {}
+        self._last_message = {}
+        # callback_query_id -> chat_id (в answerCallbackQuery нет chat_id)
+        self._callback_chats = {}
+        self._random = random.Random(seed)
+        self.webhook_url = None
+        self._updates = []
+        self._next_update_id = 1
+        self._message_id = 1
+        self._new_updates = asyncio.Event()
+        self._server = None
+
+    @property
+    def base_url(self):
+        return f"http://{self.host}:{self.port}/bot"
+
+    def make_message_update(self, user_id, text, chat_id=None):
+        return {
+            "message": {
+                "message_id": self.next_message_id(),
+                "date": int(time.time()),
+                "chat": {"id": chat_id or user_id, "type": "private"},
+                "from": {"id": user_id, "is_bot": False, "first_name": f"User{user_id}",
+                         "username": f"user{user_id}"},
+                "text": text,
+                "entities": (
+                    [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+                    if text.startswith("/") else []
+                )
+            }
+        }
+
+    def make_callback_update(self, user_id, message, data):
+        """Нажатие кнопки data под сообщением бота message"""
+        query_id = str(self.next_message_id())
+        self._callback_chats[query_id] = message["chat"]["id"]
+        return {
+            "callback_query": {
+                "id": query_id,
+                "from": {"id": user_id, "is_bot": False, "first_name": f"User{user_id}",
+                         "username": f"user{user_id}"},
+                "chat_instance": str(message["chat"]["id"]),
+                "message": dict(message),
+                "data": data
+            }
+        }
+
+    def last_message(self, chat_id):
+        """Последнее отправленное или измененное ботом сообщение в чате"""
+        key = self._last_message.get(chat_id)
+        return self.messages.get(key) if key else None
+
+    @staticmethod
+    def buttons(message):
+        """callback_data всех inline-кнопок сообщения"""
+        markup = (message or {}).get("reply_markup") or {}
+        return [
+            button["callback_data"]
+            for row in markup.get("inline_keyboard", [])
+            for button in row
+            if "callback_data" in button
+        ]
+
+    def next_message_id(self):
+        self._message_id += 1
+        return self._message_id
+
+    def inject_update(self, update):
+        """Добавляет обновление в очередь getUpdates, возвращает присвоенный update_id"""
+        update = dict(update, update_id=self._next_update_id)
+        self._next_update_id += 1
+        self._updates.append(update)
+        self._new_updates.set()
+        return update
+
+    async def get_updates(self, params):
+        offset = params.get("offset") or 0
+        timeout = params.get("timeout") or 0
+        self._updates = [u for u in self._updates if u["update_id"] >= offset]
+
+        if not self._updates and timeout:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+        limit = params.get("limit") or 100
+        return [u for u in self._updates if u["update_id"] >= offset][:limit]
+
+    def _store_message(self, chat_id, message_id, **fields):
+        key = (chat_id, message_id)
+        message = self.messages.get(key) or {
+            "message_id": message_id,
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            "from": BOT_USER,
+        }
+        message.update(fields)
+        if "reply_markup" not in fields:
+            # editMessageText без клавиатуры убирает ее
+            message.pop("reply_markup", None)
+        self.messages[key] = message
+        self._last_message[chat_id] = key
+        return message
+
+    def _chat_of(self, method, params):
+        if method == "answerCallbackQuery":
+            return self._callback_chats.get(str(params.get("callback_query_id")))
+        chat_id = params.get("chat_id")
+        try:
+            return int(chat_id)
+        except (TypeError, ValueError):
+            return chat_id
+
+    async def _inject_faults(self):
+        """None или (ok, error, status) для вызова, который должен упасть"""
+        faults = self.faults
+        if faults.latency or faults.jitter:
+            await asyncio.sleep(max(0.0, faults.latency + self._random.uniform(-faults.jitter, faults.jitter)))
+
+        roll = self._random.random()
+        if roll < faults.retry_after_rate:
+            self.injected["retry_after"] += 1
+            return False, {
+                "error_code": 429,
+                "description": f"Too Many Requests: retry after {faults.retry_after}",
+                "parameters": {"retry_after": faults.retry_after}
+            }, 429
+        if roll < faults.retry_after_rate + faults.forbidden_rate:
+            self.injected["forbidden"] += 1
+            return False, {"error_code": 403, "description": "Forbidden: bot was blocked by the user"}, 403
+        return None
+
+    async def handle(self, method, params):
+        """Возвращает (ok, result_or_error, http_status)"""
+        if method not in SERVICE_METHODS:
+            chat_id = self._chat_of(method, params)
+            if chat_id is not None:
+                self.calls_by_chat[chat_id][method] += 1
+            failure = await self._inject_faults()
+            if failure:
+                return failure
+
+        if method == "sendMessage":
+            fields = {"text": params.get("text", "")}
+            if params.get("reply_markup"):
+                fields["reply_markup"] = params["reply_markup"]
+            return True, self._store_message(int(params["chat_id"]), self.next_message_id(), **fields), 200
+        if method == "editMessageText":
+            if "inline_message_id" in params:
+                return True, True, 200
+            fields = {"text": params.get("text", ""), "edit_date": int(time.time())}
+            if params.get("reply_markup"):
+                fields["reply_markup"] = params["reply_markup"]
+            return True, self._store_message(int(params["chat_id"]), int(params["message_id"]), **fields), 200
+        if method == "sendDocument":
+            message_id = self.next_message_id()
+            document = {"file_id": f"doc{message_id}", "file_unique_id": f"u{message_id}"}
+            return True, self._store_message(int(params["chat_id"]), message_id, document=document), 200
+        if method == "answerCallbackQuery":
+            return True, True, 200
+        if method == "getMe":
+            return True, BOT_USER, 200
+        if method == "getUpdates":
+            return True, await self.get_updates(params), 200
+        if method == "setWebhook":
+            self.webhook_url = params.get("url")
+            return True, True, 200
+        if method == "deleteWebhook":
+            self.webhook_url = None
+            return True, True, 200
+        return True, True, 200
+
+    def _make_app(self):
+        api = self
+
+        class MethodHandler(tornado.web.RequestHandler):
+            async def post(self, token, method):
+                if token != api.token:
+                    self.set_status(401)
+                    self.finish({"ok": False, "error_code": 401, "description": "Unauthorized"})
+                    return
+                api.calls[method] += 1
+                ok, result, status = await api.handle(method, decode_params(self.request))
+                self.set_status(status)
+                if ok:
+                    self.finish({"ok": True, "result": result})
+                else:
+                    self.finish(dict(result, ok=False))
+
+            get = post
+
+        return tornado.web.Application([(r"/bot([^/]+)/(\w+)", MethodHandler)])
+
+    async def start(self):
+        self._server = tornado.httpserver.HTTPServer(self._make_app())
+        sockets = tornado.netutil.bind_sockets(self.port, self.host)
+        self.port = sockets[0].getsockname()[1]
+        self._server.add_sockets(sockets)
+        return self
+
+    async def stop(self):
+        if self._server:
+            self._server.stop()
+            await self._server.close_all_connections()
+            self._server = None
+        # Будим висящие getUpdates
+        self._new_updates.set()
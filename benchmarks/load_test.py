@@ -0,0 +1,211 @@
+"""
+Нагрузочный тест: настоящее приложение event_bot_main против FakeBotAPI.
+
+Каждый виртуальный пользователь проходит сценарий
+/events -> нажатие кнопки сессии (запись) -> /myevents -> ❌ (отмена записи).
+Задержка действия - от попадания обновления в getUpdates до конца обработки
+(служебный TypeHandler в последней группе). Для каждого действия считаются
+вызовы Bot API в чате пользователя.
+
+    python -m benchmarks.load_test --users 2000 --concurrency 300 --latency 0.05 --retry-after-rate 0.01
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import statistics
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+
+from telegram import Update
+from telegram.ext import TypeHandler
+
+import event_bot_main as bot
+from benchmarks.fake_bot_api import FakeBotAPI, Faults
+from callback_router import unpack
+from database import Database
+from query_stats import QUERY_STATS
+from sqlite_persistence import SQLitePersistence
+
+ACTIONS = ("events", "register", "myevents", "cancel")
+# Группа после всех обработчиков бота: обновление в ней считается обработанным
+DONE_GROUP = 100
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+class LoadTest:
+    def __init__(self, api, timeout):
+        self.api = api
+        self.timeout = timeout
+        self.latencies = defaultdict(list)
+        self.api_calls = defaultdict(Counter)
+        self.actions = Counter()
+        self.failures = Counter()
+        self._waiters = {}
+
+    async def mark_done(self, update: Update, context):
+        future = self._waiters.pop(update.update_id, None)
+        if future and not future.done():
+            future.set_result(time.perf_counter())
+
+    async def act(self, action, chat_id, update):
+        """Отправляет обновление и ждет конца обработки. False - действие не завершилось"""
+        before = Counter(self.api.calls_by_chat[chat_id])
+        update = self.api.inject_update(update)
+        future = self._waiters[update["update_id"]] = asyncio.get_running_loop().create_future()
+        sent_at = time.perf_counter()
+        try:
+            finished_at = await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            # Например, обновление отброшено антифлудом
+            self._waiters.pop(update["update_id"], None)
+            self.failures[f"{action}: timeout"] += 1
+            return False
+
+        self.actions[action] += 1
+        self.latencies[action].append(finished_at - sent_at)
+        self.api_calls[action].update(self.api.calls_by_chat[chat_id] - before)
+        return True
+
+    def pick_button(self, chat_id, prefix, rng):
+        buttons = [data for data in self.api.buttons(self.api.last_message(chat_id)) if unpack(data)[0] == prefix]
+        return rng.choice(buttons) if buttons else None
+
+    async def user_session(self, user_id, think, rng):
+        chat_id = user_id
+        if not await self.act("events", chat_id, self.api.make_message_update(user_id, "/events")):
+            return
+        data = self.pick_button(chat_id, bot.CB_EVENT, rng)
+        if data is None:
+            self.failures["events: нет кнопок"] += 1
+            return
+
+        await asyncio.sleep(think * rng.random())
+        message = self.api.last_message(chat_id)
+        if not await self.act("register", chat_id, self.api.make_callback_update(user_id, message, data)):
+            return
+
+        await asyncio.sleep(think * rng.random())
+        if not await self.act("myevents", chat_id, self.api.make_message_update(user_id, "/myevents")):
+            return
+        data = self.pick_button(chat_id, bot.CB_CANCEL_REG, rng)
+        if data is None:
+            self.failures["myevents: нет кнопок"] += 1
+            return
+
+        await asyncio.sleep(think * rng.random())
+        message = self.api.last_message(chat_id)
+        await self.act("cancel", chat_id, self.api.make_callback_update(user_id, message, data))
+
+    def report(self, elapsed, users):
+        print(f"\nПользователей: {users}, время: {elapsed:.1f} с, "
+              f"действий в секунду: {sum(self.actions.values()) / elapsed:.1f}")
+        print(f"{'действие':10} {'n':>6} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}  вызовов API на действие")
+        for action in ACTIONS:
+            values = [value * 1000 for value in self.latencies[action]]
+            if not values:
+                continue
+            count = len(values)
+            per_action = ", ".join(
+                f"{method} {total / count:.2f}" for method, total in sorted(self.api_calls[action].items())
+            )
+            print(
+                f"{action:10} {count:6} {percentile(values, 50):7.1f}мс {percentile(values, 95):7.1f}мс "
+                f"{percentile(values, 99):7.1f}мс {max(values):7.1f}мс  {per_action}"
+            )
+        all_values = [value * 1000 for values in self.latencies.values() for value in values]
+        if all_values:
+            print(f"{'все':10} {len(all_values):6} {percentile(all_values, 50):7.1f}мс "
+                  f"{percentile(all_values, 95):7.1f}мс {percentile(all_values, 99):7.1f}мс "
+                  f"{max(all_values):7.1f}мс  среднее {statistics.mean(all_values):.1f}мс")
+        if self.api.injected:
+            print(f"Внесено ошибок API: {dict(self.api.injected)}")
+        if self.failures:
+            print(f"Незавершенные сценарии: {dict(self.failures)}")
+
+
+def prepare_database(path, events):
+    db = Database(path)
+    start = datetime.now() + timedelta(days=1)
+    for i in range(events):
+        day = start + timedelta(hours=i)
+        # Мест с запасом: сценарий проверяет нагрузку, а не заполнение сессий
+        db.add_event(10 ** 6, day.strftime("%Y-%m-%d"), day.strftime("%H:%M"), f"Нагрузочная сессия {i + 1}")
+    return db
+
+
+async def run(args):
+    QUERY_STATS.threshold_ms = None
+    workdir = tempfile.mkdtemp(prefix="eventsbot-load-")
+    bot.db = prepare_database(os.path.join(workdir, "events.db"), args.events)
+    bot.persistence = SQLitePersistence(os.path.join(workdir, "persistence.db"), update_interval=60)
+    bot.CONCURRENT_UPDATES = args.concurrent_updates
+    if args.no_antiflood:
+        bot.antiflood.exempt_ids.update(range(1, args.users + 1))
+    # Логи бота на каждое действие исказили бы замер
+    logging.getLogger().setLevel(logging.WARNING)
+
+    faults = Faults(
+        latency=args.latency,
+        jitter=args.jitter,
+        retry_after_rate=args.retry_after_rate,
+        retry_after=args.retry_after,
+        forbidden_rate=args.forbidden_rate
+    )
+    api = await FakeBotAPI(faults=faults, seed=args.seed).start()
+    test = LoadTest(api, args.timeout)
+
+    application = bot.build_application(token=api.token, base_url=api.base_url)
+    application.add_handler(TypeHandler(Update, test.mark_done), group=DONE_GROUP)
+    await application.initialize()
+    await application.start()
+    await application.updater.start_polling(poll_interval=0, timeout=10)
+
+    rng = random.Random(args.seed)
+    limit = asyncio.Semaphore(args.concurrency)
+
+    async def session(user_id):
+        async with limit:
+            await test.user_session(user_id, args.think, random.Random(rng.random()))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(session(user_id) for user_id in range(1, args.users + 1)))
+    elapsed = time.perf_counter() - started
+
+    await application.updater.stop()
+    await application.stop()
+    await application.shutdown()
+    await api.stop()
+
+    test.report(elapsed, args.users)
+    print(f"Рабочая директория: {workdir}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--concurrency", type=int, default=200, help="Одновременно активных пользователей")
+    parser.add_argument("--events", type=int, default=20, help="Сессий в базе")
+    parser.add_argument("--think", type=float, default=0.0, help="Максимальная пауза между действиями, сек")
+    parser.add_argument("--concurrent-updates", type=int, default=bot.CONCURRENT_UPDATES)
+    parser.add_argument("--latency", type=float, default=0.0, help="Задержка Bot API, сек")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--retry-after-rate", type=float, default=0.0, help="Доля ответов 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+    parser.add_argument("--forbidden-rate", type=float, default=0.0, help="Доля ответов 403")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Ожидание обработки одного действия, сек")
+    parser.add_argument("--no-antiflood", action="store_true", help="Не ограничивать виртуальных пользователей")
+    parser.add_argument("--seed", type=int, default=42)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
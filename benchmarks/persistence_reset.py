@@ -0,0 +1,136 @@
+"""
+Сброс persistence (/reset_persistence) переживает следующую запись.
+
+Приложение с SQLitePersistence загружает user_data и chat_data двух
+пользователей, затем вызывается event_bot_main.drop_all_persistent_data.
+После сброса первый пользователь пишет боту, второй молчит, и выполняется
+Application.update_persistence. Прежние данные не должны вернуться ни в
+память приложения, ни в базу, в том числе после перезапуска.
+
+    python -m benchmarks.persistence_reset
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+from datetime import datetime
+
+from telegram import Chat, Message, Update, User
+from telegram.ext import Application, TypeHandler
+from telegram.request import BaseRequest
+
+import event_bot_main as bot
+from sqlite_persistence import SQLitePersistence
+
+USERS = (1, 2)
+
+
+class GetMeRequest(BaseRequest):
+    """Bot API без сети: Application.initialize вызывает только getMe"""
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, *args, **kwargs):
+        if not url.endswith("/getMe"):
+            return 404, json.dumps({"ok": False, "error_code": 404, "description": "Not Found"}).encode()
+        me = {"id": 1, "is_bot": True, "first_name": "Check", "username": "check_bot"}
+        return 200, json.dumps({"ok": True, "result": me}).encode()
+
+
+def make_update(user_id, text):
+    user = User(id=user_id, first_name=f"User{user_id}", is_bot=False)
+    chat = Chat(id=user_id, type="private")
+    return Update(update_id=1, message=Message(
+        message_id=1, date=datetime.now(), chat=chat, from_user=user, text=text
+    ))
+
+
+async def seed(path):
+    persistence = SQLitePersistence(path)
+    for user_id in USERS:
+        await persistence.update_user_data(user_id, {"draft": f"old-{user_id}"})
+        await persistence.update_chat_data(user_id, {"page": f"old-{user_id}"})
+    await persistence.flush()
+
+
+async def stored(path):
+    persistence = SQLitePersistence(path)
+    try:
+        return await persistence.get_user_data(), await persistence.get_chat_data()
+    finally:
+        await persistence.flush()
+
+
+async def check(path):
+    await seed(path)
+    application = (
+        Application.builder().token("123456:CHECK")
+        .request(GetMeRequest()).get_updates_request(GetMeRequest())
+        .persistence(SQLitePersistence(path, update_interval=3600)).build()
+    )
+
+    async def touch(update, context):
+        context.user_data["seen"] = True
+        context.chat_data["seen"] = True
+
+    application.add_handler(TypeHandler(Update, touch))
+    errors = []
+    await application.initialize()
+    try:
+        if application.user_data.get(1, {}).get("draft") != "old-1":
+            errors.append("данные до сброса не загрузились")
+
+        await bot.drop_all_persistent_data(application)
+        await application.process_update(make_update(1, "привет"))
+        await application.update_persistence()
+        # Запись SQLitePersistence откладывается на следующую итерацию event loop
+        await asyncio.sleep(0)
+
+        memory = {user_id: dict(data) for user_id, data in application.user_data.items() if data}
+        if memory != {1: {"seen": True}}:
+            errors.append(f"user_data в памяти после сброса: {memory}")
+        user_data, chat_data = await stored(path)
+        if user_data != {1: {"seen": True}}:
+            errors.append(f"user_data в базе после сброса и записи: {user_data}")
+        if chat_data != {1: {"seen": True}}:
+            errors.append(f"chat_data в базе после сброса и записи: {chat_data}")
+    finally:
+        await application.shutdown()
+
+    # Остановка приложения - последняя запись persistence
+    user_data, _ = await stored(path)
+    if user_data != {1: {"seen": True}}:
+        errors.append(f"user_data в базе после остановки: {user_data}")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        errors = asyncio.run(check(os.path.join(directory, "persistence.db")))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    if errors:
+        print("❌ Сброс persistence не сохранился:")
+        print("\n".join(errors))
+        sys.exit(1)
+    print("✅ После сброса и записи persistence прежних user_data и chat_data нет")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Ответы обработчиков во время рассылок: общий пул соединений против network.SplitRequest.
+
+FakeBotAPI отвечает с задержкой --latency. --broadcasts рассылок идут одновременно
+(как напоминания для нескольких сессий в одно время), каждая - последовательно по
+--recipients получателям внутри network.bulk_traffic(). Параллельно раз в
+--interval секунд уходит "интерактивный" вызов (ответ на нажатие). Для каждой
+конфигурации - перцентили времени интерактивных вызовов и число вызовов,
+не дождавшихся соединения (pool timeout).
+
+    python -m benchmarks.pool_isolation --broadcasts 16 --pool-size 8 --bulk-pool-size 4
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from telegram import Bot
+from telegram.error import TimedOut
+
+import network
+from benchmarks.db_bench import percentile
+from benchmarks.fake_bot_api import FakeBotAPI, Faults
+
+
+async def run_config(api, request, args):
+    bot = Bot(api.token, base_url=api.base_url, request=request)
+    await bot.initialize()
+    latencies = []
+    timeouts = 0
+    broadcasting = True
+
+    async def broadcast(number):
+        with network.bulk_traffic():
+            for recipient in range(args.recipients):
+                try:
+                    await bot.send_message(chat_id=10_000 + number * args.recipients + recipient, text="Напоминание")
+                except TimedOut:
+                    pass
+
+    async def interactive():
+        nonlocal timeouts
+        while broadcasting:
+            started = time.perf_counter()
+            try:
+                await bot.send_message(chat_id=1, text="Ответ")
+                latencies.append((time.perf_counter() - started) * 1000)
+            except TimedOut:
+                timeouts += 1
+            await asyncio.sleep(args.interval)
+
+    probe = asyncio.create_task(interactive())
+    await asyncio.gather(*(broadcast(number) for number in range(args.broadcasts)))
+    broadcasting = False
+    await probe
+    await bot.shutdown()
+    return latencies, timeouts
+
+
+def shared(size, pool_timeout):
+    """Один пул на все запросы, как без SplitRequest"""
+    pool = network.PoolRequest("shared", size, pool_timeout=pool_timeout)
+    return network.SplitRequest(pool, pool)
+
+
+async def main_async(args):
+    api = await FakeBotAPI(faults=Faults(latency=args.latency)).start()
+    configs = [
+        (f"общий пул {args.pool_size}", shared(args.pool_size, args.pool_timeout)),
+        (f"раздельные {args.pool_size}+{args.bulk_pool_size}", network.SplitRequest(
+            network.PoolRequest("interactive", args.pool_size, pool_timeout=args.pool_timeout),
+            network.PoolRequest("bulk", args.bulk_pool_size, pool_timeout=args.bulk_pool_timeout),
+        )),
+    ]
+    try:
+        for name, request in configs:
+            latencies, timeouts = await run_config(api, request, args)
+            print(
+                f"{name:18} интерактивных {len(latencies):4d}  p50 {percentile(latencies, 50):7.1f}мс  "
+                f"p99 {percentile(latencies, 99):7.1f}мс  max {max(latencies):7.1f}мс  pool timeout {timeouts}"
+            )
+    finally:
+        await api.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--broadcasts", type=int, default=16, help="Одновременных рассылок")
+    parser.add_argument("--recipients", type=int, default=40, help="Получателей в рассылке")
+    parser.add_argument("--latency", type=float, default=0.05, help="Задержка ответа Bot API, сек")
+    parser.add_argument("--interval", type=float, default=0.02, help="Пауза между интерактивными вызовами, сек")
+    parser.add_argument("--pool-size", type=int, default=8)
+    parser.add_argument("--bulk-pool-size", type=int, default=4)
+    parser.add_argument("--pool-timeout", type=float, default=1.0)
+    parser.add_argument("--bulk-pool-timeout", type=float, default=10.0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING)
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
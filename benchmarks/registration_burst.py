@@ -0,0 +1,139 @@
+"""
+Открытие записи: много пользователей одновременно жмут на несколько сессий.
+
+Сравнивает коммит на каждый запрос (Database.apply_registrations по одному)
+и групповой коммит (RegistrationQueue). База - файл на диске, поэтому в замер
+входят fsync. После каждого режима проверяется учет мест: ни одна сессия
+не переполнена, и состав каждой совпадает с последовательным применением запросов.
+
+    python -m benchmarks.registration_burst --users 5000 --events 10 --capacity 300 --dir /var/tmp
+"""
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+from benchmarks.db_bench import percentile
+from database import Database
+from query_stats import QUERY_STATS
+from registration_queue import RegistrationQueue
+
+
+def make_requests(users, events, cancel_rate, rng):
+    """Каждый пользователь жмет на случайную сессию, иногда дважды, часть сразу отменяет"""
+    requests = []
+    for user_id in range(1, users + 1):
+        event_id = rng.randint(1, events)
+        requests.append(("register", user_id, f"user{user_id}", event_id))
+        if rng.random() < 0.05:
+            requests.append(("register", user_id, f"user{user_id}", event_id))
+        if rng.random() < cancel_rate:
+            requests.append(("unregister", user_id, event_id))
+    return requests
+
+
+def prepare(directory, events, capacity):
+    path = os.path.join(directory, "burst.db")
+    for suffix in ("", "-journal", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    db = Database(path)
+    for i in range(events):
+        db.add_event(capacity, "2099-01-01", f"{10 + i % 10}:00", f"Сессия {i + 1}")
+    return db
+
+
+async def run_mode(db, requests, concurrency, queue):
+    latencies = []
+    results = Counter()
+    limit = asyncio.Semaphore(concurrency)
+
+    async def client(request):
+        async with limit:
+            started = time.perf_counter()
+            if queue is not None:
+                result = await queue.submit(*request)
+            else:
+                result = db.apply_registrations([request])[0]
+                # Как обработчик: между запросами есть точки переключения
+                await asyncio.sleep(0)
+            latencies.append(time.perf_counter() - started)
+            results[result if request[0] == "register" else "unregistered"] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(request) for request in requests))
+    elapsed = time.perf_counter() - started
+    return elapsed, latencies, results
+
+
+def expected_registrations(requests, capacity):
+    """Состав сессий при последовательном применении запросов в порядке поступления"""
+    registered = defaultdict(set)
+    for kind, user_id, *rest in requests:
+        event_id = rest[-1]
+        if kind == "unregister":
+            registered[event_id].discard(user_id)
+        elif len(registered[event_id]) < capacity:
+            registered[event_id].add(user_id)
+    return registered
+
+
+def check_seats(db, requests, capacity):
+    """Расхождения с последовательным применением: переполнение, лишние или потерянные записи"""
+    actual = defaultdict(set)
+    for user_id, event_id in db.conn.execute("SELECT user_id, event_id FROM registrations"):
+        actual[event_id].add(user_id)
+    problems = []
+    for event_id, users in sorted(expected_registrations(requests, capacity).items()):
+        if len(actual[event_id]) > capacity:
+            problems.append(f"сессия {event_id}: {len(actual[event_id])} > {capacity}")
+        elif actual[event_id] != users:
+            problems.append(f"сессия {event_id}: {len(actual[event_id])} записей вместо {len(users)}")
+    return problems
+
+
+async def main_async(args):
+    QUERY_STATS.threshold_ms = None
+    directory = tempfile.mkdtemp(prefix="eventsbot-burst-", dir=args.dir)
+    requests = make_requests(args.users, args.events, args.cancel_rate, random.Random(args.seed))
+    modes = [("коммит на запрос", None), ("групповой коммит", "queue")]
+    try:
+        print(f"Запросов: {len(requests)}, сессий: {args.events} x {args.capacity} мест, "
+              f"одновременно: {args.concurrency}, база: {directory}")
+        for name, mode in modes:
+            db = prepare(directory, args.events, args.capacity)
+            queue = RegistrationQueue(db, args.max_batch, args.delay_ms / 1000) if mode else None
+            elapsed, latencies, results = await run_mode(db, requests, args.concurrency, queue)
+            problems = check_seats(db, requests, args.capacity)
+            ms = [value * 1000 for value in latencies]
+            print(f"\n{name}: {len(requests) / elapsed:.0f} запросов/с за {elapsed:.2f} с, "
+                  f"p50 {percentile(ms, 50):.1f} мс, p99 {percentile(ms, 99):.1f} мс")
+            print(f"  результаты: {dict(results)}")
+            print(f"  учет мест: {'ок' if not problems else '; '.join(problems)}")
+            registered = db.conn.execute("SELECT COUNT(*) FROM registrations").fetchone()[0]
+            print(f"  записей в базе: {registered}")
+            db.conn.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=3000)
+    parser.add_argument("--events", type=int, default=10)
+    parser.add_argument("--capacity", type=int, default=200)
+    parser.add_argument("--cancel-rate", type=float, default=0.05)
+    parser.add_argument("--concurrency", type=int, default=200, help="Одновременно ожидающих запросов")
+    parser.add_argument("--max-batch", type=int, default=100)
+    parser.add_argument("--delay-ms", type=float, default=5.0)
+    parser.add_argument("--dir", help="Где создать базу (важна файловая система: от нее зависит fsync)")
+    parser.add_argument("--seed", type=int, default=42)
+    asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""
+Объекты на отрисовку списков: кортежи + strptime против моделей из models.
+
+Прежний путь: Database возвращает кортежи, обработчик распаковывает их и
+разбирает дату strptime на каждой строке и при каждой отрисовке. Новый путь:
+row factory строит Event сразу с разобранным starts_at. Сравниваются
+две операции - страница /events (кнопки записи) и сверка напоминаний
+(все актуальные мероприятия).
+
+Для каждой операции: время и пик памяти за отрисовку по tracemalloc
+(сверх результата, то есть временные объекты: строки, кортежи, разбор дат).
+
+    python -m benchmarks.datagen --preset small --db bench.db
+    python -m benchmarks.render_alloc --db bench.db
+"""
+import argparse
+import statistics
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from telegram import InlineKeyboardButton
+
+from callback_router import pack
+from database import Database
+from query_stats import QUERY_STATS
+
+CB_EVENT = "ev"
+HOURS_TO_REMIND = 3
+
+LEGACY_PAGE_QUERY = '''
+    SELECT e.id, e.max_participants, e.end_date, e.event_time, e.info,
+        (SELECT COUNT(*) FROM registrations r WHERE r.event_id = e.id) as current_participants
+    FROM events e
+    WHERE e.starts_at > datetime('now', '-6 hours')
+    ORDER BY e.starts_at, e.id
+    LIMIT ?
+'''
+
+LEGACY_ALL_QUERY = '''
+    SELECT e.id, e.max_participants, e.end_date, e.event_time, e.info, COUNT(r.user_id)
+    FROM events e
+    LEFT JOIN registrations r ON e.id = r.event_id
+    WHERE e.starts_at > datetime('now', '-6 hours')
+    GROUP BY e.id
+'''
+
+
+def legacy_page(conn, limit):
+    keyboard = []
+    for event in conn.execute(LEGACY_PAGE_QUERY, (limit,)).fetchall():
+        event_id, max_p, end_date, event_time, info, current = event
+        available = max_p - current
+        formatted_date = datetime.strptime(end_date, "%Y-%m-%d").strftime("%d.%m.%Y")
+        event_text = f"{formatted_date} {event_time} | {available}/{max_p} | {info}"
+        keyboard.append([InlineKeyboardButton(event_text, callback_data=pack(CB_EVENT, event_id))])
+    return keyboard
+
+
+def models_page(db, limit):
+    keyboard = []
+    for event in db.get_events_page(limit=limit)[0]:
+        event_text = f"{event.date_text} {event.event_time} | {event.available}/{event.max_participants} | {event.info}"
+        keyboard.append([InlineKeyboardButton(event_text, callback_data=pack(CB_EVENT, event.id))])
+    return keyboard
+
+
+def legacy_reminders(conn):
+    now = datetime.now()
+    wanted = {}
+    for event in conn.execute(LEGACY_ALL_QUERY).fetchall():
+        event_id, _, end_date_str, event_time_str = event[:4]
+        event_datetime = datetime.strptime(f"{end_date_str} {event_time_str}", "%Y-%m-%d %H:%M")
+        reminder_time = event_datetime - timedelta(hours=HOURS_TO_REMIND)
+        if reminder_time > now:
+            wanted[f"reminder_{event_id}"] = (event_id, reminder_time)
+    return wanted
+
+
+def models_reminders(db):
+    now = datetime.now()
+    wanted = {}
+    for event in db.get_all_events():
+        reminder_time = event.starts_at - timedelta(hours=HOURS_TO_REMIND)
+        if reminder_time > now:
+            wanted[f"reminder_{event.id}"] = (event.id, reminder_time)
+    return wanted
+
+
+def measure(func, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        timings.append((time.perf_counter() - started) * 1000)
+
+    tracemalloc.start()
+    result = func()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return statistics.median(timings), (peak - retained) / 1024, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--db", required=True)
+    parser.add_argument("--page-size", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    QUERY_STATS.threshold_ms = None
+    db = Database(args.db)
+    cases = [
+        ("страница /events", lambda: legacy_page(db.conn, args.page_size), lambda: models_page(db, args.page_size)),
+        ("сверка напоминаний", lambda: legacy_reminders(db.conn), lambda: models_reminders(db)),
+    ]
+    for name, legacy, models in cases:
+        print(f"\n{name}:")
+        results = []
+        for label, func in (("кортежи + strptime", legacy), ("модели", models)):
+            median_ms, temporary_kb, result = measure(func, args.repeat)
+            results.append(result)
+            print(f"  {label:19} {median_ms:9.3f} мс  временные объекты {temporary_kb:9.1f} КБ")
+        if results[0] != results[1]:
+            print("  ⚠️ результаты отличаются")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+Воспроизведение записанного трафика (UpdateRecorder, [Recorder] в bot_config.ini)
+против настоящего приложения event_bot_main на временной базе.
+
+Обновления подаются в FakeBotAPI с исходными интервалами, деленными на --speed
+(--speed 0 - без пауз). Задержка - от попадания обновления в getUpdates до конца
+обработки. Результаты в формате benchmarks.db_bench, их можно сравнивать между сборками.
+
+    python -m benchmarks.replay recordings/traffic_2025-05-01_10-00-00.jsonl.gz --db snapshot.db --speed 10
+    python -m benchmarks.replay trace.jsonl.gz --output new.json --compare old.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+
+from telegram import Update
+from telegram.ext import TypeHandler
+
+import event_bot_main as bot
+from benchmarks.datagen import PRESETS, generate
+from benchmarks.db_bench import compare, git_commit, percentile
+from benchmarks.fake_bot_api import FakeBotAPI
+from benchmarks.load_test import DONE_GROUP
+from callback_router import unpack
+from database import Database
+from query_stats import QUERY_STATS
+from sqlite_persistence import SQLitePersistence
+from update_recorder import read_trace
+
+
+def category(update):
+    """Команда, префикс callback_data или тип обновления - для разбивки задержек"""
+    message = update.get("message")
+    if message:
+        text = message.get("text") or ""
+        return text.split()[0].split("@")[0] if text.startswith("/") else "text"
+    query = update.get("callback_query")
+    if query:
+        return f"cb:{unpack(query.get('data'))[0]}"
+    return next((key for key in update if key != "update_id"), "other")
+
+
+class Replayer:
+    def __init__(self, api, timeout):
+        self.api = api
+        self.timeout = timeout
+        self.latencies = defaultdict(list)
+        self.unfinished = Counter()
+        self.max_lag = 0.0
+        self._waiters = {}
+
+    async def mark_done(self, update: Update, context):
+        future = self._waiters.pop(update.update_id, None)
+        if future and not future.done():
+            future.set_result(time.perf_counter())
+
+    async def _await(self, name, update_id, future, sent_at):
+        try:
+            finished_at = await asyncio.wait_for(future, self.timeout)
+            self.latencies[name].append(finished_at - sent_at)
+        except asyncio.TimeoutError:
+            # Отброшено антифлудом или не дошло до конца обработки
+            self._waiters.pop(update_id, None)
+            self.unfinished[name] += 1
+
+    async def replay(self, records, speed):
+        tasks = []
+        loop = asyncio.get_running_loop()
+        first_t = None
+        started = time.perf_counter()
+        for record in records:
+            first_t = record["t"] if first_t is None else first_t
+            if speed:
+                scheduled = started + (record["t"] - first_t) / speed
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                self.max_lag = max(self.max_lag, time.perf_counter() - scheduled)
+
+            name = category(record["update"])
+            update = self.api.inject_update(record["update"])
+            future = self._waiters[update["update_id"]] = loop.create_future()
+            tasks.append(asyncio.create_task(self._await(name, update["update_id"], future, time.perf_counter())))
+
+        await asyncio.gather(*tasks)
+        return time.perf_counter() - started
+
+    def results(self):
+        results = {}
+        all_ms = []
+        for name, values in sorted(self.latencies.items()):
+            ms = [value * 1000 for value in values]
+            all_ms.extend(ms)
+            results[name] = {
+                "runs": len(ms),
+                "min_ms": round(min(ms), 4),
+                "median_ms": round(statistics.median(ms), 4),
+                "p95_ms": round(percentile(ms, 95), 4),
+                "p99_ms": round(percentile(ms, 99), 4),
+            }
+        if all_ms:
+            results["all"] = {
+                "runs": len(all_ms),
+                "min_ms": round(min(all_ms), 4),
+                "median_ms": round(statistics.median(all_ms), 4),
+                "p95_ms": round(percentile(all_ms, 95), 4),
+                "p99_ms": round(percentile(all_ms, 99), 4),
+            }
+        return results
+
+
+def prepare_database(workdir, snapshot):
+    path = os.path.join(workdir, "events.db")
+    if snapshot:
+        # Копия через backup API: снимок согласован, даже если бот сейчас пишет в базу
+        source = sqlite3.connect(f"file:{snapshot}?mode=ro", uri=True)
+        target = sqlite3.connect(path)
+        source.backup(target)
+        source.close()
+        target.close()
+    else:
+        generate(path, *PRESETS["small"], progress=lambda message: None)
+    return Database(path)
+
+
+async def run(args):
+    header, records = read_trace(args.trace)
+    QUERY_STATS.threshold_ms = None
+    logging.getLogger().setLevel(logging.WARNING)
+
+    workdir = tempfile.mkdtemp(prefix="eventsbot-replay-")
+    bot.db = prepare_database(workdir, args.db)
+    bot.persistence = SQLitePersistence(os.path.join(workdir, "persistence.db"), update_interval=60)
+    # Псевдонимы администраторов из записи становятся администраторами
+    bot.ADMIN_IDS[:] = header.get("admin_ids", [])
+    bot.antiflood.exempt_ids.update(bot.ADMIN_IDS)
+
+    api = await FakeBotAPI().start()
+    replayer = Replayer(api, args.timeout)
+    application = bot.build_application(token=api.token, base_url=api.base_url)
+    application.add_handler(TypeHandler(Update, replayer.mark_done), group=DONE_GROUP)
+    await application.initialize()
+    await application.start()
+    await application.updater.start_polling(poll_interval=0, timeout=10)
+
+    elapsed = await replayer.replay(records, args.speed)
+
+    await application.updater.stop()
+    await application.stop()
+    await application.shutdown()
+    await api.stop()
+    shutil.rmtree(workdir, ignore_errors=True)
+
+    results = replayer.results()
+    total = sum(result["runs"] for name, result in results.items() if name != "all")
+    print(f"Обновлений: {total + sum(replayer.unfinished.values())}, время: {elapsed:.1f} с, "
+          f"пропускная способность: {total / elapsed:.1f} обновлений/с, "
+          f"макс. отставание от расписания: {replayer.max_lag * 1000:.0f} мс")
+    print(f"{'категория':16} {'n':>6} {'p50':>9} {'p95':>9} {'p99':>9}")
+    for name, r in results.items():
+        print(f"{name:16} {r['runs']:6} {r['median_ms']:7.1f}мс {r['p95_ms']:7.1f}мс {r['p99_ms']:7.1f}мс")
+    print(f"Вызовы Bot API: {dict(api.calls.most_common())}")
+    if replayer.unfinished:
+        print(f"Не дошли до конца обработки: {dict(replayer.unfinished)}")
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "trace": os.path.abspath(args.trace),
+            "speed": args.speed,
+            "elapsed_s": round(elapsed, 3),
+            "throughput": round(total / elapsed, 3),
+            "unfinished": dict(replayer.unfinished),
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены: {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+        if regressions:
+            print(f"❌ Регрессии ({len(regressions)}): {', '.join(regressions)}")
+            return False
+        print("✅ Регрессий нет")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("trace", help="Файл записи traffic_*.jsonl.gz")
+    parser.add_argument("--db", help="Снимок базы бота (копируется); по умолчанию синтетическая база small")
+    parser.add_argument("--speed", type=float, default=1.0, help="Ускорение; 0 - без пауз")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Ожидание обработки одного обновления, сек")
+    parser.add_argument("--output", help="Сохранить результаты в JSON")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    parser.add_argument("--min-delta-ms", type=float, default=0.5)
+    if not asyncio.run(run(parser.parse_args())):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Холодный старт бота: каждый прогон - новый процесс Python.
+
+Замеряются время импорта event_bot_main, RSS процесса после импорта и время
+до первого обработанного обновления (от запуска процесса до конца обработки
+/start, пришедшего через FakeBotAPI). Также выводится, какие тяжелые модули
+загружены при старте - они должны импортироваться лениво.
+
+    python -m benchmarks.startup --runs 10 --output startup.json
+    python -m benchmarks.startup --compare startup.json
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+# Не нужны боту до первой выгрузки или отчета
+HEAVY_MODULES = ("openpyxl", "pandas", "numpy", "matplotlib")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def rss_mb():
+    """Текущий RSS процесса; без /proc - пиковый из getrusage"""
+    try:
+        with open("/proc/self/status", encoding="ascii") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux - килобайты, macOS - байты
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+async def first_update(bot, workdir):
+    """Запускает приложение против FakeBotAPI и ждет обработки первого /start"""
+    from telegram import Update
+    from telegram.ext import TypeHandler
+
+    from benchmarks.fake_bot_api import FakeBotAPI
+    from benchmarks.load_test import DONE_GROUP
+    from database import Database
+    from sqlite_persistence import SQLitePersistence
+
+    bot.db = Database(os.path.join(workdir, "events.db"))
+    bot.persistence = SQLitePersistence(os.path.join(workdir, "persistence.db"), update_interval=60)
+    api = await FakeBotAPI().start()
+    done = asyncio.get_running_loop().create_future()
+
+    async def mark_done(update: Update, context):
+        if not done.done():
+            done.set_result(time.time())
+
+    application = bot.build_application(token=api.token, base_url=api.base_url)
+    application.add_handler(TypeHandler(Update, mark_done), group=DONE_GROUP)
+    await application.initialize()
+    await application.start()
+    await application.updater.start_polling(poll_interval=0, timeout=10)
+    api.inject_update(api.make_message_update(1, "/start"))
+    finished_at = await asyncio.wait_for(done, 30)
+
+    await application.updater.stop()
+    await application.stop()
+    await application.shutdown()
+    await api.stop()
+    return finished_at
+
+
+def child(spawned_at):
+    started = time.perf_counter()
+    import event_bot_main as bot
+    import_ms = (time.perf_counter() - started) * 1000
+    rss = rss_mb()
+    heavy = [name for name in HEAVY_MODULES if name in sys.modules]
+
+    logging.getLogger().setLevel(logging.WARNING)
+    workdir = tempfile.mkdtemp(prefix="eventsbot-startup-")
+    try:
+        finished_at = asyncio.run(first_update(bot, workdir))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    print(json.dumps({
+        "import_ms": import_ms,
+        "first_update_ms": (finished_at - spawned_at) * 1000,
+        "rss_mb": rss,
+        "heavy_modules": heavy,
+    }))
+
+
+def run_once():
+    spawned_at = time.time()
+    result = subprocess.run(
+        [sys.executable, "-m", "benchmarks.startup", "--child", str(spawned_at)],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if result.returncode:
+        sys.stderr.write(result.stderr)
+        raise SystemExit(f"Прогон завершился с кодом {result.returncode}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def summarize(values, percentile):
+    return {
+        "runs": len(values),
+        "min_ms": round(min(values), 3),
+        "median_ms": round(statistics.median(values), 3),
+        "p95_ms": round(percentile(values, 95), 3),
+        "p99_ms": round(percentile(values, 99), 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--output", help="Сохранить результаты в JSON")
+    parser.add_argument("--compare", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    parser.add_argument("--min-delta-ms", type=float, default=20.0)
+    parser.add_argument("--child", type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child is not None:
+        child(args.child)
+        return
+
+    # db_bench импортирует export_handler, поэтому только в родительском процессе
+    from benchmarks.db_bench import compare, git_commit, percentile
+
+    runs = [run_once() for _ in range(args.runs)]
+    results = {
+        "import event_bot_main": summarize([run["import_ms"] for run in runs], percentile),
+        "time to first update": summarize([run["first_update_ms"] for run in runs], percentile),
+    }
+    rss = statistics.median(run["rss_mb"] for run in runs)
+    heavy = sorted({name for run in runs for name in run["heavy_modules"]})
+
+    for name, r in results.items():
+        print(f"{name:24} min {r['min_ms']:8.1f} мс, медиана {r['median_ms']:8.1f} мс")
+    print(f"RSS после импорта: {rss:.1f} МБ")
+    print(f"Тяжелые модули при старте: {', '.join(heavy) if heavy else 'нет'}")
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": sys.version.split()[0],
+            "rss_mb": round(rss, 1),
+            "heavy_modules": heavy,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены: {args.output}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        print(f"RSS: {baseline['meta'].get('rss_mb')} -> {round(rss, 1)} МБ")
+        regressions = compare(results, baseline, args.threshold, args.min_delta_ms)
+        if regressions:
+            print(f"❌ Регрессии ({len(regressions)}): {', '.join(regressions)}")
+            sys.exit(1)
+        print("✅ Регрессий нет")
+
+
+if __name__ == "__main__":
+    main()
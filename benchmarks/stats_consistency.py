@@ -0,0 +1,120 @@
+"""
+Статистика посещаемости против живых запросов у границ времени начала.
+
+starts_at - местное время, и "сейчас" в SQL везде местное: триггеры event_stats
+решают, началась ли сессия (отмена записи или удаление сессии), а списки
+(get_all_events, get_user_events) показывают сессии еще 6 часов после начала.
+Для нескольких часовых поясов создаются сессии за минуты до и после обеих
+границ; каждая проверка сравнивается с datetime.now(), от которого считаются
+напоминания и периоды /stats. При расхождении часов SQL и Python на смещение
+от UTC проверка падает.
+
+    python -m benchmarks.stats_consistency
+"""
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+from database import Database
+from query_stats import QUERY_STATS
+
+TIMEZONES = ["UTC", "Europe/Moscow", "America/New_York", "Asia/Vladivostok"]
+# Смещения начала сессий от текущего момента: по обе стороны от начала и от конца окна списков
+OFFSETS = [
+    timedelta(minutes=2), timedelta(minutes=-2),
+    timedelta(hours=-6, minutes=2), timedelta(hours=-6, minutes=-2),
+]
+LISTED_FOR = timedelta(hours=6)
+
+
+def set_timezone(name):
+    os.environ["TZ"] = name
+    time.tzset()
+
+
+def check_timezone(name):
+    set_timezone(name)
+    db = Database(":memory:")
+    now = datetime.now()
+    # Секунды отбрасываются: время сессии задается с точностью до минуты
+    events = {}
+    for offset in OFFSETS:
+        starts_at = (now + offset).replace(second=0, microsecond=0)
+        event_id = db.add_event(2, starts_at.strftime("%Y-%m-%d"), starts_at.strftime("%H:%M"), f"{offset}")
+        events[event_id] = starts_at
+        db.register_user(1, "first", event_id)
+        db.register_user(2, "second", event_id)
+        db.delete_registration(1, event_id)
+
+    errors = []
+    upcoming = {event_id for event_id, starts_at in events.items() if starts_at > now}
+    listed = {event_id for event_id, starts_at in events.items() if starts_at > now - LISTED_FOR}
+
+    live = {event.id for event in db.get_all_events()}
+    if live != listed:
+        errors.append(f"{name}: get_all_events {sorted(live)}, ожидались {sorted(listed)}")
+    mine = {event.id for event in db.get_user_events(2)}
+    if mine != listed:
+        errors.append(f"{name}: get_user_events {sorted(mine)}, ожидались {sorted(listed)}")
+
+    for event_id, starts_at in events.items():
+        participants, cancellations = db.conn.execute(
+            "SELECT participants, cancellations FROM event_stats WHERE event_id = ?", (event_id,)
+        ).fetchone()
+        live_participants = len(db.get_event_participant_ids(event_id))
+        # До начала отмена уменьшает участников; после начала записавшийся считается пришедшим
+        expected = (1, 1) if event_id in upcoming else (2, 0)
+        if (participants, cancellations) != expected:
+            errors.append(
+                f"{name}: сессия в {starts_at:%H:%M} (сейчас {now:%H:%M}): участников/отмен "
+                f"{participants}/{cancellations}, ожидалось {expected[0]}/{expected[1]}"
+            )
+        if live_participants != 1:
+            errors.append(f"{name}: сессия в {starts_at:%H:%M}: в базе {live_participants} записей, ожидалась 1")
+
+    db.delete_events(list(events))
+    cancelled = {row[0] for row in db.conn.execute("SELECT event_id FROM event_stats WHERE cancelled")}
+    if cancelled != upcoming:
+        errors.append(f"{name}: отменены сессии {sorted(cancelled)}, ожидались {sorted(upcoming)}")
+
+    # Дневные суммы должны сойтись с event_stats по неотмененным сессиям
+    daily = db.conn.execute("SELECT SUM(participants), SUM(cancellations) FROM attendance_daily").fetchone()
+    per_event = db.conn.execute(
+        "SELECT SUM(participants), SUM(cancellations) FROM event_stats WHERE NOT cancelled"
+    ).fetchone()
+    if tuple(daily) != tuple(per_event):
+        errors.append(f"{name}: attendance_daily {tuple(daily)}, event_stats {tuple(per_event)}")
+    db.conn.close()
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tz", action="append", help="Часовой пояс (можно несколько); по умолчанию набор поясов")
+    args = parser.parse_args()
+
+    QUERY_STATS.threshold_ms = None
+    timezones = args.tz or TIMEZONES
+    initial = os.environ.get("TZ")
+    errors = []
+    try:
+        for name in timezones:
+            errors.extend(check_timezone(name))
+    finally:
+        if initial is None:
+            os.environ.pop("TZ", None)
+        else:
+            os.environ["TZ"] = initial
+        time.tzset()
+
+    if errors:
+        print("❌ Статистика расходится с живыми запросами:")
+        print("\n".join(errors))
+        sys.exit(1)
+    print(f"✅ Поясов: {len(timezones)}, границы начала и окна списков совпадают с datetime.now()")
+
+
+if __name__ == "__main__":
+    main()
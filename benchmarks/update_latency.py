@@ -0,0 +1,124 @@
+"""
+Задержка доставки обновлений: polling против webhook.
+
+Отправитель-заглушка кладет обновления в FakeBotAPI (для polling)
+или шлет их POST-запросом на webhook (как это делает Telegram),
+замеряется время до вызова обработчика.
+
+    python -m benchmarks.update_latency --updates 500
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+from telegram import Update
+from telegram.ext import Application, TypeHandler
+
+from benchmarks.fake_bot_api import FakeBotAPI
+
+SECRET_TOKEN = "benchmark-secret"
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def summarize(name, latencies):
+    ms = [value * 1000 for value in latencies]
+    print(
+        f"{name:8} n={len(ms):5} "
+        f"p50={percentile(ms, 50):7.2f}ms p95={percentile(ms, 95):7.2f}ms "
+        f"p99={percentile(ms, 99):7.2f}ms max={max(ms):7.2f}ms mean={statistics.mean(ms):7.2f}ms"
+    )
+
+
+async def build_application(api, sent_at, latencies, done):
+    application = Application.builder().token(api.token).base_url(api.base_url).build()
+
+    async def record(update: Update, context):
+        latencies.append(time.perf_counter() - sent_at[update.update_id])
+        if len(latencies) == len(sent_at):
+            done.set()
+
+    application.add_handler(TypeHandler(Update, record))
+    await application.initialize()
+    await application.start()
+    return application
+
+
+async def measure_polling(updates, interval):
+    api = await FakeBotAPI().start()
+    sent_at, latencies, done = {}, [], asyncio.Event()
+    application = await build_application(api, sent_at, latencies, done)
+    await application.updater.start_polling(poll_interval=0, timeout=10)
+
+    for i in range(updates):
+        update = api.inject_update(api.make_message_update(user_id=1 + i % 50, text="ping"))
+        sent_at[update["update_id"]] = time.perf_counter()
+        await asyncio.sleep(interval)
+
+    await asyncio.wait_for(done.wait(), 30)
+    await application.updater.stop()
+    await application.stop()
+    await application.shutdown()
+    await api.stop()
+    return latencies, api.calls["getUpdates"]
+
+
+async def measure_webhook(updates, interval, port):
+    api = await FakeBotAPI().start()
+    sent_at, latencies, done = {}, [], asyncio.Event()
+    application = await build_application(api, sent_at, latencies, done)
+    await application.updater.start_webhook(
+        listen="127.0.0.1",
+        port=port,
+        url_path="bot",
+        secret_token=SECRET_TOKEN
+    )
+
+    url = f"http://127.0.0.1:{port}/bot"
+    rejected = 0
+    async with httpx.AsyncClient() as client:
+        # Запрос без секрета должен быть отклонен
+        response = await client.post(url, json={"update_id": 0})
+        rejected += response.status_code == 403
+
+        for i in range(updates):
+            update = api.make_message_update(user_id=1 + i % 50, text="ping")
+            update["update_id"] = i + 1
+            sent_at[update["update_id"]] = time.perf_counter()
+            await client.post(url, json=update, headers={"X-Telegram-Bot-Api-Secret-Token": SECRET_TOKEN})
+            await asyncio.sleep(interval)
+
+    await asyncio.wait_for(done.wait(), 30)
+    await application.updater.stop()
+    await application.stop()
+    await application.shutdown()
+    await api.stop()
+    return latencies, rejected
+
+
+async def run(args):
+    latencies, polls = await measure_polling(args.updates, args.interval)
+    summarize("polling", latencies)
+    print(f"         getUpdates вызовов: {polls}")
+
+    latencies, rejected = await measure_webhook(args.updates, args.interval, args.port)
+    summarize("webhook", latencies)
+    print(f"         отклонено без secret token: {rejected}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--updates", type=int, default=300)
+    parser.add_argument("--interval", type=float, default=0.002, help="Пауза между обновлениями, сек")
+    parser.add_argument("--port", type=int, default=18443, help="Локальный порт webhook")
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
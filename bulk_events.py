@@ -0,0 +1,163 @@
+import csv
+import io
+import re
+from datetime import datetime, timedelta
+
+# Ограничение на одну пачку: одна транзакция и одно сообщение с предпросмотром
+MAX_BULK_EVENTS = 200
+
+WEEKDAYS = {"пн": 0, "вт": 1, "ср": 2, "чт": 3, "пт": 4, "сб": 5, "вс": 6}
+
+RULE_PREFIX = "еженедельно"
+
+SHIFT_UNITS = {"д": 1440, "d": 1440, "ч": 60, "h": 60, "м": 1, "m": 1}
+SHIFT_TOKEN = re.compile(r"([+-]?)\s*(\d+)\s*(д|d|ч|h|м|m)", re.IGNORECASE)
+
+HELP_TEXT = (
+    "Отправьте список сессий - по одной в строке:\n"
+    "ГГГГ-ММ-ДД;ЧЧ:ММ;мест;описание\n\n"
+    "или правило повторения:\n"
+    f"{RULE_PREFIX} ГГГГ-ММ-ДД ГГГГ-ММ-ДД пн,ср ЧЧ:ММ мест описание\n"
+    "(с какой даты, по какую, дни недели, время, мест, описание)\n\n"
+    "Можно прислать файл .csv или .txt в том же формате. /cancel - отмена."
+)
+
+
+def validate_row(end_date, event_time, max_participants, info, today):
+    """(max_participants, end_date, event_time, info) в формате таблицы events или ValueError"""
+    try:
+        date = datetime.strptime(end_date.strip(), "%Y-%m-%d").date()
+    except ValueError:
+        raise ValueError(f"дата '{end_date}' не в формате ГГГГ-ММ-ДД")
+    if date < today:
+        raise ValueError(f"дата {end_date} в прошлом")
+    try:
+        time = datetime.strptime(event_time.strip(), "%H:%M").time()
+    except ValueError:
+        raise ValueError(f"время '{event_time}' не в формате ЧЧ:ММ")
+    try:
+        max_p = int(str(max_participants).strip())
+    except ValueError:
+        raise ValueError(f"число мест '{max_participants}' не целое")
+    if max_p <= 0:
+        raise ValueError("число мест должно быть положительным")
+    info = info.strip()
+    if not info:
+        raise ValueError("пустое описание")
+    return max_p, date.strftime("%Y-%m-%d"), time.strftime("%H:%M"), info
+
+
+def parse_rule(text, today):
+    """Строка 'еженедельно с по дни время мест описание' -> список строк событий"""
+    parts = text.split(maxsplit=6)
+    if len(parts) < 7:
+        raise ValueError(f"в правиле не хватает полей, формат: {RULE_PREFIX} с по дни время мест описание")
+    _, start, end, days, event_time, max_p, info = parts
+    try:
+        start_date = datetime.strptime(start, "%Y-%m-%d").date()
+        end_date = datetime.strptime(end, "%Y-%m-%d").date()
+    except ValueError:
+        raise ValueError("даты правила не в формате ГГГГ-ММ-ДД")
+    if end_date < start_date:
+        raise ValueError("конечная дата правила раньше начальной")
+    try:
+        weekdays = {WEEKDAYS[day.strip().lower()] for day in days.split(",") if day.strip()}
+    except KeyError as e:
+        raise ValueError(f"неизвестный день недели {e}, используйте {','.join(WEEKDAYS)}")
+    if not weekdays:
+        raise ValueError("не указаны дни недели")
+
+    dates = []
+    day = max(start_date, today)
+    while day <= end_date and len(dates) <= MAX_BULK_EVENTS:
+        if day.weekday() in weekdays:
+            dates.append(day.strftime("%Y-%m-%d"))
+        day += timedelta(days=1)
+    return [(date, event_time, max_p, info) for date in dates]
+
+
+def split_rows(text):
+    """Строки таблицы: разделитель ';', табуляция или ',' (по первой строке)"""
+    first = next((line for line in text.splitlines() if line.strip()), "")
+    delimiter = ";" if ";" in first else "\t" if "\t" in first else ","
+    return list(csv.reader(io.StringIO(text), delimiter=delimiter))
+
+
+def parse_events(text, today=None):
+    """
+    Разбирает и проверяет весь список разом.
+    Возвращает (строки для Database.add_events, ошибки вида 'строка N: ...').
+    """
+    today = today or datetime.now().date()
+    text = text.strip()
+    errors = []
+
+    if text.lower().startswith(RULE_PREFIX):
+        try:
+            raw_rows = [(1, row) for row in parse_rule(text, today)]
+        except ValueError as e:
+            return [], [f"правило: {str(e)}"]
+        if not raw_rows:
+            return [], ["правило: в заданном диапазоне нет подходящих дней"]
+    else:
+        raw_rows = []
+        for number, cells in enumerate(split_rows(text), start=1):
+            if not cells or not "".join(cells).strip() or cells[0].lstrip().startswith("#"):
+                continue
+            # Заголовок таблицы
+            if number == 1 and not any(ch.isdigit() for ch in cells[0]):
+                continue
+            if len(cells) < 4:
+                errors.append(f"строка {number}: нужно 4 поля (дата;время;мест;описание)")
+                continue
+            # Описание может содержать разделитель
+            raw_rows.append((number, (cells[0], cells[1], cells[2], ";".join(cells[3:]))))
+
+    if len(raw_rows) > MAX_BULK_EVENTS:
+        return [], [f"слишком много сессий: {len(raw_rows)}, максимум {MAX_BULK_EVENTS}"]
+
+    rows = []
+    seen = set()
+    for number, (end_date, event_time, max_p, info) in raw_rows:
+        try:
+            row = validate_row(end_date, event_time, max_p, info, today)
+        except ValueError as e:
+            errors.append(f"строка {number}: {str(e)}")
+            continue
+        if row[1:] in seen:
+            errors.append(f"строка {number}: повтор {row[1]} {row[2]}")
+            continue
+        seen.add(row[1:])
+        rows.append(row)
+    return rows, errors
+
+
+def parse_shift(text):
+    """'+1д 2ч', '-30м', '+90m' -> сдвиг в минутах; знак первого слагаемого действует дальше"""
+    text = text.strip().lower()
+    if not text or SHIFT_TOKEN.sub("", text).strip():
+        raise ValueError("сдвиг в формате +1д, -2ч, +30м (можно сочетать: +1д 2ч)")
+    minutes = 0
+    sign = 1
+    for token_sign, amount, unit in SHIFT_TOKEN.findall(text):
+        if token_sign:
+            sign = -1 if token_sign == "-" else 1
+        minutes += sign * int(amount) * SHIFT_UNITS[unit]
+    if minutes == 0:
+        raise ValueError("сдвиг равен нулю")
+    return minutes
+
+
+def format_preview(rows, errors, limit=15):
+    lines = [f"Будет создано сессий: {len(rows)}"]
+    for max_p, end_date, event_time, info in rows[:limit]:
+        lines.append(f"• {end_date} {event_time}, мест: {max_p} - {info[:40]}")
+    if len(rows) > limit:
+        lines.append(f"… и еще {len(rows) - limit}")
+    if errors:
+        lines.append("")
+        lines.append(f"⚠️ Ошибки ({len(errors)}), эти строки не будут созданы:")
+        lines.extend(errors[:limit])
+        if len(errors) > limit:
+            lines.append(f"… и еще {len(errors) - limit}")
+    return "\n".join(lines)
@@ -0,0 +1,97 @@
+import logging
+
+from telegram import Update
+from telegram.ext import CallbackQueryHandler, ContextTypes
+
+logger = logging.getLogger(__name__)
+
+SEPARATOR = ":"
+DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+
+
+def _to_base36(value: int) -> str:
+    if value < 0:
+        return "-" + _to_base36(-value)
+    result = ""
+    while True:
+        value, rest = divmod(value, 36)
+        result = DIGITS[rest] + result
+        if not value:
+            return result
+
+
+def pack(prefix: str, *values: int) -> str:
+    """pack("ev", 123) -> 'ev:3f'. Числа в base36, чтобы уложиться в 64 байта callback_data"""
+    return SEPARATOR.join([prefix, *(_to_base36(int(value)) for value in values)])
+
+
+def unpack(data: str):
+    """'ev:3f' -> ('ev', (123,)). Для данных не в формате кодека числа пустые"""
+    prefix, *values = (data or "").split(SEPARATOR)
+    try:
+        return prefix, tuple(int(value, 36) for value in values)
+    except ValueError:
+        return prefix, None
+
+
+def callback_args(update: Update) -> tuple:
+    """Числовые аргументы из callback_data текущего запроса"""
+    return unpack(update.callback_query.data)[1]
+
+
+class CallbackRouter:
+    """
+    Таблица prefix -> обработчик вместо цепочки CallbackQueryHandler с регулярками.
+    Префикс определяется одним split, обработчик ищется в словаре за O(1).
+    """
+
+    def __init__(self):
+        # prefix -> (callback, arity, answer)
+        self._routes = {}
+
+    def add(self, prefix: str, callback, arity: int = 0, answer: bool = False):
+        """
+        arity - сколько чисел ожидается после префикса,
+        answer - ответить на callback_query до вызова (если обработчик сам этого не делает)
+        """
+        if SEPARATOR in prefix:
+            raise ValueError(f"Префикс не может содержать '{SEPARATOR}': {prefix}")
+        if prefix in self._routes:
+            raise ValueError(f"Префикс уже зарегистрирован: {prefix}")
+        self._routes[prefix] = (callback, arity, answer)
+
+    def resolve(self, data: str):
+        """Обработчик для callback_data или None"""
+        prefix, values = unpack(data)
+        route = self._routes.get(prefix)
+        if route is None or values is None or len(values) != route[1]:
+            return None
+        return route[0]
+
+    @staticmethod
+    def pattern(prefix: str, arity: int = 0):
+        """Фильтр для CallbackQueryHandler внутри ConversationHandler (вместо регулярки)"""
+        def check(data):
+            data_prefix, values = unpack(data)
+            return data_prefix == prefix and values is not None and len(values) == arity
+        return check
+
+    async def dispatch(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        query = update.callback_query
+        prefix, values = unpack(query.data)
+        route = self._routes.get(prefix)
+
+        if route is None or values is None or len(values) != route[1]:
+            logger.warning(f"Неизвестный callback от {query.from_user.id}: {query.data}")
+            await query.answer()
+            await query.edit_message_text("⚠️ Команда не распознана")
+            return
+
+        callback, _, answer = route
+        logger.info(f"User {query.from_user.id} pressed button: {query.data}")
+        if answer:
+            await query.answer()
+        return await callback(update, context)
+
+    def handler(self) -> CallbackQueryHandler:
+        return CallbackQueryHandler(self.dispatch)
@@ -1,18 +1,72 @@
 import sqlite3
 import logging
+import re
 
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    level=logging.INFO
-)
+from metrics import observe_db
+from models import event_row, registration_row, user_row
+from query_stats import TimedConnection
 
 logger = logging.getLogger(__name__)
 
+# Результаты записи на сессию
+REGISTERED = "registered"
+DUPLICATE = "duplicate"
+FULL = "full"
+
+# Слова поискового запроса: не больше SEARCH_MAX_TERMS, каждое как префикс
+SEARCH_MAX_TERMS = 8
+SEARCH_TERM = re.compile(r"\w+")
+# Окна поиска по неделям: первое и наибольшее (число недель в одном запросе FTS5)
+SEARCH_FIRST_WEEKS = 4
+SEARCH_MAX_WEEKS = 32
+
+
+def fts_query(text):
+    """'Йога утр' -> '"йога"* "утр"*' (все слова, по префиксу) или None, если слов нет"""
+    terms = SEARCH_TERM.findall((text or "").lower())[:SEARCH_MAX_TERMS]
+    if not terms:
+        return None
+    # Кавычки: слова вроде AND/OR/NEAR не становятся операторами FTS5
+    return " ".join(f'"{term}"*' for term in terms)
+
+# Сколько мс запись ждет, пока коммитит другое соединение (persistence, аренда
+# лидера, past_events_manager). Соединение работает в потоке event loop, и все
+# это время бот не отвечает
+BUSY_TIMEOUT_MS = 2000
+
+JOURNAL_MODES = {"WAL", "DELETE", "TRUNCATE", "PERSIST"}
+
+
 class Database:
-    def __init__(self, DATABASE_NAME):
-        self.conn = sqlite3.connect(DATABASE_NAME)
+    def __init__(self, DATABASE_NAME, journal_mode="WAL", busy_timeout_ms=BUSY_TIMEOUT_MS):
+        # Соединение используется только из потока event loop
+        self.database_name = DATABASE_NAME
+        self.conn = sqlite3.connect(DATABASE_NAME, timeout=busy_timeout_ms / 1000, factory=TimedConnection)
+        self.conn.execute(f"PRAGMA busy_timeout = {int(busy_timeout_ms)}")
+        self.set_journal_mode(journal_mode)
         self.create_tables()
 
+    def set_journal_mode(self, journal_mode):
+        """
+        WAL: выгрузки, снимок для отчетов и past_events_manager читают, не блокируя
+        записи бота, а записи не ждут читателей. Режим хранится в файле базы;
+        WAL требует, чтобы все процессы с базой работали на одном хосте
+        """
+        journal_mode = journal_mode.upper()
+        if journal_mode not in JOURNAL_MODES:
+            raise ValueError(f"Недопустимый режим журнала: {journal_mode}")
+        actual = self.conn.execute(f"PRAGMA journal_mode = {journal_mode}").fetchone()[0]
+        if actual.upper() != journal_mode and self.database_name != ":memory:":
+            logger.warning(f"Режим журнала {journal_mode} не включен, используется {actual}")
+
+    def open_reader(self):
+        """Отдельное соединение только для чтения (для экспорта в фоновом потоке)"""
+        if self.database_name == ":memory:":
+            return self.conn
+        return sqlite3.connect(
+            f"file:{self.database_name}?mode=ro", uri=True, check_same_thread=False, factory=TimedConnection
+        )
+
     def create_tables(self):
         cursor = self.conn.cursor()
         cursor.execute('''
@@ -35,6 +89,15 @@ class Database:
             cursor.execute('DROP TABLE IF EXISTS events')
             self.create_tables()
 
+        # Время начала как вычисляемый столбец с индексом - для keyset-пагинации
+        cursor.execute("PRAGMA table_xinfo(events)")
+        if 'starts_at' not in [column[1] for column in cursor.fetchall()]:
+            cursor.execute('''
+                ALTER TABLE events ADD COLUMN starts_at TEXT
+                GENERATED ALWAYS AS (datetime(end_date || ' ' || event_time)) VIRTUAL
+            ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_events_starts_at ON events(starts_at, id)")
+
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS registrations (
                 user_id INTEGER NOT NULL,
@@ -45,8 +108,250 @@ class Database:
                 FOREIGN KEY (event_id) REFERENCES events(id)
             )
         ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_registrations_event ON registrations(event_id)")
+
+        self.create_change_log(cursor)
+        self.create_search_index(cursor)
+        self.create_attendance_stats(cursor)
         self.conn.commit()
 
+    def create_search_index(self, cursor):
+        # Неделя начала (от начала эпохи) - служебный токен индекса, чтобы поиск
+        # не перебирал прошедшие мероприятия: их со временем большинство
+        cursor.execute("PRAGMA table_xinfo(events)")
+        if 'search_week' not in [column[1] for column in cursor.fetchall()]:
+            cursor.execute('''
+                ALTER TABLE events ADD COLUMN search_week TEXT
+                GENERATED ALWAYS AS ('w' || (CAST(strftime('%s', starts_at) AS INTEGER) / 604800)) VIRTUAL
+            ''')
+
+        # Полнотекстовый индекс по описанию (external content: текст хранится только в events)
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'events_fts'")
+        exists = cursor.fetchone() is not None
+        try:
+            cursor.execute('''
+                CREATE VIRTUAL TABLE IF NOT EXISTS events_fts USING fts5(
+                    info, search_week, content='events', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+                )
+            ''')
+        except sqlite3.OperationalError as e:
+            # SQLite собран без FTS5 - поиск работает через LIKE
+            logger.warning(f"FTS5 недоступен, поиск без индекса: {str(e)}")
+            self.fts_enabled = False
+            return
+        self.fts_enabled = True
+
+        triggers = {
+            'events_fts_insert': '''
+                AFTER INSERT ON events BEGIN
+                    INSERT INTO events_fts (rowid, info, search_week) VALUES (NEW.id, NEW.info, NEW.search_week);
+                END''',
+            'events_fts_delete': '''
+                AFTER DELETE ON events BEGIN
+                    INSERT INTO events_fts (events_fts, rowid, info, search_week)
+                    VALUES ('delete', OLD.id, OLD.info, OLD.search_week);
+                END''',
+            'events_fts_update': '''
+                AFTER UPDATE OF info, end_date, event_time ON events BEGIN
+                    INSERT INTO events_fts (events_fts, rowid, info, search_week)
+                    VALUES ('delete', OLD.id, OLD.info, OLD.search_week);
+                    INSERT INTO events_fts (rowid, info, search_week) VALUES (NEW.id, NEW.info, NEW.search_week);
+                END''',
+        }
+        for name, body in triggers.items():
+            cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+        if not exists:
+            # Индекс для мероприятий, созданных до появления поиска
+            cursor.execute("INSERT INTO events_fts (events_fts) VALUES ('rebuild')")
+
+    def create_attendance_stats(self, cursor):
+        # Статистика посещаемости, которую ведут триггеры: event_stats - по мероприятию
+        # (переживает удаление и очистку прошедших), attendance_daily - суммы по дню и часу
+        # начала. Отчет /stats читает только attendance_daily и не пересчитывает регистрации
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'event_stats'")
+        exists = cursor.fetchone() is not None
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS event_stats (
+                event_id INTEGER PRIMARY KEY,
+                starts_at TEXT,
+                max_participants INTEGER NOT NULL,
+                participants INTEGER NOT NULL DEFAULT 0,  -- сейчас; после начала не меняется
+                registrations INTEGER NOT NULL DEFAULT 0,  -- всего записей, включая отмененные
+                cancellations INTEGER NOT NULL DEFAULT 0,  -- отмены до начала
+                created_at DATETIME,
+                full_at DATETIME,  -- когда впервые заняты все места
+                cancelled INTEGER NOT NULL DEFAULT 0  -- мероприятие удалено до начала
+            )
+        ''')
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_event_stats_starts_at ON event_stats(starts_at)")
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS attendance_daily (
+                day DATE NOT NULL,
+                hour INTEGER NOT NULL,
+                events INTEGER NOT NULL DEFAULT 0,
+                capacity INTEGER NOT NULL DEFAULT 0,
+                participants INTEGER NOT NULL DEFAULT 0,
+                registrations INTEGER NOT NULL DEFAULT 0,
+                cancellations INTEGER NOT NULL DEFAULT 0,
+                full_events INTEGER NOT NULL DEFAULT 0,
+                minutes_to_full REAL NOT NULL DEFAULT 0,  -- сумма по заполненным
+                PRIMARY KEY (day, hour)
+            ) WITHOUT ROWID
+        ''')
+
+        def daily_delta(row, sign):
+            """Прибавить (sign=1) или вычесть (-1) вклад строки event_stats в attendance_daily"""
+            return f'''
+                    INSERT INTO attendance_daily (day, hour, events, capacity, participants, registrations,
+                        cancellations, full_events, minutes_to_full)
+                    SELECT date({row}.starts_at), CAST(strftime('%H', {row}.starts_at) AS INTEGER), {sign},
+                        {sign} * {row}.max_participants, {sign} * {row}.participants, {sign} * {row}.registrations,
+                        {sign} * {row}.cancellations, {sign} * ({row}.full_at IS NOT NULL),
+                        {sign} * COALESCE((julianday({row}.full_at) - julianday({row}.created_at)) * 1440, 0)
+                    WHERE {row}.starts_at IS NOT NULL AND NOT {row}.cancelled
+                    ON CONFLICT (day, hour) DO UPDATE SET
+                        events = events + excluded.events,
+                        capacity = capacity + excluded.capacity,
+                        participants = participants + excluded.participants,
+                        registrations = registrations + excluded.registrations,
+                        cancellations = cancellations + excluded.cancellations,
+                        full_events = full_events + excluded.full_events,
+                        minutes_to_full = minutes_to_full + excluded.minutes_to_full;'''
+
+        # starts_at - местное время (как его вводит администратор), поэтому и "сейчас"
+        # во всех запросах - datetime('now', 'localtime'), а не UTC-шное datetime('now').
+        # Отмена - удаление записи, пока мероприятие есть и еще не началось. Записи удаляются
+        # и вместе с мероприятием (после него) и при очистке прошедших - это не отмены
+        upcoming = "SELECT 1 FROM events WHERE id = OLD.event_id AND starts_at > datetime('now', 'localtime')"
+        triggers = {
+            'event_stats_daily_insert': f'''
+                AFTER INSERT ON event_stats BEGIN{daily_delta("NEW", 1)}
+                END''',
+            'event_stats_daily_update': f'''
+                AFTER UPDATE ON event_stats BEGIN{daily_delta("OLD", -1)}{daily_delta("NEW", 1)}
+                END''',
+            'event_stats_daily_delete': f'''
+                AFTER DELETE ON event_stats BEGIN{daily_delta("OLD", -1)}
+                END''',
+            'events_stats_insert': '''
+                AFTER INSERT ON events BEGIN
+                    INSERT INTO event_stats (event_id, starts_at, max_participants, created_at)
+                    VALUES (NEW.id, NEW.starts_at, NEW.max_participants, NEW.created_at);
+                END''',
+            'events_stats_update': '''
+                AFTER UPDATE OF end_date, event_time, max_participants ON events BEGIN
+                    UPDATE event_stats SET
+                        starts_at = NEW.starts_at,
+                        max_participants = NEW.max_participants,
+                        full_at = COALESCE(full_at, CASE
+                            WHEN participants > 0 AND participants >= NEW.max_participants THEN CURRENT_TIMESTAMP
+                        END)
+                    WHERE event_id = NEW.id;
+                END''',
+            'events_stats_delete': '''
+                AFTER DELETE ON events WHEN OLD.starts_at > datetime('now', 'localtime') BEGIN
+                    UPDATE event_stats SET cancelled = 1 WHERE event_id = OLD.id;
+                END''',
+            'registrations_stats_insert': '''
+                AFTER INSERT ON registrations BEGIN
+                    UPDATE event_stats SET
+                        participants = participants + 1,
+                        registrations = registrations + 1,
+                        full_at = COALESCE(full_at, CASE
+                            WHEN participants + 1 >= max_participants THEN NEW.registered_at
+                        END)
+                    WHERE event_id = NEW.event_id;
+                END''',
+            'registrations_stats_delete': f'''
+                AFTER DELETE ON registrations WHEN EXISTS ({upcoming}) BEGIN
+                    UPDATE event_stats SET participants = participants - 1, cancellations = cancellations + 1
+                    WHERE event_id = OLD.event_id;
+                END''',
+        }
+        for name, body in triggers.items():
+            cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+        if not exists:
+            # Мероприятия, созданные до появления статистики: прежние отмены неизвестны,
+            # время заполнения - по последней записи
+            cursor.execute('''
+                INSERT INTO event_stats (event_id, starts_at, max_participants, participants,
+                    registrations, created_at, full_at)
+                SELECT e.id, e.starts_at, e.max_participants, COUNT(r.user_id), COUNT(r.user_id), e.created_at,
+                    CASE WHEN COUNT(r.user_id) >= e.max_participants THEN MAX(r.registered_at) END
+                FROM events e
+                LEFT JOIN registrations r ON r.event_id = e.id
+                GROUP BY e.id
+            ''')
+
+    def create_change_log(self, cursor):
+        # Журнал изменений (CDC): каждая вставка/изменение/удаление мероприятий
+        # и регистраций получает монотонно растущий seq (AUTOINCREMENT не переиспользует номера)
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS change_log (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                entity TEXT NOT NULL,  -- event | registration
+                op TEXT NOT NULL,  -- insert | update | delete
+                event_id INTEGER NOT NULL,
+                user_id INTEGER,
+                data TEXT,  -- JSON новой версии строки, NULL для delete
+                changed_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS export_cursors (
+                consumer TEXT PRIMARY KEY,
+                seq INTEGER NOT NULL
+            )
+        ''')
+
+        event_json = (
+            "json_object('id', NEW.id, 'max_participants', NEW.max_participants, "
+            "'end_date', NEW.end_date, 'event_time', NEW.event_time, "
+            "'info', NEW.info, 'created_at', NEW.created_at)"
+        )
+        registration_json = (
+            "json_object('user_id', NEW.user_id, 'event_id', NEW.event_id, "
+            "'username', NEW.username, 'registered_at', NEW.registered_at)"
+        )
+
+        triggers = {
+            'events_cdc_insert': f'''
+                AFTER INSERT ON events BEGIN
+                    INSERT INTO change_log (entity, op, event_id, data)
+                    VALUES ('event', 'insert', NEW.id, {event_json});
+                END''',
+            'events_cdc_update': f'''
+                AFTER UPDATE ON events BEGIN
+                    INSERT INTO change_log (entity, op, event_id, data)
+                    VALUES ('event', 'update', NEW.id, {event_json});
+                END''',
+            'events_cdc_delete': '''
+                AFTER DELETE ON events BEGIN
+                    INSERT INTO change_log (entity, op, event_id)
+                    VALUES ('event', 'delete', OLD.id);
+                END''',
+            'registrations_cdc_insert': f'''
+                AFTER INSERT ON registrations BEGIN
+                    INSERT INTO change_log (entity, op, event_id, user_id, data)
+                    VALUES ('registration', 'insert', NEW.event_id, NEW.user_id, {registration_json});
+                END''',
+            'registrations_cdc_update': f'''
+                AFTER UPDATE ON registrations BEGIN
+                    INSERT INTO change_log (entity, op, event_id, user_id, data)
+                    VALUES ('registration', 'update', NEW.event_id, NEW.user_id, {registration_json});
+                END''',
+            'registrations_cdc_delete': '''
+                AFTER DELETE ON registrations BEGIN
+                    INSERT INTO change_log (entity, op, event_id, user_id)
+                    VALUES ('registration', 'delete', OLD.event_id, OLD.user_id);
+                END''',
+        }
+        for name, body in triggers.items():
+            cursor.execute(f"CREATE TRIGGER IF NOT EXISTS {name} {body}")
+
+    @observe_db
     def add_event(self, max_participants, end_date, event_time, info):
         cursor = self.conn.cursor()
         try:
@@ -61,14 +366,157 @@ class Database:
             logger.error(f"Ошибка добавления мероприятия: {str(e)}")
             raise
 
+    @observe_db
+    def add_events(self, rows):
+        """
+        Несколько мероприятий одной транзакцией. rows: (max_participants, end_date, event_time, info).
+        Возвращает id в порядке rows: внутри транзакции никто другой не пишет,
+        а AUTOINCREMENT выдает номера подряд, поэтому id - последние len(rows) номеров
+        """
+        if not rows:
+            return []
+        cursor = self.conn.cursor()
+        try:
+            cursor.executemany('''
+                INSERT INTO events
+                (max_participants, end_date, event_time, info)
+                VALUES (?, ?, ?, ?)
+            ''', rows)
+            last_id = cursor.execute("SELECT last_insert_rowid()").fetchone()[0]
+            self.conn.commit()
+        except sqlite3.Error as e:
+            self.conn.rollback()
+            logger.error(f"Ошибка добавления мероприятий: {str(e)}")
+            raise
+        return list(range(last_id - len(rows) + 1, last_id + 1))
+
+    @observe_db
     def delete_event(self, event_id):
         cursor = self.conn.cursor()
         cursor.execute('DELETE FROM events WHERE id = ?', (event_id,))
         cursor.execute('DELETE FROM registrations WHERE event_id = ?', (event_id,))
         self.conn.commit()
 
+    @observe_db
+    def get_events_by_ids(self, event_ids):
+        """Event для выбранных мероприятий, по времени начала"""
+        ids = list(event_ids)
+        cursor = self.conn.cursor()
+        cursor.row_factory = event_row
+        cursor.execute(f'''
+            SELECT
+                e.id,
+                e.max_participants,
+                e.end_date,
+                e.event_time,
+                e.info,
+                e.starts_at,
+                COUNT(r.user_id) as current_participants
+            FROM events e
+            LEFT JOIN registrations r ON e.id = r.event_id
+            WHERE e.id IN ({",".join("?" * len(ids))})
+            GROUP BY e.id
+            ORDER BY e.starts_at, e.id
+        ''', ids)
+        return cursor.fetchall()
+
+    def _affected(self, cursor, ids, placeholders):
+        cursor.row_factory = event_row
+        cursor.execute(f'''
+            SELECT id, max_participants, end_date, event_time, info, starts_at FROM events
+            WHERE id IN ({placeholders})
+            ORDER BY starts_at, id
+        ''', ids)
+        events = cursor.fetchall()
+        cursor.row_factory = registration_row
+        cursor.execute(f'''
+            SELECT user_id, event_id, username, registered_at FROM registrations
+            WHERE event_id IN ({placeholders})
+        ''', ids)
+        return events, cursor.fetchall()
+
+    @observe_db
+    def delete_events(self, event_ids):
+        """
+        Удаляет мероприятия вместе с регистрациями одной транзакцией.
+        Возвращает (удаленные [Event], их [Registration]), прочитанные в той же
+        транзакции - для уведомлений участников
+        """
+        ids = list(event_ids)
+        placeholders = ",".join("?" * len(ids))
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            events, registrations = self._affected(cursor, ids, placeholders)
+            # Сначала мероприятия: записи удаленных мероприятий не считаются отменами в статистике
+            cursor.execute(f"DELETE FROM events WHERE id IN ({placeholders})", ids)
+            cursor.execute(f"DELETE FROM registrations WHERE event_id IN ({placeholders})", ids)
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+        return events, registrations
+
+    @observe_db
+    def shift_events(self, event_ids, minutes):
+        """
+        Сдвигает дату и время мероприятий на minutes минут одной транзакцией.
+        Возвращает (мероприятия после сдвига [Event], их [Registration])
+        """
+        ids = list(event_ids)
+        placeholders = ",".join("?" * len(ids))
+        modifier = f"{int(minutes):+d} minutes"
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            # Оба выражения SET вычисляются по старому starts_at
+            cursor.execute(f'''
+                UPDATE events
+                SET end_date = date(starts_at, ?), event_time = strftime('%H:%M', starts_at, ?)
+                WHERE id IN ({placeholders})
+            ''', [modifier, modifier, *ids])
+            events, registrations = self._affected(cursor, ids, placeholders)
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+        return events, registrations
+
+    @observe_db
+    def set_max_participants(self, event_ids, max_participants):
+        """
+        Новый лимит мест для всех мероприятий или ни для одного: если где-то
+        записано больше, возвращает [(id, записано)] таких мероприятий без изменений
+        """
+        ids = list(event_ids)
+        placeholders = ",".join("?" * len(ids))
+        cursor = self.conn.cursor()
+        try:
+            cursor.execute("BEGIN IMMEDIATE")
+            cursor.execute(f'''
+                SELECT event_id, COUNT(*) FROM registrations
+                WHERE event_id IN ({placeholders})
+                GROUP BY event_id
+                HAVING COUNT(*) > ?
+            ''', [*ids, max_participants])
+            too_full = cursor.fetchall()
+            if too_full:
+                self.conn.rollback()
+                return too_full
+            cursor.execute(
+                f"UPDATE events SET max_participants = ? WHERE id IN ({placeholders})",
+                [max_participants, *ids]
+            )
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+        return []
+
+    @observe_db
     def get_all_events(self):
         cursor = self.conn.cursor()
+        cursor.row_factory = event_row
         cursor.execute('''
             SELECT 
                 e.id,
@@ -76,28 +524,177 @@ class Database:
                 e.end_date,
                 e.event_time,
                 e.info,
+                e.starts_at,
                 COUNT(r.user_id) as current_participants
             FROM events e
             LEFT JOIN registrations r ON e.id = r.event_id
-            WHERE datetime(e.end_date || ' ' || e.event_time) > datetime('now', '-6 hours')
+            WHERE e.starts_at > datetime('now', 'localtime', '-6 hours')
             GROUP BY e.id
         ''')
         return cursor.fetchall()
 
-    def register_user(self, user_id, username, event_id):
-        if user_id in self.get_event_participant_ids(event_id):
-            return False
+    @observe_db
+    def get_events_page(self, after_id=None, before_id=None, limit=8):
+        """
+        Страница актуальных мероприятий по (starts_at, id) без OFFSET.
+        after_id - следующая страница после этого мероприятия,
+        before_id - предыдущая страница перед ним.
+        Возвращает ([Event], has_prev, has_next). Если мероприятие-якорь уже удалено,
+        возвращается первая страница.
+        """
         cursor = self.conn.cursor()
+        cursor.row_factory = event_row
+        anchor_id = before_id if before_id is not None else after_id
+        backwards = before_id is not None
+        anchor = None
+        if anchor_id is not None:
+            anchor = self.conn.execute(
+                "SELECT starts_at, id FROM events WHERE id = ?", (anchor_id,)
+            ).fetchone()
+            if anchor is None:
+                anchor_id, backwards = None, False
+
+        query = '''
+            SELECT
+                e.id,
+                e.max_participants,
+                e.end_date,
+                e.event_time,
+                e.info,
+                e.starts_at,
+                (SELECT COUNT(*) FROM registrations r WHERE r.event_id = e.id) as current_participants
+            FROM events e
+            WHERE e.starts_at > datetime('now', 'localtime', '-6 hours')
+        '''
+        params = []
+        if anchor is not None:
+            query += f" AND (e.starts_at, e.id) {'<' if backwards else '>'} (?, ?)"
+            params.extend(anchor)
+        order = "DESC" if backwards else "ASC"
+        query += f" ORDER BY e.starts_at {order}, e.id {order} LIMIT ?"
+        params.append(limit + 1)
+
+        cursor.execute(query, params)
+        events = cursor.fetchall()
+        has_more = len(events) > limit
+        events = events[:limit]
+
+        if backwards:
+            events.reverse()
+            return events, has_more, True
+        return events, anchor_id is not None, has_more
+
+    @observe_db
+    def search_events(self, text, limit=10):
+        """
+        Актуальные мероприятия, в описании которых есть все слова запроса (по префиксу).
+        Event, как в get_events_page.
+
+        Поиск идет окнами по неделям начала, каждое следующее окно вчетверо шире:
+        внутри окна сначала самые релевантные (bm25), при равной релевантности -
+        ближайшие. Работа пропорциональна совпадениям в ближайших неделях,
+        а не числу всех мероприятий в базе.
+        """
+        match = fts_query(text)
+        if match is None:
+            return []
+        cursor = self.conn.cursor()
+        cursor.row_factory = event_row
+        if not self.fts_enabled:
+            terms = SEARCH_TERM.findall(text.lower())[:SEARCH_MAX_TERMS]
+            cursor.execute(f'''
+                SELECT e.id, e.max_participants, e.end_date, e.event_time, e.info, e.starts_at,
+                    (SELECT COUNT(*) FROM registrations r WHERE r.event_id = e.id)
+                FROM events e
+                WHERE e.starts_at > datetime('now', 'localtime', '-6 hours')
+                    {"".join(" AND lower(e.info) LIKE ?" for _ in terms)}
+                ORDER BY e.starts_at, e.id
+                LIMIT ?
+            ''', [*(f"%{term}%" for term in terms), limit])
+            return cursor.fetchall()
+
+        week, last_week = self.conn.execute('''
+            SELECT CAST(strftime('%s', datetime('now', 'localtime', '-6 hours')) AS INTEGER) / 604800,
+                (SELECT CAST(strftime('%s', MAX(starts_at)) AS INTEGER) / 604800 FROM events)
+        ''').fetchone()
+        found = []
+        size = SEARCH_FIRST_WEEKS
+        while last_week is not None and week <= last_week and len(found) < limit:
+            weeks = " OR ".join(f"w{number}" for number in range(week, min(week + size, last_week + 1)))
+            # Счетчик участников считается только для попавших в LIMIT
+            cursor.execute('''
+                SELECT id, max_participants, end_date, event_time, info, starts_at,
+                    (SELECT COUNT(*) FROM registrations r WHERE r.event_id = matched.id)
+                FROM (
+                    SELECT e.id, e.max_participants, e.end_date, e.event_time, e.info, e.starts_at,
+                        bm25(events_fts, 1.0, 0.0) AS score
+                    FROM events_fts
+                    JOIN events e ON e.id = events_fts.rowid
+                    WHERE events_fts MATCH ? AND e.starts_at > datetime('now', 'localtime', '-6 hours')
+                    ORDER BY score, e.starts_at, e.id
+                    LIMIT ?
+                ) AS matched
+                ORDER BY score, starts_at, id
+            ''', (f"{{info}}: ({match}) AND {{search_week}}: ({weeks})", limit - len(found)))
+            found.extend(cursor.fetchall())
+            week += size
+            size = min(size * 4, SEARCH_MAX_WEEKS)
+        return found
+
+    @staticmethod
+    def _insert_registration(cursor, user_id, username, event_id):
         try:
+            # Проверка мест и вставка одним запросом: лимит не превышается
+            # даже при параллельной обработке обновлений
             cursor.execute('''
                 INSERT INTO registrations (user_id, event_id, username)
-                VALUES (?, ?, ?)
-            ''', (user_id, event_id, username))
-            self.conn.commit()
-            return True
+                SELECT ?, ?, ?
+                WHERE (SELECT COUNT(*) FROM registrations WHERE event_id = ?)
+                    < (SELECT max_participants FROM events WHERE id = ?)
+            ''', (user_id, event_id, username, event_id, event_id))
         except sqlite3.IntegrityError:
-            return False
+            return DUPLICATE
+        return REGISTERED if cursor.rowcount == 1 else FULL
 
+    @staticmethod
+    def _delete_registration(cursor, user_id, event_id):
+        cursor.execute('''
+            DELETE FROM registrations
+            WHERE user_id = ? AND event_id = ?
+        ''', (user_id, event_id))
+        return cursor.rowcount
+
+    @observe_db
+    def register_user(self, user_id, username, event_id):
+        cursor = self.conn.cursor()
+        result = self._insert_registration(cursor, user_id, username, event_id)
+        self.conn.commit()
+        return result == REGISTERED
+
+    @observe_db
+    def apply_registrations(self, requests):
+        """
+        Записи и отмены одной транзакцией - один коммит (и один fsync) на всю пачку.
+        requests: ("register", user_id, username, event_id) или ("unregister", user_id, event_id).
+        Возвращает по результату на запрос: REGISTERED / DUPLICATE / FULL для записи,
+        число удаленных строк для отмены. Свободные места считаются внутри транзакции,
+        поэтому лимит соблюдается и между запросами одной пачки.
+        """
+        cursor = self.conn.cursor()
+        results = []
+        try:
+            for kind, *args in requests:
+                if kind == "register":
+                    results.append(self._insert_registration(cursor, *args))
+                else:
+                    results.append(self._delete_registration(cursor, *args))
+            self.conn.commit()
+        except sqlite3.Error:
+            self.conn.rollback()
+            raise
+        return results
+
+    @observe_db
     def get_event_participants(self, event_id):
         cursor = self.conn.cursor()
         cursor.execute('''
@@ -106,6 +703,18 @@ class Database:
         ''', (event_id,))
         return [row[0] for row in cursor.fetchall()]
 
+    @observe_db
+    def get_event_participant_rows(self, event_id):
+        """[User] участников мероприятия"""
+        cursor = self.conn.cursor()
+        cursor.row_factory = user_row
+        cursor.execute('''
+            SELECT user_id, username FROM registrations
+            WHERE event_id = ?
+        ''', (event_id,))
+        return cursor.fetchall()
+
+    @observe_db
     def get_event_participant_ids(self, event_id):
         cursor = self.conn.cursor()
         cursor.execute('''
@@ -114,6 +723,7 @@ class Database:
         ''', (event_id,))
         return [row[0] for row in cursor.fetchall()]
 
+    @observe_db
     def check_available_slots(self, event_id):
         cursor = self.conn.cursor()
         cursor.execute('''
@@ -125,20 +735,26 @@ class Database:
         max_p, current = cursor.fetchone()
         return max_p - current
 
+    @observe_db
     def get_user_events(self, user_id):
+        """[Event] актуальных мероприятий пользователя (без подсчета участников)"""
         cursor = self.conn.cursor()
+        cursor.row_factory = event_row
         try:
             cursor.execute('''
                 SELECT 
                     e.id, 
+                    e.max_participants,
                     e.end_date, 
                     e.event_time,
-                    COALESCE(e.info, 'Без описания')
+                    COALESCE(e.info, 'Без описания'),
+                    e.starts_at
                 FROM events e
                 JOIN registrations r ON e.id = r.event_id
                 WHERE r.user_id = ?
-                    AND datetime(e.end_date || ' ' || e.event_time) > datetime('now', '-6 hours')
-            ''', (user_id,))  # Добавлено условие
+                    AND e.starts_at > datetime('now', 'localtime', '-6 hours')
+                ORDER BY e.starts_at, e.id
+            ''', (user_id,))
             return cursor.fetchall()
         except Exception as e:
             logger.error(f"Ошибка БД: {str(e)}")
@@ -146,15 +762,14 @@ class Database:
         finally:
             cursor.close()
 
+    @observe_db
     def delete_registration(self, user_id, event_id):
         cursor = self.conn.cursor()
-        cursor.execute('''
-            DELETE FROM registrations
-            WHERE user_id = ? AND event_id = ?
-        ''', (user_id, event_id))
+        deleted = self._delete_registration(cursor, user_id, event_id)
         self.conn.commit()
-        return cursor.rowcount
+        return deleted
 
+    @observe_db
     def update_event_field(self, event_id, field, value):
         allowed_fields = {'max_participants', 'end_date', 'event_time', 'info'}
         if field not in allowed_fields:
@@ -168,8 +783,11 @@ class Database:
         ''', (value, event_id))
         self.conn.commit()
 
+    @observe_db
     def get_event_by_id(self, event_id):
+        """Event или None"""
         cursor = self.conn.cursor()
+        cursor.row_factory = event_row
         cursor.execute('''
             SELECT 
                 e.id,
@@ -177,27 +795,34 @@ class Database:
                 e.end_date,
                 e.event_time,
                 e.info,
+                e.starts_at,
                 COUNT(r.user_id) as current_participants
             FROM events e
             LEFT JOIN registrations r ON e.id = r.event_id
             WHERE e.id = ?
             GROUP BY e.id
         ''', (event_id,))
-        result = cursor.fetchone()
-
-        if result:
-            return {
-                'id': result[0],
-                'max_participants': result[1],
-                'end_date': result[2],
-                'event_time': result[3],
-                'info': result[4],
-                'current_participants': result[5]
-            }
-        return None
+        return cursor.fetchone()
 
+    @observe_db
     def get_user_id_by_username(self, username):
         cursor = self.conn.cursor()
         cursor.execute("SELECT user_id FROM registrations WHERE username = ?", (username,))
         result = cursor.fetchone()
-        return result[0] if result else None
\ No newline at end of file
+        return result[0] if result else None
+
+    @observe_db
+    def get_export_cursor(self, consumer):
+        cursor = self.conn.cursor()
+        cursor.execute("SELECT seq FROM export_cursors WHERE consumer = ?", (consumer,))
+        result = cursor.fetchone()
+        return result[0] if result else 0
+
+    @observe_db
+    def set_export_cursor(self, consumer, seq):
+        cursor = self.conn.cursor()
+        cursor.execute('''
+            INSERT INTO export_cursors (consumer, seq) VALUES (?, ?)
+            ON CONFLICT(consumer) DO UPDATE SET seq = excluded.seq
+        ''', (consumer, seq))
+        self.conn.commit()
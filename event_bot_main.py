@@ -1,45 +1,109 @@
 import os
+import re
+import secrets
+import asyncio
+import functools
 import database
 import logging
 from logging.handlers import RotatingFileHandler
 import configparser
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram import InputFile
+from telegram import InputFile, InlineQueryResultArticle, InputTextMessageContent
 from telegram.ext import (
     Application,
     CommandHandler,
     CallbackQueryHandler,
     ContextTypes,
     ConversationHandler,
+    InlineQueryHandler,
     MessageHandler,
+    TypeHandler,
     filters,
-    JobQueue,
-    PicklePersistence
+    JobQueue
 )
 import sqlite3
 from datetime import datetime, timedelta, time
-from export_handler import generate_export_file
+import time as time_module
 
 import improved_logger as ilg
+from update_processor import PerChatUpdateProcessor
+from sqlite_persistence import SQLitePersistence
+from callback_router import CallbackRouter, pack, unpack, callback_args
+from antiflood import AntiFlood
+import metrics
+from query_stats import QUERY_STATS
+from tracing import TRACER, TraceIdFilter, handler_span
+from update_recorder import UpdateRecorder
+from registration_queue import RegistrationQueue
+from leader_election import LeaseElection, LockElection
+from read_snapshot import ReadSnapshot
+import bulk_events
+import attendance_stats
+import network
 
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    level=logging.INFO,
-    handlers=[
-        ilg.TimestampedRotatingFileHandler(
-            "bot.log",
-            maxBytes=5*1024*1024,  # 5 MB
-            backupCount=20,
-            # encoding="utf-8"
-        ),
-        logging.StreamHandler()
-    ]
+config = configparser.ConfigParser()
+config.read('bot_config.ini', encoding='utf-8')
+
+# Логирование через очередь: event loop не пишет в файлы, это делают потоки QueueListener
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - [%(trace_id)s] %(message)s"
+LOG_MAX_BYTES = config.getint('Logging', 'MAX_BYTES', fallback=5*1024*1024)
+LOG_MAX_TOTAL_BYTES = config.getint('Logging', 'MAX_TOTAL_MB', fallback=200) * 1024 * 1024
+LOG_COMPRESS = config.getboolean('Logging', 'COMPRESS', fallback=True)
+
+
+def make_file_handler(filename, backup_count, formatter):
+    handler = ilg.TimestampedRotatingFileHandler(
+        filename,
+        maxBytes=LOG_MAX_BYTES,
+        backupCount=backup_count,
+        max_total_bytes=LOG_MAX_TOTAL_BYTES,
+        compress=LOG_COMPRESS
+    )
+    handler.setFormatter(formatter)
+    return handler
+
+
+main_formatter = logging.Formatter(LOG_FORMAT)
+console_handler = logging.StreamHandler()
+console_handler.setFormatter(main_formatter)
+ilg.start_queue_logging(
+    logging.getLogger(),
+    [make_file_handler("bot.log", config.getint('Logging', 'BACKUP_COUNT', fallback=20), main_formatter),
+     console_handler],
+    # trace_id берется из contextvars, поэтому фильтр работает еще в потоке event loop;
+    # INFO из горячих мест (нажатия кнопок, HTTP-запросы) ограничены по частоте
+    filters=[
+        TraceIdFilter(),
+        ilg.RateLimitFilter(
+            rate=config.getfloat('Logging', 'INFO_RATE_PER_SEC', fallback=5.0),
+            burst=config.getint('Logging', 'INFO_BURST', fallback=20)
+        )
+    ],
+    level=config.get('Logging', 'LEVEL', fallback='INFO').upper()
 )
 
 logger = logging.getLogger(__name__)
 
-config = configparser.ConfigParser()
-config.read('bot_config.ini', encoding='utf-8')
+# Медленные запросы пишутся в отдельный файл вместе с EXPLAIN QUERY PLAN
+QUERY_STATS.threshold_ms = config.getfloat('Database', 'SLOW_QUERY_MS', fallback=50.0)
+slow_query_logger = logging.getLogger("slow_queries")
+slow_query_logger.propagate = False
+ilg.start_queue_logging(
+    slow_query_logger,
+    [make_file_handler(config.get('Database', 'SLOW_QUERY_LOG', fallback='slow_queries.log'), 5,
+                       logging.Formatter("%(asctime)s - %(message)s"))]
+)
+
+# Трассировка обновлений: JSON-строка на обновление в logs/trace.log
+TRACER.enabled = config.getboolean('Tracing', 'ENABLED', fallback=True)
+TRACER.sample_rate = config.getfloat('Tracing', 'SAMPLE_RATE', fallback=0.1)
+TRACER.slow_ms = config.getfloat('Tracing', 'SLOW_MS', fallback=1000.0)
+trace_logger = logging.getLogger("trace")
+trace_logger.propagate = False
+ilg.start_queue_logging(
+    trace_logger,
+    [make_file_handler(config.get('Tracing', 'LOG_FILE', fallback='trace.log'), 5, logging.Formatter("%(message)s"))]
+)
 
 TOKEN = config['Main']['TOKEN']
 admin_url = config['Main']['HELP_ACCOUNT']
@@ -56,14 +120,98 @@ except (configparser.NoOptionError, configparser.NoSectionError):
     ADMIN_IDS = []
 
 DATABASE_NAME = config['Main']['DATABASE_NAME']
+# WAL - чтение (выгрузки, снимок, отчеты) не блокирует записи на сессии
+DATABASE_JOURNAL_MODE = config.get('Main', 'JOURNAL_MODE', fallback='WAL').strip()
+DATABASE_BUSY_TIMEOUT_MS = config.getint('Main', 'BUSY_TIMEOUT_MS', fallback=database.BUSY_TIMEOUT_MS)
+
+# Сколько обновлений обрабатывается одновременно (порядок внутри чата сохраняется)
+CONCURRENT_UPDATES = config.getint('Main', 'CONCURRENT_UPDATES', fallback=8)
+
+# Групповой коммит записей и отмен: одна транзакция на пачку запросов
+GROUP_COMMIT_ENABLED = config.getboolean('Database', 'GROUP_COMMIT', fallback=True)
+GROUP_COMMIT_MAX_BATCH = config.getint('Database', 'GROUP_COMMIT_MAX_BATCH', fallback=100)
+GROUP_COMMIT_DELAY_MS = config.getfloat('Database', 'GROUP_COMMIT_DELAY_MS', fallback=5.0)
+# Создается в build_application, когда база уже открыта
+registration_queue = None
+
+# Несколько экземпляров: напоминания запускает только лидер
+CLUSTER_MODE = config.get('Cluster', 'MODE', fallback='single').strip().lower()
+CLUSTER_INSTANCE_ID = config.get('Cluster', 'INSTANCE_ID', fallback='') or None
+CLUSTER_LEASE_TTL = config.getfloat('Cluster', 'LEASE_TTL', fallback=15.0)
+CLUSTER_RENEW_INTERVAL = config.getfloat('Cluster', 'RENEW_INTERVAL', fallback=5.0)
+CLUSTER_LOCK_FILE = config.get('Cluster', 'LOCK_FILE', fallback='') or f"{DATABASE_NAME}.leader.lock"
+# LeaseElection / LockElection, None в режиме single
+leader = None
+
+# Снимок базы для выгрузок: обновляется раз в SNAPSHOT_REFRESH_INTERVAL секунд,
+# перед выгрузкой - если старше SNAPSHOT_MAX_AGE
+SNAPSHOT_ENABLED = config.getboolean('Snapshot', 'ENABLED', fallback=True) and DATABASE_NAME != ":memory:"
+SNAPSHOT_FILE = config.get('Snapshot', 'FILE', fallback='') or None
+SNAPSHOT_MAX_AGE = config.getfloat('Snapshot', 'MAX_AGE_SEC', fallback=600.0)
+SNAPSHOT_REFRESH_INTERVAL = config.getfloat('Snapshot', 'REFRESH_INTERVAL_SEC', fallback=300.0)
+# Создается в build_application, None - выгрузки читают основную базу
+read_snapshot = None
+
+# Пулы соединений к Bot API: getUpdates, ответы обработчиков, рассылки (network.bulk_traffic)
+NETWORK_UPDATES_POOL_SIZE = config.getint('Network', 'UPDATES_POOL_SIZE', fallback=1)
+NETWORK_POOL_SIZE = config.getint('Network', 'POOL_SIZE', fallback=64)
+NETWORK_BULK_POOL_SIZE = config.getint('Network', 'BULK_POOL_SIZE', fallback=8)
+NETWORK_TIMEOUTS = {
+    'connect_timeout': config.getfloat('Network', 'CONNECT_TIMEOUT', fallback=5.0),
+    'read_timeout': config.getfloat('Network', 'READ_TIMEOUT', fallback=5.0),
+    'write_timeout': config.getfloat('Network', 'WRITE_TIMEOUT', fallback=5.0),
+}
+NETWORK_POOL_TIMEOUT = config.getfloat('Network', 'POOL_TIMEOUT', fallback=1.0)
+NETWORK_BULK_POOL_TIMEOUT = config.getfloat('Network', 'BULK_POOL_TIMEOUT', fallback=10.0)
+NETWORK_KEEPALIVE_EXPIRY = config.getfloat('Network', 'KEEPALIVE_EXPIRY', fallback=30.0)
+NETWORK_HTTP_VERSION = config.get('Network', 'HTTP_VERSION', fallback='1.1').strip()
+
+# Самый длинный период отчета /stats, дней
+STATS_MAX_DAYS = 366
+
+# Файл со списком сессий для массового создания
+BULK_FILE_MAX_BYTES = 256 * 1024
+
+# Сколько мероприятий показывать на одной странице списка
+EVENTS_PAGE_SIZE = config.getint('Main', 'EVENTS_PAGE_SIZE', fallback=8)
+
+# Защита от флуда: повторные нажатия и token bucket на пользователя
+ANTIFLOOD_ENABLED = config.getboolean('AntiFlood', 'ENABLED', fallback=True)
+antiflood = AntiFlood(
+    rate=config.getfloat('AntiFlood', 'RATE', fallback=1.0),
+    burst=config.getint('AntiFlood', 'BURST', fallback=5),
+    duplicate_window=config.getfloat('AntiFlood', 'DUPLICATE_WINDOW_SEC', fallback=2.0),
+    exempt_ids=ADMIN_IDS
+)
 
-# Сброс состояния при перезапуске
-try:
-    os.remove(os.path.join(os.path.dirname(__file__), "conversationbot"))
-except FileNotFoundError:
-    pass
-
-persistence = PicklePersistence(filepath="conversationbot")
+# HTTP-эндпоинт метрик и проб (/metrics, /healthz, /readyz)
+METRICS_ENABLED = config.getboolean('Metrics', 'ENABLED', fallback=True)
+METRICS_LISTEN = config.get('Metrics', 'LISTEN', fallback='0.0.0.0')
+METRICS_PORT = config.getint('Metrics', 'PORT', fallback=9100)
+# Не в bot_data: bot_data сохраняется в persistence
+metrics_server = None
+
+# Запись входящего трафика (обезличенного) для воспроизведения: python -m benchmarks.replay
+RECORDER_ENABLED = config.getboolean('Recorder', 'ENABLED', fallback=False)
+
+# Режим получения обновлений: polling (по умолчанию) или webhook
+UPDATE_MODE = config.get('Webhook', 'MODE', fallback='polling').strip().lower()
+WEBHOOK_LISTEN = config.get('Webhook', 'LISTEN', fallback='0.0.0.0')
+WEBHOOK_PORT = config.getint('Webhook', 'PORT', fallback=8443)
+WEBHOOK_URL_PATH = config.get('Webhook', 'URL_PATH', fallback='')
+WEBHOOK_URL = config.get('Webhook', 'WEBHOOK_URL', fallback='') or None
+WEBHOOK_SECRET_TOKEN = config.get('Webhook', 'SECRET_TOKEN', fallback='') or None
+WEBHOOK_CERT = config.get('Webhook', 'CERT', fallback='') or None
+WEBHOOK_KEY = config.get('Webhook', 'KEY', fallback='') or None
+
+# Бот обрабатывает только сообщения, нажатия inline-кнопок и inline-запросы (поиск через @бота)
+ALLOWED_UPDATES = [Update.MESSAGE, Update.CALLBACK_QUERY, Update.INLINE_QUERY]
+
+# Состояния диалогов и user_data хранятся в SQLite и переживают перезапуск
+persistence = SQLitePersistence(
+    filepath=config.get('Persistence', 'FILE', fallback='') or DATABASE_NAME,
+    update_interval=config.getint('Persistence', 'UPDATE_INTERVAL', fallback=30)
+)
 
 USER_COMMANDS = [
     ("📆 Выбрать сессию", "events"),
@@ -75,6 +223,7 @@ USER_COMMANDS = [
 ADMIN_COMMANDS = USER_COMMANDS + [
     ("🛠 Управление сессиями", "adminevents"),
     ("➕ Создать сессию", "createevent"),
+    ("📅 Создать несколько сессий", "bulkevents"),
     ("📤 Выгрузить историю", "export_history")
 ]
 
@@ -84,8 +233,64 @@ ADMIN_COMMANDS = USER_COMMANDS + [
     EDIT_CHOICE, EDIT_VALUE, DELETE_CONFIRM,
     WAITING_FOR_MESSAGE, WAITING_FOR_LINK, CONFIRM_LINK,
     REMOVE_USER_START, REMOVE_USER_SELECT,
-    EXPORT_CHOICE, EXPORT_START_DATE, EXPORT_END_DATE
-) = range(15)
+    EXPORT_CHOICE, EXPORT_START_DATE, EXPORT_END_DATE,
+    EXPORT_CURSOR, BULK_INPUT, BULK_CONFIRM,
+    BULK_SELECT, BULK_DELETE_CONFIRM, BULK_SHIFT_VALUE, BULK_MAX_VALUE
+) = range(22)
+
+# Префиксы callback_data (формат кодека: префикс:числа_в_base36)
+CB_EVENT = "ev"                  # запись на сессию: ev:<event_id>
+CB_EVENTS_NEXT = "evn"           # следующая страница сессий: evn:<event_id>
+CB_EVENTS_PREV = "evb"           # предыдущая страница сессий: evb:<event_id>
+CB_UNREG_CONFIRM = "unr"         # отмена записи из списка: unr:<event_id>
+CB_UNREG_CANCEL = "unrx"
+CB_DETAIL = "dt"                 # детали моей записи: dt:<event_id>
+CB_CANCEL_REG = "cr"             # отмена моей записи: cr:<event_id>
+CB_ADMIN_PAGE = "ad"             # список управления (редактирование на месте)
+CB_ADMIN_NEXT = "adn"
+CB_ADMIN_PREV = "adb"
+CB_VIEW = "vw"                   # карточка сессии: vw:<event_id>
+CB_EDIT = "ed"                   # редактирование: ed:<event_id>
+CB_EDIT_FIELD = "ef"             # выбор поля: ef:<индекс в EDIT_FIELDS>
+CB_EDIT_CANCEL = "edx"
+CB_DELETE = "dl"                 # удаление: dl:<event_id>
+CB_DELETE_CONFIRM = "dly"
+CB_DELETE_CANCEL = "dln"
+CB_SENDMSG = "sm"                # сообщение участникам: sm:<event_id>
+CB_SENDLINK = "sl"               # ссылка участникам: sl:<event_id>
+CB_LINK_CONFIRM = "sly"
+CB_LINK_CANCEL = "sln"
+CB_REMOVE_USER_START = "ru"      # удаление участника: ru:<event_id>
+CB_REMOVE_USER = "rm"            # rm:<user_id>
+CB_EXPORT_ALL = "xa"
+CB_EXPORT_CUSTOM = "xc"
+CB_EXPORT_CHANGES = "xch"
+CB_BULK_CONFIRM = "bky"          # создание пачки сессий
+CB_BULK_CANCEL = "bkn"
+CB_BULK_SELECT = "bs"            # массовые действия: выбор сессий
+CB_BULK_SELECT_NEXT = "bsn"      # bsn:<event_id>
+CB_BULK_SELECT_PREV = "bsb"      # bsb:<event_id>
+CB_BULK_TOGGLE = "bst"           # bst:<event_id>
+CB_BULK_TOGGLE_PAGE = "bsa"
+CB_BULK_CLOSE = "bsx"
+CB_BULK_ACTION = "ba"            # ba:<индекс в BULK_ACTIONS>
+CB_BULK_DELETE_CONFIRM = "bay"
+CB_BULK_DELETE_CANCEL = "ban"
+
+EDIT_FIELDS = ("max_participants", "end_date", "event_time", "info")
+
+# Поиск: результатов в inline-режиме, кэш ответа Telegram (сек) и ссылка /start ev<event_id>
+INLINE_RESULTS = 20
+INLINE_CACHE_TIME = 10
+DEEP_LINK_EVENT = re.compile(r"ev(\d+)")
+BULK_ACTIONS = ("delete", "shift", "max_participants")
+
+recorder = UpdateRecorder(
+    directory=config.get('Recorder', 'DIRECTORY', fallback='recordings'),
+    salt=config.get('Recorder', 'SALT', fallback=''),
+    admin_ids=ADMIN_IDS,
+    user_id_callbacks=(CB_REMOVE_USER,)
+) if RECORDER_ENABLED else None
 
 
 def build_main_menu_keyboard(is_admin: bool) -> InlineKeyboardMarkup:
@@ -95,10 +300,46 @@ def build_main_menu_keyboard(is_admin: bool) -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(keyboard)
 
 
+def parse_page_callback(data: str, prev_prefix: str, next_prefix: str):
+    """'evn:c' -> (12, None), 'evb:c' -> (None, 12), остальное -> (None, None)"""
+    prefix, values = unpack(data)
+    if prefix == next_prefix and values:
+        return values[0], None
+    if prefix == prev_prefix and values:
+        return None, values[0]
+    return None, None
+
+
+def build_page_buttons(prev_prefix: str, next_prefix: str, events, has_prev: bool, has_next: bool):
+    row = []
+    if events and has_prev:
+        row.append(InlineKeyboardButton("◀️", callback_data=pack(prev_prefix, events[0].id)))
+    if events and has_next:
+        row.append(InlineKeyboardButton("▶️", callback_data=pack(next_prefix, events[-1].id)))
+    return [row] if row else []
+
+
+async def send_or_edit(update: Update, text: str, reply_markup=None, edit: bool = True):
+    """
+    Для callback редактирует исходное сообщение, иначе отправляет новое.
+    Если текст и клавиатура не изменились, запрос к API не отправляется.
+    """
+    query = update.callback_query
+    if edit and query and getattr(query.message, "text", None) is not None:
+        if query.message.text == text and query.message.reply_markup == reply_markup:
+            return query.message
+        return await query.edit_message_text(text, reply_markup=reply_markup)
+
+    message = update.message or query.message
+    return await message.reply_text(text, reply_markup=reply_markup)
+
+
 def error_logger(func):
+    @functools.wraps(func)
     async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
         try:
-            return await func(update, context)
+            with metrics.handler_timer(func.__name__), handler_span(func.__name__):
+                return await func(update, context)
         except Exception as e:
             try:
                 # Частичный сброс данных текущего пользователя
@@ -130,8 +371,195 @@ global db
 db = None
 
 
+def open_database():
+    return database.Database(
+        DATABASE_NAME, journal_mode=DATABASE_JOURNAL_MODE, busy_timeout_ms=DATABASE_BUSY_TIMEOUT_MS
+    )
+
+
+async def submit_registration(*request):
+    """
+    ("register", user_id, username, event_id) -> database.REGISTERED / DUPLICATE / FULL,
+    ("unregister", user_id, event_id) -> число удаленных записей.
+    Через групповой коммит, если он включен, иначе отдельной транзакцией
+    """
+    if registration_queue is not None:
+        return await registration_queue.submit(*request)
+    return db.apply_registrations([request])[0]
+
+
+def load_export_func(name):
+    """export_handler тянет openpyxl, поэтому импортируется при первой выгрузке, а не при старте бота"""
+    import export_handler
+    return getattr(export_handler, name)
+
+
+def export_func(name):
+    def run(reader, *args, **kwargs):
+        return load_export_func(name)(reader, *args, **kwargs)
+    return run
+
+
+async def run_export(export_name, *args, **kwargs):
+    """Формирует выгрузку в отдельном потоке со своим соединением, не блокируя event loop"""
+    return await run_with_reader(db.open_reader(), export_func(export_name), *args, **kwargs)
+
+
+async def run_snapshot_export(export_name, *args, **kwargs):
+    """Выгрузка по снимку базы: (результат, время снимка)"""
+    reader, taken_at = await open_snapshot_reader()
+    return await run_with_reader(reader, export_func(export_name), *args, **kwargs), taken_at
+
+
+async def open_snapshot_reader():
+    """
+    (соединение, время снимка). Без снимка или если его не удалось обновить -
+    основная база на текущий момент
+    """
+    if read_snapshot is not None:
+        try:
+            return await read_snapshot.open_reader()
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"Снимок базы недоступен, чтение из основной базы: {str(e)}")
+    return db.open_reader(), datetime.now()
+
+
+async def run_with_reader(reader, func, *args, **kwargs):
+    """func(reader, ...) в отдельном потоке; соединение закрывается после"""
+    if reader is db.conn:
+        return func(reader, *args, **kwargs)
+
+    def job():
+        try:
+            # Первый импорт openpyxl тоже уходит из event loop
+            return func(reader, *args, **kwargs)
+        finally:
+            reader.close()
+
+    return await asyncio.to_thread(job)
+
+
+async def refresh_snapshot(context: ContextTypes.DEFAULT_TYPE):
+    try:
+        await read_snapshot.refresh_async()
+    except (sqlite3.Error, OSError) as e:
+        logger.error(f"Не удалось обновить снимок базы: {str(e)}")
+
+
+def snapshot_note(taken_at: datetime) -> str:
+    return f"Данные на {taken_at.strftime('%d.%m.%Y %H:%M:%S')}"
+
+
+def is_scheduler_leader() -> bool:
+    return leader is None or leader.is_leader
+
+
+def reminder_time_for(starts_at: datetime) -> datetime:
+    return starts_at - timedelta(hours=hours_to_remind)
+
+
+REMINDER_JOB_PREFIX = "reminder_"
+
+
+def reminder_job_name(event_id: int) -> str:
+    return f"{REMINDER_JOB_PREFIX}{event_id}"
+
+
+def schedule_reminders(job_queue: JobQueue, reminders) -> int:
+    """
+    Ставит напоминания пачкой: reminders - пары (event_id, время напоминания).
+    Прежние напоминания этих мероприятий снимаются, прошедшие не ставятся.
+    Возвращает число поставленных задач
+    """
+    reminders = list(reminders)
+    drop_reminders(job_queue, [event_id for event_id, _ in reminders])
+    now = datetime.now()
+    scheduled = 0
+    for event_id, reminder_time in reminders:
+        if reminder_time <= now:
+            continue
+        job_queue.run_once(
+            send_reminder,
+            when=(reminder_time - now).total_seconds(),
+            data=event_id,
+            name=reminder_job_name(event_id)
+        )
+        scheduled += 1
+    return scheduled
+
+
+def drop_reminders(job_queue: JobQueue, event_ids) -> int:
+    """Снимает напоминания сразу для набора мероприятий за один проход по задачам"""
+    names = {reminder_job_name(event_id) for event_id in event_ids}
+    removed = 0
+    for job in job_queue.jobs():
+        if job.name in names:
+            job.schedule_removal()
+            removed += 1
+    return removed
+
+
+def sync_reminders(job_queue: JobQueue) -> int:
+    """
+    Приводит задачи reminder_* в соответствие с мероприятиями в базе: ставит
+    недостающие (в том числе созданные другим экземпляром), убирает лишние и
+    перепланирует сдвинутые. Возвращает число поставленных задач
+    """
+    now = datetime.now()
+    wanted = {}
+    for event in db.get_all_events():
+        reminder_time = reminder_time_for(event.starts_at)
+        if reminder_time > now:
+            wanted[reminder_job_name(event.id)] = (event.id, reminder_time)
+
+    for job in job_queue.jobs():
+        if not job.name.startswith(REMINDER_JOB_PREFIX):
+            continue
+        target = wanted.get(job.name)
+        if target and job.next_t and abs(job.next_t.timestamp() - target[1].timestamp()) < 1:
+            del wanted[job.name]
+        else:
+            job.schedule_removal()
+
+    return schedule_reminders(job_queue, wanted.values())
+
+
+async def leader_tick(context: ContextTypes.DEFAULT_TYPE):
+    """
+    Продление/захват лидерства; при смене роли - запуск или снятие напоминаний,
+    в режиме polling - еще и возобновление или остановка опроса Telegram
+    """
+    was_leader = leader.held
+    is_leader = leader.try_acquire()
+
+    updater = context.application.updater
+    if is_leader:
+        scheduled = sync_reminders(context.job_queue)
+        if not was_leader:
+            logger.info(f"👑 {leader.instance_id} стал лидером, напоминаний поставлено: {scheduled}")
+        elif scheduled:
+            logger.info(f"♻️ Поставлено напоминаний, созданных другим экземпляром: {scheduled}")
+        if UPDATE_MODE != "webhook" and not updater.running:
+            # Вернулись из резерва - возобновляем опрос Telegram
+            await updater.start_polling(allowed_updates=ALLOWED_UPDATES)
+            logger.info(f"{leader.instance_id} возобновил опрос Telegram")
+    elif was_leader:
+        logger.warning(f"Лидерство потеряно ({leader.instance_id}), напоминания сняты")
+        for job in context.job_queue.jobs():
+            if job.name.startswith(REMINDER_JOB_PREFIX):
+                job.schedule_removal()
+        if UPDATE_MODE != "webhook" and updater.running:
+            # Опрашивать Telegram может только один экземпляр - уступаем новому лидеру и
+            # остаемся в резерве: следующие вызовы ждут лидерства, как wait_for_leadership
+            await updater.stop()
+            logger.info(f"{leader.instance_id} в резерве, лидер: {leader.holder()}")
+
+
 # Отправка уведомлений
 async def send_reminder(context: ContextTypes.DEFAULT_TYPE):
+    if not is_scheduler_leader():
+        # Аренда истекла, а задача еще не снята: напоминание отправит новый лидер
+        return
     try:
         event_id = context.job.data
         event = db.get_event_by_id(event_id)
@@ -141,7 +569,7 @@ async def send_reminder(context: ContextTypes.DEFAULT_TYPE):
             return
 
         # Получаем время в формате ЧЧ:ММ
-        event_time = datetime.strptime(event['event_time'], "%H:%M").strftime("%H:%M")
+        event_time = event.starts_at.strftime("%H:%M")
 
         try:
             with open("misc/message.txt", "r", encoding="utf-8") as f:
@@ -158,14 +586,15 @@ async def send_reminder(context: ContextTypes.DEFAULT_TYPE):
 
         # Отправка участникам
         participants = db.get_event_participant_ids(event_id)
-        for user_id in participants:
-            try:
-                await context.bot.send_message(
-                    chat_id=user_id,
-                    text=message_text
-                )
-            except Exception as e:
-                logger.error(f"Ошибка отправки {user_id}: {str(e)}")
+        with network.bulk_traffic():
+            for user_id in participants:
+                try:
+                    await context.bot.send_message(
+                        chat_id=user_id,
+                        text=message_text
+                    )
+                except Exception as e:
+                    logger.error(f"Ошибка отправки {user_id}: {str(e)}")
 
     except Exception as e:
         logger.error(f"Ошибка в send_reminder: {str(e)}", exc_info=True)
@@ -190,18 +619,96 @@ async def check_admin_access(update: Update) -> bool:
     return True
 
 
+async def drop_all_persistent_data(application: Application):
+    """
+    Сброс user_data и chat_data всех пользователей: строк persistence и данных в памяти
+    приложения - иначе следующая запись persistence вернула бы прежние данные в базу.
+    Словари очищаются на месте: обработчики, которые сейчас их держат, тоже видят сброс
+    """
+    for data in (*application.user_data.values(), *application.chat_data.values()):
+        data.clear()
+    await application.persistence.drop_user_data()
+    await application.persistence.drop_chat_data()
+
+
 @error_logger
 async def reset_persistence(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if is_admin(update.effective_user.id):
-        await context.application.persistence.drop_user_data()
-        await context.application.persistence.drop_chat_data()
+        await drop_all_persistent_data(context.application)
         await update.message.reply_text("♻️ Все данные persistence сброшены")
 
 
+@error_logger
+async def flood_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not await check_admin_access(update):
+        return
+
+    stats = antiflood.stats
+    lines = ["🛡 Антифлуд:"]
+    lines.extend(f"{key}: {value}" for key, value in sorted(stats.items()))
+    lines.append(f"Всего отброшено: {antiflood.shed_total()}")
+    await update.message.reply_text("\n".join(lines))
+
+
+@error_logger
+async def db_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/dbstats [N] [total|max|count] - самые тяжелые запросы, /dbstats reset - сброс"""
+    if not await check_admin_access(update):
+        return
+
+    args = context.args or []
+    if args and args[0] == "reset":
+        QUERY_STATS.reset()
+        await update.message.reply_text("🧹 Статистика запросов сброшена")
+        return
+
+    limit = int(args[0]) if args and args[0].isdigit() else 10
+    order_by = args[1] if len(args) > 1 and args[1] in ("total", "max", "count") else "total"
+    rows = QUERY_STATS.top(limit, order_by)
+    if not rows:
+        await update.message.reply_text("Запросов пока не было")
+        return
+
+    lines = [f"📊 Топ-{len(rows)} запросов по {order_by} (порог медленных {QUERY_STATS.threshold_ms:g} мс):"]
+    for sql, count, total, max_time in rows:
+        sql = sql if len(sql) <= 150 else sql[:147] + "..."
+        lines.append(
+            f"\n{count} раз, всего {total * 1000:.1f} мс, "
+            f"среднее {total / max(count, 1) * 1000:.2f} мс, макс {max_time * 1000:.1f} мс\n{sql}"
+        )
+    text = "\n".join(lines)
+    # Лимит Telegram на длину сообщения
+    await update.message.reply_text(text[:4000])
+
+
+@error_logger
+async def attendance_stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/stats [дней] - заполняемость, время до заполнения и отмены за последние N дней (30)"""
+    if not await check_admin_access(update):
+        return
+
+    args = context.args or []
+    days = int(args[0]) if args and args[0].isdigit() else 30
+    days = max(1, min(days, STATS_MAX_DAYS))
+
+    reader, taken_at = await open_snapshot_reader()
+    text, chart = await run_with_reader(reader, attendance_stats.build, days)
+    text = f"{text}\n\n{snapshot_note(taken_at)}"
+    # Лимит Telegram на длину сообщения
+    await update.message.reply_text(text[:4000])
+    if chart is not None:
+        await context.bot.send_photo(
+            chat_id=update.effective_chat.id,
+            photo=InputFile(chart, filename="stats.png"),
+            caption=f"📈 Заполненность за {days} дн."
+        )
+        chart.close()
+
+
 @error_logger
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
     user = update.effective_user
-    logger.info(f"User {user.id} canceled the conversation. Clearing user_data: {context.user_data}")
+    logger.info(f"User {user.id} canceled the conversation. Clearing user_data keys: {list(context.user_data)}")
     context.user_data.clear()
     await update.message.reply_text("❌ Действие отменено.")
     return ConversationHandler.END
@@ -238,29 +745,41 @@ async def help_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
 
+def build_event_buttons(events, is_admin_user: bool):
+    """Кнопки записи на сессии"""
+    keyboard = []
+    for event in events:
+        event_text = (
+            f"{event.date_text} {event.event_time} | {event.available}/{event.max_participants} | {event.info}"
+            if is_admin_user
+            else f"{event.date_text} {event.event_time} | {event.info}"
+        )
+        keyboard.append([InlineKeyboardButton(event_text, callback_data=pack(CB_EVENT, event.id))])
+    return keyboard
+
+
 @error_logger
 async def show_events(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    message = update.message or update.callback_query.message
     try:
-        events = db.get_all_events()
-        message = update.message or update.callback_query.message
+        query = update.callback_query
+        paging = bool(query and unpack(query.data)[0] in (CB_EVENTS_NEXT, CB_EVENTS_PREV))
+        if paging:
+            await query.answer()
+            after_id, before_id = parse_page_callback(query.data, CB_EVENTS_PREV, CB_EVENTS_NEXT)
+        else:
+            after_id, before_id = None, None
+
+        events, has_prev, has_next = db.get_events_page(after_id, before_id, EVENTS_PAGE_SIZE)
         user = update.effective_user
         is_admin_user = is_admin(user.id)
 
         if not events:
-            await message.reply_text("Сейчас нет доступных сессий.")
+            await send_or_edit(update, "Сейчас нет доступных сессий.", edit=paging)
             return
 
-        keyboard = []
-        for event in events:
-            event_id, max_p, end_date, event_time, info, current = event
-            available = max_p - current
-            formatted_date = datetime.strptime(end_date, "%Y-%m-%d").strftime("%d.%m.%Y")
-            event_text = (
-                f"{formatted_date} {event_time} | {available}/{max_p} | {info}"
-                if is_admin_user
-                else f"{formatted_date} {event_time} | {info}"
-            )
-            keyboard.append([InlineKeyboardButton(event_text, callback_data=f"event_{event_id}")])
+        keyboard = build_event_buttons(events, is_admin_user)
+        keyboard.extend(build_page_buttons(CB_EVENTS_PREV, CB_EVENTS_NEXT, events, has_prev, has_next))
 
         reply_markup = InlineKeyboardMarkup(keyboard)
 
@@ -270,7 +789,7 @@ async def show_events(update: Update, context: ContextTypes.DEFAULT_TYPE):
         except FileNotFoundError:
             text = "Выберите мероприятие:"
 
-        await message.reply_text(text, reply_markup=reply_markup)
+        await send_or_edit(update, text, reply_markup, edit=paging)
 
     except Exception as e:
         logger.error(f"Ошибка в show_events: {str(e)}", exc_info=True)
@@ -278,45 +797,70 @@ async def show_events(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 
 @error_logger
-@error_logger
-async def event_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    await query.answer()
+async def search_events(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    text = " ".join(context.args or [])
+    if not database.fts_query(text):
+        await update.message.reply_text("🔎 Использование: /search <слова из описания>\nНапример: /search йога утро")
+        return
 
-    if query.data.startswith("event_"):
-        event_id = int(query.data.split("_")[1])
-        available = db.check_available_slots(event_id)
+    events = db.search_events(text, EVENTS_PAGE_SIZE)
+    if not events:
+        await update.message.reply_text("Среди актуальных сессий ничего не найдено.")
+        return
 
-        if available > 0:
-            success = db.register_user(
-                query.from_user.id,
-                query.from_user.username,
-                event_id
-            )
+    keyboard = build_event_buttons(events, is_admin(update.effective_user.id))
+    await update.message.reply_text(
+        f"🔎 Найдено по запросу «{text}»:",
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
 
-            if success:
-                await query.edit_message_text(
-                    f"✅ Ты записан(а) на сессию!" #Осталось мест: {available - 1} 
-                )
-            else:
-                keyboard = [
-                    [
-                        InlineKeyboardButton("✅ Да", callback_data=f"confirm_unreg_{event_id}"),
-                        InlineKeyboardButton("❌ Нет", callback_data="cancel_unreg")
-                    ]
-                ]
-                await query.edit_message_text(
-                    "⚠️ Ты уже записан(а) на эту сессию. Отменить регистрацию?",
-                    reply_markup=InlineKeyboardMarkup(keyboard)
-                )
-        else:
-            await query.edit_message_text("⚠️ К сожалению, все места заняты!")
+
+@error_logger
+async def inline_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """@бот <текст> в любом чате: найденные сессии со ссылкой на запись в личке с ботом"""
+    inline_query = update.inline_query
+    if database.fts_query(inline_query.query):
+        events = db.search_events(inline_query.query, INLINE_RESULTS)
+    else:
+        events = db.get_events_page(limit=INLINE_RESULTS)[0]
+
+    results = []
+    for event in events:
+        link = f"https://t.me/{context.bot.username}?start=ev{event.id}"
+        results.append(InlineQueryResultArticle(
+            id=str(event.id),
+            title=f"{event.date_text} {event.event_time} | {event.info[:60]}",
+            description=f"Свободно мест: {max(0, event.available)} из {event.max_participants}",
+            input_message_content=InputTextMessageContent(f"📆 {event.date_text} {event.event_time}\n{event.info}"),
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("✍️ Записаться", url=link)]])
+        ))
+    await inline_query.answer(results, cache_time=INLINE_CACHE_TIME)
 
 
-async def handle_back_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
+@error_logger
+async def event_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
-    await admin_events(update, context)
+
+    event_id, = callback_args(update)
+    # Свободные места проверяются в той же транзакции, что и вставка
+    result = await submit_registration("register", query.from_user.id, query.from_user.username, event_id)
+
+    if result == database.REGISTERED:
+        await query.edit_message_text("✅ Ты записан(а) на сессию!")
+    elif result == database.DUPLICATE:
+        keyboard = [
+            [
+                InlineKeyboardButton("✅ Да", callback_data=pack(CB_UNREG_CONFIRM, event_id)),
+                InlineKeyboardButton("❌ Нет", callback_data=pack(CB_UNREG_CANCEL))
+            ]
+        ]
+        await query.edit_message_text(
+            "⚠️ Ты уже записан(а) на эту сессию. Отменить регистрацию?",
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+    else:
+        await query.edit_message_text("⚠️ К сожалению, все места заняты!")
 
 
 @error_logger
@@ -324,24 +868,21 @@ async def admin_actions(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
 
-    if query.data.startswith("view_"):
-        event_id = int(query.data.split("_")[1])
+    prefix, (event_id,) = unpack(query.data)
 
+    if prefix == CB_VIEW:
         # Получаем полные данные о мероприятии
         event = db.get_event_by_id(event_id)
         if not event:
             await query.edit_message_text("❌ Сессия не найдена")
             return
 
-        formatted_date = datetime.strptime(event['end_date'], "%Y-%m-%d").strftime("%d.%m.%Y")
-        event_time = event['event_time']
-
         message_text = (
             f"📌 ID сессии: {event_id}\n"
-            f"📅 Дата: {formatted_date}\n"
-            f"⏰ Время: {event_time}\n"
-            f"👥 Участники: {event['current_participants']}/{event['max_participants']}\n"
-            f"📝 Описание: {event['info'] or 'Без описания'}\n\n"
+            f"📅 Дата: {event.date_text}\n"
+            f"⏰ Время: {event.event_time}\n"
+            f"👥 Участники: {event.current_participants}/{event.max_participants}\n"
+            f"📝 Описание: {event.info or 'Без описания'}\n\n"
             "🗒 Список участников:\n"
         )
 
@@ -353,12 +894,12 @@ async def admin_actions(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         keyboard = [
             [
-                InlineKeyboardButton("📨 Сообщение", callback_data=f"sendmsg_{event_id}"),
-                InlineKeyboardButton("🔗 Ссылка", callback_data=f"sendlink_{event_id}")
+                InlineKeyboardButton("📨 Сообщение", callback_data=pack(CB_SENDMSG, event_id)),
+                InlineKeyboardButton("🔗 Ссылка", callback_data=pack(CB_SENDLINK, event_id))
             ],
             [
-                InlineKeyboardButton("🗑 Удалить участника", callback_data=f"removeuser_{event_id}"),
-                InlineKeyboardButton("↩️ Назад", callback_data="adminevents")
+                InlineKeyboardButton("🗑 Удалить участника", callback_data=pack(CB_REMOVE_USER_START, event_id)),
+                InlineKeyboardButton("↩️ Назад", callback_data=pack(CB_ADMIN_PAGE))
             ]
         ]
         await query.edit_message_text(
@@ -366,12 +907,11 @@ async def admin_actions(update: Update, context: ContextTypes.DEFAULT_TYPE):
             reply_markup=InlineKeyboardMarkup(keyboard)
         )
 
-    elif query.data.startswith("delete_"):
-        event_id = int(query.data.split("_")[1])
+    elif prefix == CB_DELETE:
         context.user_data['delete_event_id'] = event_id
         keyboard = [
-            [InlineKeyboardButton("✅ Да", callback_data="confirm_delete")],
-            [InlineKeyboardButton("❌ Нет", callback_data="cancel_delete")]
+            [InlineKeyboardButton("✅ Да", callback_data=pack(CB_DELETE_CONFIRM))],
+            [InlineKeyboardButton("❌ Нет", callback_data=pack(CB_DELETE_CANCEL))]
         ]
         await query.edit_message_text(
             "❓ Вы уверены, что хотите удалить мероприятие?",
@@ -389,17 +929,18 @@ async def handle_unregistration(update: Update, context: ContextTypes.DEFAULT_TY
     await query.answer()
 
     try:
-        if query.data.startswith("confirm_unreg_"):
-            event_id = int(query.data.split("_")[-1])  # Безопасное получение ID
+        prefix, values = unpack(query.data)
+        if prefix == CB_UNREG_CONFIRM:
+            event_id, = values
             user_id = query.from_user.id
             
-            if db.delete_registration(user_id, event_id):
+            if await submit_registration("unregister", user_id, event_id):
                 await query.edit_message_text("✅ Регистрация успешно отменена!")
                 await show_events(update, context)
             else:
                 await query.edit_message_text("❌ Ошибка отмены регистрации")
 
-        elif query.data == "cancel_unreg":
+        elif prefix == CB_UNREG_CANCEL:
             await query.edit_message_text("✖️ Действие отменено")
         
     except Exception as e:
@@ -415,13 +956,14 @@ async def send_message_to_participants(update: Update, context: ContextTypes.DEF
     if not await check_admin_access(update):
         return ConversationHandler.END
 
-    event_id = int(query.data.split('_')[1])
+    event_id, = callback_args(update)
     context.user_data['sendmsg_event_id'] = event_id
 
     await query.edit_message_text("✍️ Введите сообщение для участников:")
     return WAITING_FOR_MESSAGE
 
 
+@error_logger
 async def send_link_to_participants(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
@@ -429,7 +971,7 @@ async def send_link_to_participants(update: Update, context: ContextTypes.DEFAUL
     if not await check_admin_access(update):
         return ConversationHandler.END
 
-    event_id = int(query.data.split('_')[1])
+    event_id, = callback_args(update)
     context.user_data['sendlink_event_id'] = event_id
 
     await query.edit_message_text("🔗 Введите ссылку для участников:")
@@ -451,17 +993,18 @@ async def confirm_link_sending(update: Update, context: ContextTypes.DEFAULT_TYP
     )
 
     success, failed = 0, 0
-    for user_id in participants:
-        try:
-            await context.bot.send_message(
-                chat_id=user_id,
-                text=message_text,
-                disable_web_page_preview=False
-            )
-            success += 1
-        except Exception as e:
-            logger.error(f"Ошибка отправки пользователю {user_id}: {str(e)}")
-            failed += 1
+    with network.bulk_traffic():
+        for user_id in participants:
+            try:
+                await context.bot.send_message(
+                    chat_id=user_id,
+                    text=message_text,
+                    disable_web_page_preview=False
+                )
+                success += 1
+            except Exception as e:
+                logger.error(f"Ошибка отправки пользователю {user_id}: {str(e)}")
+                failed += 1
 
     await query.edit_message_text(
         f"✅ Сообщение отправлено {success} участникам.\n"
@@ -485,8 +1028,8 @@ async def process_link_input(update: Update, context: ContextTypes.DEFAULT_TYPE)
     context.user_data['generated_message'] = message_text
 
     keyboard = [
-        [InlineKeyboardButton("✅ Отправить", callback_data="confirm_link")],
-        [InlineKeyboardButton("❌ Отмена", callback_data="cancel_link")]
+        [InlineKeyboardButton("✅ Отправить", callback_data=pack(CB_LINK_CONFIRM))],
+        [InlineKeyboardButton("❌ Отмена", callback_data=pack(CB_LINK_CANCEL))]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
 
@@ -506,13 +1049,14 @@ async def send_message_handler(update: Update, context: ContextTypes.DEFAULT_TYP
     participant_ids = [uid for uid in participant_ids if uid not in ADMIN_IDS]
 
     success, failed = 0, 0
-    for user_id in participant_ids:
-        try:
-            await context.bot.send_message(chat_id=user_id, text=message_text)
-            success += 1
-        except Exception as e:
-            logger.error(f"Ошибка отправки пользователю {user_id}: {e}")
-            failed += 1
+    with network.bulk_traffic():
+        for user_id in participant_ids:
+            try:
+                await context.bot.send_message(chat_id=user_id, text=message_text)
+                success += 1
+            except Exception as e:
+                logger.error(f"Ошибка отправки пользователю {user_id}: {e}")
+                failed += 1
 
     await update.message.reply_text(
         f"✅ Сообщение отправлено {success} участникам.\n"
@@ -527,18 +1071,18 @@ async def remove_user_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
 
-    event_id = int(query.data.split("_")[1])
+    event_id, = callback_args(update)
     context.user_data["current_event_id"] = event_id
 
-    participants = db.get_event_participants(event_id)
+    participants = db.get_event_participant_rows(event_id)
 
     if not participants:
         await query.edit_message_text("❌ В этом мероприятии нет участников")
         return ConversationHandler.END
 
     keyboard = [
-        [InlineKeyboardButton(f"@{username}", callback_data=f"remove_{username}")]
-        for username in participants
+        [InlineKeyboardButton(f"@{user.username}", callback_data=pack(CB_REMOVE_USER, user.user_id))]
+        for user in participants
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
     await query.edit_message_text(
@@ -552,12 +1096,12 @@ async def remove_user_finish(update: Update, context: ContextTypes.DEFAULT_TYPE)
     query = update.callback_query
     await query.answer()
 
-    username = query.data.split("_")[1]
+    user_id, = callback_args(update)
     event_id = context.user_data["current_event_id"]
-    user_id = db.get_user_id_by_username(username)
+    username = next((user.username for user in db.get_event_participant_rows(event_id) if user.user_id == user_id), None)
 
-    if user_id:
-        db.delete_registration(user_id, event_id)
+    if username is not None:
+        await submit_registration("unregister", user_id, event_id)
 
         try:
             with open("misc/user_banned.txt", "r", encoding="utf-8") as f:
@@ -590,16 +1134,13 @@ async def confirm_delete(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
         event = db.get_event_by_id(event_id)
         participants = db.get_event_participant_ids(event_id)
-        event_date = datetime.strptime(event['end_date'], "%Y-%m-%d").strftime("%d.%m.%Y")
-        event_time = event['event_time']
+        event_date = event.date_text
+        event_time = event.event_time
 
         db.delete_event(event_id)
         
         # Удаление всех связанных jobs
-        job_name = f"reminder_{event_id}"
-        for job in context.job_queue.jobs():
-            if job.name == job_name:
-                job.schedule_removal()
+        drop_reminders(context.job_queue, [event_id])
         
         try:
             with open("misc/event_deleted.txt", "r", encoding="utf-8") as f:
@@ -616,16 +1157,17 @@ async def confirm_delete(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
         success, failed = 0, 0
-        for user_id in participants:
-            try:
-                await context.bot.send_message(
-                    chat_id=user_id,
-                    text=message_text
-                )
-                success += 1
-            except Exception as e:
-                logger.error(f"Ошибка отправки {user_id}: {str(e)}")
-                failed += 1
+        with network.bulk_traffic():
+            for user_id in participants:
+                try:
+                    await context.bot.send_message(
+                        chat_id=user_id,
+                        text=message_text
+                    )
+                    success += 1
+                except Exception as e:
+                    logger.error(f"Ошибка отправки {user_id}: {str(e)}")
+                    failed += 1
         
         logger.info(f"Мероприятие {event_id} удалено. Jobs очищены. Уведомлено участников {success}/{failed}!")
         await query.edit_message_text(f"✅ Мероприятие удалено!\nУведомлено участников {success}/{failed}!\n")
@@ -672,8 +1214,8 @@ async def perform_export(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Генерация файла
         buffer = None
         try:
-            buffer = generate_export_file(
-                db.conn,
+            buffer, taken_at = await run_snapshot_export(
+                "generate_export_file",
                 start_date=start_date,
                 end_date=end_date
             )
@@ -687,7 +1229,10 @@ async def perform_export(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await context.bot.send_document(
                 chat_id=user_id,
                 document=InputFile(buffer, filename=filename),
-                caption=f"📊 Экспорт мероприятий ({start_date or 'все'} - {end_date or 'сегодня'})"
+                caption=(
+                    f"📊 Экспорт мероприятий ({start_date or 'все'} - {end_date or 'сегодня'})\n"
+                    f"{snapshot_note(taken_at)}"
+                )
             )
 
         except sqlite3.Error as e:
@@ -802,16 +1347,10 @@ async def create_info(update: Update, context: ContextTypes.DEFAULT_TYPE):
             context.user_data["end_date"],
             datetime.strptime(event_time, "%H:%M").time()
         )
-        reminder_time = event_datetime - timedelta(hours=hours_to_remind)
-
-        if reminder_time > datetime.now():
-            delta = (reminder_time - datetime.now()).total_seconds()
-            context.job_queue.run_once(
-                send_reminder,
-                when=delta,
-                data=event_id,
-                name=f"reminder_{event_id}"
-            )
+
+        # Не лидер: напоминание поставит лидер при следующей сверке
+        if is_scheduler_leader():
+            schedule_reminders(context.job_queue, [(event_id, reminder_time_for(event_datetime))])
 
         await update.message.reply_text("✅ Мероприятие успешно создано!")
         return ConversationHandler.END
@@ -841,6 +1380,360 @@ async def create_end(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return CREATE_END
 
 
+@error_logger
+async def bulk_create_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not await check_admin_access(update):
+        return ConversationHandler.END
+
+    context.user_data.clear()
+    if update.callback_query:
+        await update.callback_query.answer()
+    await update.effective_message.reply_text(bulk_events.HELP_TEXT)
+    return BULK_INPUT
+
+
+@error_logger
+async def bulk_create_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    message = update.message
+    if message.document:
+        if (message.document.file_size or 0) > BULK_FILE_MAX_BYTES:
+            await message.reply_text(f"❌ Файл больше {BULK_FILE_MAX_BYTES // 1024} КБ")
+            return BULK_INPUT
+        file = await message.document.get_file()
+        try:
+            text = bytes(await file.download_as_bytearray()).decode("utf-8-sig")
+        except UnicodeDecodeError:
+            await message.reply_text("❌ Файл должен быть в кодировке UTF-8")
+            return BULK_INPUT
+    else:
+        text = message.text
+
+    # Проверка всего списка до записи в базу: в транзакцию попадают только корректные строки
+    rows, errors = bulk_events.parse_events(text)
+    if not rows:
+        await message.reply_text(
+            "❌ Нечего создавать:\n" + "\n".join(errors[:15]) + "\n\nИсправьте и отправьте снова или /cancel"
+        )
+        return BULK_INPUT
+
+    context.user_data["bulk_rows"] = rows
+    keyboard = [[
+        InlineKeyboardButton(f"✅ Создать ({len(rows)})", callback_data=pack(CB_BULK_CONFIRM)),
+        InlineKeyboardButton("❌ Отмена", callback_data=pack(CB_BULK_CANCEL))
+    ]]
+    await message.reply_text(
+        bulk_events.format_preview(rows, errors),
+        reply_markup=InlineKeyboardMarkup(keyboard)
+    )
+    return BULK_CONFIRM
+
+
+@error_logger
+async def bulk_create_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+
+    rows = context.user_data.pop("bulk_rows", None)
+    context.user_data.clear()
+    if unpack(query.data)[0] == CB_BULK_CANCEL or not rows:
+        await query.edit_message_text("✖️ Создание отменено")
+        return ConversationHandler.END
+
+    try:
+        event_ids = db.add_events(rows)
+    except Exception as e:
+        logger.error(f"Ошибка в bulk_create_confirm: {str(e)}", exc_info=True)
+        await query.edit_message_text("❌ Внутренняя ошибка: ни одна сессия не создана.")
+        return ConversationHandler.END
+
+    scheduled = 0
+    # Не лидер: напоминания поставит лидер при следующей сверке
+    if is_scheduler_leader():
+        scheduled = schedule_reminders(context.job_queue, (
+            (event_id, reminder_time_for(datetime.fromisoformat(f"{end_date} {event_time}")))
+            for event_id, (_, end_date, event_time, _) in zip(event_ids, rows)
+        ))
+    logger.info(f"Создано сессий пачкой: {len(event_ids)} ({event_ids[0]}..{event_ids[-1]})")
+
+    await query.edit_message_text(
+        f"✅ Создано сессий: {len(event_ids)}\nНапоминаний запланировано: {scheduled}"
+    )
+    return ConversationHandler.END
+
+
+def format_event_line(event) -> str:
+    return f"• {event.date_text} {event.event_time} - {event.info[:40]}"
+
+
+async def notify_participants(bot, registrations, events, format_message):
+    """
+    Одно сообщение на участника, сколько бы его сессий ни затронуло действие.
+    registrations - [Registration], events - [Event],
+    format_message(список Event участника) -> текст. Возвращает (успешно, ошибок)
+    """
+    by_id = {event.id: event for event in events}
+    per_user = {}
+    for registration in registrations:
+        if registration.event_id in by_id:
+            per_user.setdefault(registration.user_id, []).append(by_id[registration.event_id])
+
+    success, failed = 0, 0
+    with network.bulk_traffic():
+        for user_id, user_events in per_user.items():
+            try:
+                await bot.send_message(chat_id=user_id, text=format_message(user_events))
+                success += 1
+            except Exception as e:
+                logger.error(f"Ошибка отправки {user_id}: {str(e)}")
+                failed += 1
+    return success, failed
+
+
+def format_deleted_message(events) -> str:
+    if len(events) == 1:
+        try:
+            with open("misc/event_deleted.txt", "r", encoding="utf-8") as f:
+                template = f.read().strip()
+        except FileNotFoundError:
+            template = (
+                "❌ Мероприятие отменено!\n"
+                "Дата: {event_date}\n"
+                "Время: {event_time}"
+            )
+        return template.format(event_date=events[0].date_text, event_time=events[0].event_time)
+    lines = [format_event_line(event) for event in events]
+    return "❌ Отменены мероприятия, на которые вы записаны:\n" + "\n".join(lines)
+
+
+def format_shifted_message(events) -> str:
+    lines = [format_event_line(event) for event in events]
+    title = "🕒 Мероприятие перенесено" if len(events) == 1 else "🕒 Перенесены мероприятия, на которые вы записаны"
+    return f"{title}, новое время:\n" + "\n".join(lines)
+
+
+async def show_bulk_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Страница выбора: отмеченные сессии, листание, действия над выбранными"""
+    selected = set(context.user_data.get("bulk_selected", []))
+    after_id, before_id = context.user_data.get("bulk_page", (None, None))
+    events, has_prev, has_next = db.get_events_page(after_id, before_id, EVENTS_PAGE_SIZE)
+
+    keyboard = []
+    for event in events:
+        mark = "✅" if event.id in selected else "▫️"
+        keyboard.append([InlineKeyboardButton(
+            f"{mark} {event.day_month} {event.event_time} "
+            f"({event.current_participants}/{event.max_participants}) {event.info[:20]}",
+            callback_data=pack(CB_BULK_TOGGLE, event.id)
+        )])
+    keyboard.extend(build_page_buttons(CB_BULK_SELECT_PREV, CB_BULK_SELECT_NEXT, events, has_prev, has_next))
+    if events:
+        keyboard.append([InlineKeyboardButton("☑️ Вся страница", callback_data=pack(CB_BULK_TOGGLE_PAGE))])
+    keyboard.append([
+        InlineKeyboardButton("🗑 Удалить", callback_data=pack(CB_BULK_ACTION, 0)),
+        InlineKeyboardButton("🕒 Сдвинуть", callback_data=pack(CB_BULK_ACTION, 1)),
+        InlineKeyboardButton("👥 Мест", callback_data=pack(CB_BULK_ACTION, 2))
+    ])
+    keyboard.append([InlineKeyboardButton("✖️ Закрыть", callback_data=pack(CB_BULK_CLOSE))])
+
+    text = f"Массовые действия. Отметьте сессии (можно на разных страницах).\nВыбрано: {len(selected)}"
+    await send_or_edit(update, text, InlineKeyboardMarkup(keyboard))
+
+
+@error_logger
+async def bulk_select(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not await check_admin_access(update):
+        return ConversationHandler.END
+
+    query = update.callback_query
+    await query.answer()
+    prefix, values = unpack(query.data)
+    user_data = context.user_data
+
+    if prefix == CB_BULK_SELECT:
+        user_data.clear()
+        user_data["bulk_selected"] = []
+        user_data["bulk_page"] = (None, None)
+    elif prefix == CB_BULK_CLOSE:
+        user_data.clear()
+        await query.edit_message_text("✖️ Массовые действия закрыты")
+        return ConversationHandler.END
+    elif prefix in (CB_BULK_SELECT_PREV, CB_BULK_SELECT_NEXT):
+        user_data["bulk_page"] = parse_page_callback(query.data, CB_BULK_SELECT_PREV, CB_BULK_SELECT_NEXT)
+    elif prefix == CB_BULK_TOGGLE:
+        selected = user_data.setdefault("bulk_selected", [])
+        if values[0] in selected:
+            selected.remove(values[0])
+        else:
+            selected.append(values[0])
+    elif prefix == CB_BULK_TOGGLE_PAGE:
+        after_id, before_id = user_data.get("bulk_page", (None, None))
+        page_ids = [event.id for event in db.get_events_page(after_id, before_id, EVENTS_PAGE_SIZE)[0]]
+        selected = user_data.setdefault("bulk_selected", [])
+        if all(event_id in selected for event_id in page_ids):
+            user_data["bulk_selected"] = [event_id for event_id in selected if event_id not in page_ids]
+        else:
+            selected.extend(event_id for event_id in page_ids if event_id not in selected)
+
+    await show_bulk_selection(update, context)
+    return BULK_SELECT
+
+
+@error_logger
+async def bulk_action(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    action_index, = callback_args(update)
+    if not 0 <= action_index < len(BULK_ACTIONS):
+        # Кодек пропускает и отрицательные числа, а они - тоже допустимые индексы кортежа
+        logger.error(f"Ошибка разбора callback_data: {query.data} -> недопустимое действие")
+        await query.answer()
+        await query.edit_message_text("❌ Неизвестное действие")
+        context.user_data.clear()
+        return ConversationHandler.END
+
+    selected = context.user_data.get("bulk_selected", [])
+    # Сессии могли удалить, пока шел выбор
+    events = db.get_events_by_ids(selected) if selected else []
+    if not events:
+        await query.answer("Не выбрано ни одной сессии", show_alert=True)
+        return BULK_SELECT
+    await query.answer()
+    context.user_data["bulk_selected"] = [event.id for event in events]
+
+    action = BULK_ACTIONS[action_index]
+    if action == "delete":
+        registered = sum(event.current_participants for event in events)
+        lines = [format_event_line(event) for event in events[:15]]
+        if len(events) > 15:
+            lines.append(f"… и еще {len(events) - 15}")
+        keyboard = [[
+            InlineKeyboardButton(f"🗑 Удалить ({len(events)})", callback_data=pack(CB_BULK_DELETE_CONFIRM)),
+            InlineKeyboardButton("❌ Отмена", callback_data=pack(CB_BULK_DELETE_CANCEL))
+        ]]
+        await query.edit_message_text(
+            f"Удалить сессии ({len(events)}), записей на них: {registered}?\n" + "\n".join(lines),
+            reply_markup=InlineKeyboardMarkup(keyboard)
+        )
+        return BULK_DELETE_CONFIRM
+    if action == "shift":
+        await query.edit_message_text(
+            f"Выбрано сессий: {len(events)}.\n"
+            "На сколько сдвинуть? Например: +1д, -2ч, +30м, +1д 2ч. /cancel - отмена."
+        )
+        return BULK_SHIFT_VALUE
+    await query.edit_message_text(
+        f"Выбрано сессий: {len(events)}.\nНовое число мест для всех выбранных? /cancel - отмена."
+    )
+    return BULK_MAX_VALUE
+
+
+@error_logger
+async def bulk_delete_confirm(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+
+    if unpack(query.data)[0] == CB_BULK_DELETE_CANCEL:
+        await show_bulk_selection(update, context)
+        return BULK_SELECT
+
+    event_ids = context.user_data.get("bulk_selected", [])
+    context.user_data.clear()
+    try:
+        events, registrations = db.delete_events(event_ids)
+    except Exception as e:
+        logger.error(f"Ошибка в bulk_delete_confirm: {str(e)}", exc_info=True)
+        await query.edit_message_text("❌ Внутренняя ошибка: ни одна сессия не удалена.")
+        return ConversationHandler.END
+
+    drop_reminders(context.job_queue, [event.id for event in events])
+    success, failed = await notify_participants(context.bot, registrations, events, format_deleted_message)
+    logger.info(f"Удалено сессий пачкой: {len(events)}. Уведомлено участников {success}/{failed}")
+    await query.edit_message_text(
+        f"✅ Удалено сессий: {len(events)}\nУведомлено участников {success}/{failed}"
+    )
+    return ConversationHandler.END
+
+
+@error_logger
+async def bulk_shift_value(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        minutes = bulk_events.parse_shift(update.message.text)
+    except ValueError as e:
+        await update.message.reply_text(f"❌ Неверный сдвиг: {str(e)}")
+        return BULK_SHIFT_VALUE
+
+    events = db.get_events_by_ids(context.user_data.get("bulk_selected", []))
+    now = datetime.now()
+    shift = timedelta(minutes=minutes)
+    in_past = [event for event in events if event.starts_at + shift <= now]
+    if in_past:
+        lines = [format_event_line(event) for event in in_past[:10]]
+        await update.message.reply_text(
+            "❌ После сдвига окажутся в прошлом:\n" + "\n".join(lines) + "\n\nВведите другой сдвиг или /cancel"
+        )
+        return BULK_SHIFT_VALUE
+
+    context.user_data.clear()
+    try:
+        shifted, registrations = db.shift_events([event.id for event in events], minutes)
+    except Exception as e:
+        logger.error(f"Ошибка в bulk_shift_value: {str(e)}", exc_info=True)
+        await update.message.reply_text("❌ Внутренняя ошибка: ни одна сессия не изменена.")
+        return ConversationHandler.END
+
+    drop_reminders(context.job_queue, [event.id for event in shifted])
+    scheduled = 0
+    if is_scheduler_leader():
+        scheduled = schedule_reminders(context.job_queue, (
+            (event.id, reminder_time_for(event.starts_at))
+            for event in shifted
+        ))
+    success, failed = await notify_participants(context.bot, registrations, shifted, format_shifted_message)
+    logger.info(f"Сдвинуто сессий пачкой: {len(shifted)} на {minutes} мин. Уведомлено участников {success}/{failed}")
+    await update.message.reply_text(
+        f"✅ Сдвинуто сессий: {len(shifted)}\n"
+        f"Напоминаний перепланировано: {scheduled}\n"
+        f"Уведомлено участников {success}/{failed}"
+    )
+    return ConversationHandler.END
+
+
+@error_logger
+async def bulk_max_value(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    try:
+        new_max = int(update.message.text.strip())
+        if new_max <= 0:
+            raise ValueError
+    except ValueError:
+        await update.message.reply_text("❌ Введите целое положительное число!")
+        return BULK_MAX_VALUE
+
+    event_ids = context.user_data.get("bulk_selected", [])
+    try:
+        too_full = db.set_max_participants(event_ids, new_max)
+    except Exception as e:
+        logger.error(f"Ошибка в bulk_max_value: {str(e)}", exc_info=True)
+        await update.message.reply_text("❌ Внутренняя ошибка: ни одна сессия не изменена.")
+        context.user_data.clear()
+        return ConversationHandler.END
+
+    if too_full:
+        events = {event.id: event for event in db.get_events_by_ids([event_id for event_id, _ in too_full])}
+        lines = [
+            f"{format_event_line(events[event_id])}: записано {count}"
+            for event_id, count in too_full if event_id in events
+        ]
+        await update.message.reply_text(
+            f"⚠️ Нельзя установить {new_max}: записано больше участников\n"
+            + "\n".join(lines[:10]) + "\n\nВведите другое число или /cancel"
+        )
+        return BULK_MAX_VALUE
+
+    context.user_data.clear()
+    logger.info(f"Лимит участников {new_max} установлен для сессий: {len(event_ids)}")
+    await update.message.reply_text(f"✅ Лимит участников {new_max} установлен для сессий: {len(event_ids)}")
+    return ConversationHandler.END
+
+
 @error_logger
 async def admin_events(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
@@ -848,39 +1741,43 @@ async def admin_events(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return
 
         context.user_data.clear()
-        
-        events = db.get_all_events()
+
+        query = update.callback_query
+        paging = bool(query and unpack(query.data)[0] in (CB_ADMIN_PAGE, CB_ADMIN_NEXT, CB_ADMIN_PREV))
+        if paging:
+            await query.answer()
+            after_id, before_id = parse_page_callback(query.data, CB_ADMIN_PREV, CB_ADMIN_NEXT)
+        else:
+            after_id, before_id = None, None
+
+        events, has_prev, has_next = db.get_events_page(after_id, before_id, EVENTS_PAGE_SIZE)
 
         if not events:
-            message = update.message or update.callback_query.message
-            await message.reply_text("Нет мероприятий для управления.")
+            await send_or_edit(update, "Нет мероприятий для управления.", edit=paging)
             return
 
         keyboard = []
         for event in events:
-            event_id, max_p, end_date, event_time, info, current = event
-            available = max_p - current
-
-            day_month = end_date.split("-")[2] + "." + end_date.split("-")[1]
-            event_text = f"{day_month} {event_time}"
+            event_text = f"{event.day_month} {event.event_time}"
 
             # Добавляем кнопки в один ряд
             keyboard.append([
                 InlineKeyboardButton(
                     event_text,
-                    callback_data=f"view_{event_id}"
+                    callback_data=pack(CB_VIEW, event.id)
                 ),
-                InlineKeyboardButton("✏️", callback_data=f"edit_{event_id}"),
-                InlineKeyboardButton("❌", callback_data=f"delete_{event_id}")
+                InlineKeyboardButton("✏️", callback_data=pack(CB_EDIT, event.id)),
+                InlineKeyboardButton("❌", callback_data=pack(CB_DELETE, event.id))
             ])
+        keyboard.extend(build_page_buttons(CB_ADMIN_PREV, CB_ADMIN_NEXT, events, has_prev, has_next))
+        keyboard.append([InlineKeyboardButton("☑️ Массовые действия", callback_data=pack(CB_BULK_SELECT))])
 
         reply_markup = InlineKeyboardMarkup(keyboard)
-        message = update.message or update.callback_query.message
-        await message.reply_text("Управление мероприятиями:", reply_markup=reply_markup)
+        await send_or_edit(update, "Управление мероприятиями:", reply_markup, edit=paging)
 
     except Exception as e:
         logger.error(f"Ошибка в admin_events (User {update.effective_user.id}): {str(e)}")
-        await update.message.reply_text("❌ Ошибка загрузки меню.")
+        await update.effective_message.reply_text("❌ Ошибка загрузки меню.")
         context.user_data.clear()
 
 
@@ -898,8 +1795,9 @@ async def start_export_flow(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Очистка предыдущих данных
     context.user_data.clear()
     keyboard = [
-        [InlineKeyboardButton("Весь период", callback_data="all")],
-        [InlineKeyboardButton("Указать даты", callback_data="custom")]
+        [InlineKeyboardButton("Весь период", callback_data=pack(CB_EXPORT_ALL))],
+        [InlineKeyboardButton("Указать даты", callback_data=pack(CB_EXPORT_CUSTOM))],
+        [InlineKeyboardButton("🔄 Только изменения", callback_data=pack(CB_EXPORT_CHANGES))]
     ]
     reply_markup = InlineKeyboardMarkup(keyboard)
 
@@ -915,14 +1813,20 @@ async def handle_export_choice(update: Update, context: ContextTypes.DEFAULT_TYP
     query = update.callback_query
     await query.answer()
 
-    choice = query.data
-    if choice == "all":
+    choice, _ = unpack(query.data)
+    if choice == CB_EXPORT_ALL:
         context.user_data['export_start'] = None
         context.user_data['export_end'] = None
         return await perform_export(update, context)
-    elif choice == "custom":
+    elif choice == CB_EXPORT_CUSTOM:
         await query.edit_message_text("📆 Введите начальную дату (ГГГГ-ММ-ДД) или /skip:")
         return EXPORT_START_DATE
+    elif choice == CB_EXPORT_CHANGES:
+        last_seq = db.get_export_cursor(f"admin_{query.from_user.id}")
+        await query.edit_message_text(
+            f"🔄 Введите курсор (номер изменения) или /skip, чтобы продолжить с последнего ({last_seq}):"
+        )
+        return EXPORT_CURSOR
 
 
 @error_logger
@@ -966,6 +1870,45 @@ async def process_end_date(update: Update, context: ContextTypes.DEFAULT_TYPE):
     return await perform_export(update, context)
 
 
+@error_logger
+async def process_export_cursor(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    text = update.message.text.strip()
+    consumer = f"admin_{update.effective_user.id}"
+
+    if text.lower() == "/skip":
+        since_seq = db.get_export_cursor(consumer)
+    elif text.isdigit():
+        since_seq = int(text)
+    else:
+        await update.message.reply_text("❌ Курсор должен быть целым числом или /skip")
+        return EXPORT_CURSOR
+
+    buffer = None
+    try:
+        buffer, new_seq = await run_export("generate_changes_export", since_seq=since_seq)
+
+        if new_seq == since_seq:
+            await update.message.reply_text(f"📭 Изменений после курсора {since_seq} нет.")
+        else:
+            await context.bot.send_document(
+                chat_id=update.effective_user.id,
+                document=InputFile(buffer, filename=f"changes_{since_seq}_to_{new_seq}.ndjson"),
+                caption=f"🔄 Изменения {since_seq} → {new_seq}\nНовый курсор: {new_seq}"
+            )
+            db.set_export_cursor(consumer, new_seq)
+
+    except Exception as e:
+        logger.error(f"Ошибка выгрузки изменений: {str(e)}", exc_info=True)
+        await update.message.reply_text("❌ Не удалось сформировать файл изменений")
+
+    finally:
+        if buffer:
+            buffer.close()
+        context.user_data.clear()
+
+    return ConversationHandler.END
+
+
 @error_logger
 async def cancel_export(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data.clear()
@@ -988,18 +1931,13 @@ async def my_events(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         for event in events:
             try:
-                if len(event) < 4:
-                    continue
-
-                event_id, end_date, event_time, info = event
+                info = event.info
                 info_display = info[:20] + "..." if len(info) > 20 else info
 
-                formatted_date = datetime.strptime(end_date, "%Y-%m-%d").strftime("%d.%m.%Y")
-
-                btn_text = f"{formatted_date} {event_time} | {info_display}"
+                btn_text = f"{event.date_text} {event.event_time} | {info_display}"
                 keyboard.append([
-                    InlineKeyboardButton(btn_text, callback_data=f"detail_{event_id}"),
-                    InlineKeyboardButton("❌", callback_data=f"cancel_{event_id}")
+                    InlineKeyboardButton(btn_text, callback_data=pack(CB_DETAIL, event.id)),
+                    InlineKeyboardButton("❌", callback_data=pack(CB_CANCEL_REG, event.id))
                 ])
 
             except Exception as e:
@@ -1025,19 +1963,18 @@ async def show_event_details(update: Update, context: ContextTypes.DEFAULT_TYPE)
     query = update.callback_query
     await query.answer()
     
-    event_id = int(query.data.split("_")[1])
+    event_id, = callback_args(update)
     event = db.get_event_by_id(event_id)
     
     if not event:
         await query.edit_message_text("❌ Мероприятие не найдено")
         return
 
-    formatted_date = datetime.strptime(event['end_date'], "%Y-%m-%d").strftime("%d.%m.%Y")
     message_text = (
         f"📌 Детали сессии:\n\n"
-        f"📅 Дата: {formatted_date}\n"
-        f"⏰ Время: {event['event_time']}\n"
-        f"📝 Описание: {event['info'] or 'Без описания'}\n\n"
+        f"📅 Дата: {event.date_text}\n"
+        f"⏰ Время: {event.event_time}\n"
+        f"📝 Описание: {event.info or 'Без описания'}\n\n"
         f"Статус: ✅ Записан"
     )
     
@@ -1049,9 +1986,9 @@ async def cancel_registration(update: Update, context: ContextTypes.DEFAULT_TYPE
     query = update.callback_query
     await query.answer()
 
-    event_id = int(query.data.split("_")[1])
+    event_id, = callback_args(update)
     user_id = update.effective_user.id
-    db.delete_registration(user_id, event_id)
+    await submit_registration("unregister", user_id, event_id)
 
     # # Формируем сообщение
     # try:
@@ -1084,14 +2021,13 @@ async def edit_event_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     context.user_data.clear()
     
     try:
-        event_id = int(query.data.split("_")[1])
+        event_id, = callback_args(update)
         context.user_data['edit_event_id'] = event_id
         
+        field_titles = ("Макс. участников", "Дата сессии", "Время сессии", "Описание")
         keyboard = [
-            [InlineKeyboardButton("Макс. участников", callback_data="field_max_participants")],
-            [InlineKeyboardButton("Дата сессии", callback_data="field_end_date")],
-            [InlineKeyboardButton("Время сессии", callback_data="field_event_time")],
-            [InlineKeyboardButton("Описание", callback_data="field_info")]
+            [InlineKeyboardButton(title, callback_data=pack(CB_EDIT_FIELD, index))]
+            for index, title in enumerate(field_titles)
         ]
         
         reply_markup = InlineKeyboardMarkup(keyboard)
@@ -1111,7 +2047,10 @@ async def edit_choice(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await query.answer()
 
     try:
-        _, field = query.data.split('_', 1)
+        field_index, = callback_args(update)
+        if field_index >= len(EDIT_FIELDS):
+            raise ValueError(f"Недопустимый индекс поля: {field_index}")
+        field = EDIT_FIELDS[field_index]
         context.user_data['edit_field'] = field
 
         event_id = context.user_data.get('edit_event_id')
@@ -1125,10 +2064,10 @@ async def edit_choice(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return ConversationHandler.END
 
         field_data = {
-            'max_participants': ('максимальное количество участников', event['max_participants']),
-            'end_date': ('дату сессии', event['end_date']),
-            'event_time': ('время сессии', event['event_time']),
-            'info': ('описание', event['info'])
+            'max_participants': ('максимальное количество участников', event.max_participants),
+            'end_date': ('дату сессии', event.end_date),
+            'event_time': ('время сессии', event.event_time),
+            'info': ('описание', event.info)
         }
 
         if field not in field_data:
@@ -1182,9 +2121,9 @@ async def edit_value(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if field == "max_participants":
             try:
                 new_max = int(value)
-                if new_max < event["current_participants"]:
+                if new_max < event.current_participants:
                     await update.message.reply_text(
-                        f"⚠️ Нельзя установить меньше {event['current_participants']} (уже зарегистрированные участники)!"
+                        f"⚠️ Нельзя установить меньше {event.current_participants} (уже зарегистрированные участники)!"
                     )
                     return EDIT_VALUE
                 db.update_event_field(event_id, field, new_max)
@@ -1227,24 +2166,10 @@ async def edit_value(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Обновляем напоминание если нужно
         if field in ("end_date", "event_time"):
             event = db.get_event_by_id(event_id)
-            end_date = datetime.strptime(event["end_date"], "%Y-%m-%d").date()
-            event_time = datetime.strptime(event["event_time"], "%H:%M").time()
-            event_datetime = datetime.combine(end_date, event_time)
-            reminder_time = event_datetime - timedelta(hours=hours_to_remind)
-
-            job_name = f"reminder_{event_id}"
-            for job in context.job_queue.jobs():
-                if job.name == job_name:
-                    job.schedule_removal()
-
-            if reminder_time > datetime.now():
-                delta = (reminder_time - datetime.now()).total_seconds()
-                context.job_queue.run_once(
-                    send_reminder,
-                    when=delta,
-                    data=event_id,
-                    name=job_name
-                )
+            # Не лидер только снимает прежнее: новое поставит лидер при сверке
+            if not is_scheduler_leader():
+                drop_reminders(context.job_queue, [event_id])
+            elif schedule_reminders(context.job_queue, [(event_id, reminder_time_for(event.starts_at))]):
                 logger.info(f"🔄 Напоминание для {event_id} перепланировано")
 
         return ConversationHandler.END
@@ -1267,6 +2192,18 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     reply_markup = build_main_menu_keyboard(is_admin_user)
 
+    # Переход по ссылке из inline-поиска: /start ev<event_id>
+    deep_link = DEEP_LINK_EVENT.fullmatch(context.args[0]) if context.args else None
+    if deep_link:
+        events = db.get_events_by_ids([int(deep_link.group(1))])
+        if events and events[0].starts_at > datetime.now():
+            await update.message.reply_text(
+                "Записаться на сессию:",
+                reply_markup=InlineKeyboardMarkup(build_event_buttons(events, is_admin_user))
+            )
+            return
+        await update.message.reply_text("⚠️ Эта сессия уже прошла или отменена.")
+
     try:
         with open("misc/hello2.txt", "r", encoding="utf-8") as f:
             text = f.read()
@@ -1311,57 +2248,14 @@ async def menu_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await message.reply_text("\n".join(menu_text), reply_markup=reply_markup)
 
 
-@error_logger
-async def menu_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    query = update.callback_query
-    await query.answer()
-
-    try:
-        logging.info(f"User {query.from_user.id} pressed button: {query.data}")
-
-        command = query.data
-        user_id = query.from_user.id
-
-        if command == "menu":
-            await menu_command(update, context)
-        elif command == "events":
-            await show_events(update, context)
-        elif command == "myevents":
-            await my_events(update, context)
-        elif command == "help":
-            await help_command(update, context)
-            return
-        elif command == "adminevents":
-            if user_id in ADMIN_IDS:
-                await admin_events(update, context)
-            else:
-                await query.edit_message_text("⛔ Доступ запрещен!")
-        elif command == "createevent":
-            if user_id in ADMIN_IDS:
-                await create_event(update, context)
-            else:
-                await query.edit_message_text("⛔ Доступ запрещен!")
-        elif command.startswith("sendmsg_"):
-            await send_message_to_participants(update, context)
-            return
-        elif command == "export_history":
-            if user_id in ADMIN_IDS:
-                await export_history(update, context)
-            else:
-                await query.edit_message_text("⛔ Доступ запрещен!")
-        else:
-            await query.edit_message_text("⚠️ Команда не распознана")
-
-    except Exception as e:
-        logging.error(f"Error: {str(e)}", exc_info=True)
-        await query.edit_message_text("❌ Произошла ошибка при обработке запроса")
-
-
 @error_logger
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
-        await context.application.persistence.drop_user_data()
-        await context.application.persistence.drop_chat_data()
+        # Сбрасываем сохраненные данные только того пользователя, у которого произошла ошибка
+        if update.effective_user:
+            context.application.drop_user_data(update.effective_user.id)
+        if update.effective_chat:
+            context.application.drop_chat_data(update.effective_chat.id)
         if update.message:
             await update.message.reply_text("❌ Произошла внутренняя ошибка")
         elif update.callback_query:
@@ -1383,12 +2277,15 @@ async def export_history(update: Update, context: ContextTypes.DEFAULT_TYPE):
     query = update.callback_query
     await query.answer()
 
+    if not await check_admin_access(update):
+        return
+
     try:
-        buffer = generate_export_file(db.conn)
+        buffer, taken_at = await run_snapshot_export("generate_export_file")
         await context.bot.send_document(
             chat_id=query.from_user.id,
             document=InputFile(buffer, filename="history_export.xlsx"),
-            caption="📊 Полный экспорт данных"
+            caption=f"📊 Полный экспорт данных\n{snapshot_note(taken_at)}"
         )
         buffer.close()
 
@@ -1399,65 +2296,177 @@ async def export_history(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def restore_reminders(context: ContextTypes.DEFAULT_TYPE):
     try:
-        db = database.Database(DATABASE_NAME)
+        db = open_database()
         events = db.get_all_events()
 
-        for event in events:
-            event_id = event[0]
-            end_date_str = event[2]
-            event_time_str = event[3]
-
-            # Парсим время
-            end_date = datetime.strptime(end_date_str, "%Y-%m-%d").date()
-            event_time = datetime.strptime(event_time_str, "%H:%M").time()
-            event_datetime = datetime.combine(end_date, event_time)
-            reminder_time = event_datetime - timedelta(hours=hours_to_remind)
-
-            # Создаем задачу если время актуально
-            if reminder_time > datetime.now():
-                delta = (reminder_time - datetime.now()).total_seconds()
-                context.job_queue.run_once(
-                    send_reminder,
-                    when=delta,
-                    data=event_id,
-                    name=f"reminder_{event_id}"
-                )
-                logger.info(f"♻️ Восстановлено напоминание для {event_id}")
+        # Задачи ставятся только для будущих напоминаний
+        restored = schedule_reminders(context.job_queue, (
+            (event.id, reminder_time_for(event.starts_at))
+            for event in events
+        ))
+        logger.info(f"♻️ Восстановлено напоминаний: {restored}")
 
     except Exception as e:
         logger.error(f"Ошибка восстановления: {str(e)}", exc_info=True)
-        await context.application.persistence.drop_user_data()
-        await context.application.persistence.drop_chat_data()
+        await drop_all_persistent_data(context.application)
         logger.info("Полный сброс persistence после ошибки восстановления")
 
 
-def main():
-    global db
-    db = database.Database(DATABASE_NAME)
+def is_ready(application: Application) -> bool:
+    if not application.running or db is None:
+        return False
+    db.conn.execute("SELECT 1")
+    return True
+
 
-    application = (
+def setup_metrics(application: Application):
+    metrics.JOB_QUEUE_DEPTH.set_function(lambda: len(application.job_queue.jobs()))
+    metrics.PENDING_REMINDERS.set_function(
+        lambda: sum(1 for job in application.job_queue.jobs() if job.name.startswith(REMINDER_JOB_PREFIX))
+    )
+    metrics.SCHEDULER_LEADER.set_function(lambda: int(is_scheduler_leader()))
+    metrics.ANTIFLOOD_UPDATES.set_function(
+        lambda: {(key,): value for key, value in antiflood.stats.items()}
+    )
+    global metrics_server
+    metrics_server = metrics.MetricsServer(
+        host=METRICS_LISTEN,
+        port=METRICS_PORT,
+        ready_check=lambda: is_ready(application)
+    )
+
+
+async def on_startup(application: Application):
+    if metrics_server:
+        await metrics_server.start()
+    if recorder:
+        recorder.start()
+
+
+async def on_shutdown(application: Application):
+    if metrics_server:
+        await metrics_server.stop()
+    if recorder:
+        recorder.stop()
+    if registration_queue:
+        await registration_queue.flush()
+    if leader:
+        # Резерв перехватит лидерство при следующей попытке, не дожидаясь истечения аренды
+        leader.release()
+
+
+def build_callback_router() -> CallbackRouter:
+    """Кнопки вне диалогов: префикс callback_data -> обработчик"""
+    router = CallbackRouter()
+
+    # Главное меню (обработчики сами не отвечают на callback_query)
+    router.add("menu", menu_command, answer=True)
+    router.add("events", show_events, answer=True)
+    router.add("myevents", my_events, answer=True)
+    router.add("help", help_command, answer=True)
+    router.add("adminevents", admin_events, answer=True)
+    # Повторное нажатие во время уже идущего диалога
+    router.add("createevent", create_event)
+    router.add("bulkevents", bulk_create_start)
+    router.add("export_history", export_history)
+
+    router.add(CB_EVENT, event_button, arity=1)
+    router.add(CB_EVENTS_NEXT, show_events, arity=1)
+    router.add(CB_EVENTS_PREV, show_events, arity=1)
+    router.add(CB_UNREG_CONFIRM, handle_unregistration, arity=1)
+    router.add(CB_UNREG_CANCEL, handle_unregistration)
+    router.add(CB_DETAIL, show_event_details, arity=1)
+    router.add(CB_CANCEL_REG, cancel_registration, arity=1)
+
+    router.add(CB_ADMIN_PAGE, admin_events)
+    router.add(CB_ADMIN_NEXT, admin_events, arity=1)
+    router.add(CB_ADMIN_PREV, admin_events, arity=1)
+    router.add(CB_VIEW, admin_actions, arity=1)
+    return router
+
+
+def build_application(token: str = TOKEN, base_url: str = None) -> Application:
+    global registration_queue, read_snapshot
+    if GROUP_COMMIT_ENABLED:
+        registration_queue = RegistrationQueue(
+            db, max_batch=GROUP_COMMIT_MAX_BATCH, max_delay=GROUP_COMMIT_DELAY_MS / 1000
+        )
+    if SNAPSHOT_ENABLED:
+        # Путь из конфига, а не db.database_name: приложение собирается и без открытой базы
+        read_snapshot = ReadSnapshot(DATABASE_NAME, path=SNAPSHOT_FILE, max_age=SNAPSHOT_MAX_AGE)
+
+    def pool(name, size, pool_timeout):
+        return network.make_pool(
+            name, size, http_version=NETWORK_HTTP_VERSION, keepalive_expiry=NETWORK_KEEPALIVE_EXPIRY,
+            pool_timeout=pool_timeout, **NETWORK_TIMEOUTS
+        )
+
+    builder = (
         Application.builder()
-        .token(TOKEN)
+        .token(token)
+        .request(network.SplitRequest(
+            pool("interactive", NETWORK_POOL_SIZE, NETWORK_POOL_TIMEOUT),
+            pool("bulk", NETWORK_BULK_POOL_SIZE, NETWORK_BULK_POOL_TIMEOUT)
+        ))
+        .get_updates_request(pool("updates", NETWORK_UPDATES_POOL_SIZE, NETWORK_POOL_TIMEOUT))
         .persistence(persistence)
-        .build()
+        .concurrent_updates(PerChatUpdateProcessor(CONCURRENT_UPDATES, tracer=TRACER, recorder=recorder))
+        .rate_limiter(metrics.InstrumentedRateLimiter())
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
     )
+    if base_url:
+        builder = builder.base_url(base_url)
+    application = builder.build()
+
+    if METRICS_ENABLED:
+        setup_metrics(application)
+
+    if leader is None:
+        application.job_queue.run_once(
+            callback=restore_reminders,
+            when=5,
+            name="init_restore"
+        )
+    else:
+        # Напоминания ставятся при получении лидерства и сверяются с базой на каждом продлении
+        application.job_queue.run_repeating(
+            callback=leader_tick,
+            interval=CLUSTER_RENEW_INTERVAL,
+            first=0,
+            name="leader_tick"
+        )
 
-    application.job_queue.run_once(
-        callback=restore_reminders,
-        when=5,
-        name="init_restore"
-    )
+    if read_snapshot is not None:
+        application.job_queue.run_repeating(
+            callback=refresh_snapshot,
+            interval=SNAPSHOT_REFRESH_INTERVAL,
+            first=10,
+            name="refresh_snapshot"
+        )
 
     application.add_error_handler(error_handler)
 
+    # Счетчик входящих обновлений (до антифлуда, чтобы видеть и отброшенные)
+    application.add_handler(TypeHandler(Update, metrics.count_update), group=-2)
+
+    # Антифлуд до всех остальных обработчиков
+    if ANTIFLOOD_ENABLED:
+        application.add_handler(antiflood.handler(), group=-1)
+
     # Регистрация обработчиков
     application.add_handler(CommandHandler("start", start))
     application.add_handler(CommandHandler("menu", menu_command))
     application.add_handler(CommandHandler("events", show_events))
     application.add_handler(CommandHandler("myevents", my_events))
     application.add_handler(CommandHandler("help", help_command))
+    application.add_handler(CommandHandler("search", search_events))
+    application.add_handler(InlineQueryHandler(inline_search))
 
     application.add_handler(CommandHandler("reset_persistence", reset_persistence))
+    application.add_handler(CommandHandler("floodstats", flood_stats))
+    application.add_handler(CommandHandler("dbstats", db_stats))
+    application.add_handler(CommandHandler("stats", attendance_stats_command))
 
     # Административные обработчики
     application.add_handler(CommandHandler("adminevents", admin_events))
@@ -1465,7 +2474,7 @@ def main():
     create_event_conv = ConversationHandler(
         entry_points=[
             CommandHandler("createevent", create_event),
-            CallbackQueryHandler(create_event, pattern="^createevent$")
+            CallbackQueryHandler(create_event, pattern=CallbackRouter.pattern("createevent"))
         ],
         states={
             CREATE_MAX: [MessageHandler(filters.TEXT & ~filters.COMMAND, create_max)],
@@ -1479,13 +2488,63 @@ def main():
     )
     application.add_handler(create_event_conv)
 
+    bulk_create_conv = ConversationHandler(
+        entry_points=[
+            CommandHandler("bulkevents", bulk_create_start),
+            CallbackQueryHandler(bulk_create_start, pattern=CallbackRouter.pattern("bulkevents"))
+        ],
+        states={
+            BULK_INPUT: [
+                MessageHandler((filters.TEXT & ~filters.COMMAND) | filters.Document.ALL, bulk_create_input)
+            ],
+            BULK_CONFIRM: [
+                CallbackQueryHandler(bulk_create_confirm, pattern=CallbackRouter.pattern(CB_BULK_CONFIRM)),
+                CallbackQueryHandler(bulk_create_confirm, pattern=CallbackRouter.pattern(CB_BULK_CANCEL))
+            ]
+        },
+        fallbacks=[CommandHandler("cancel", cancel)],
+        persistent=True,
+        name="bulk_create_conv"
+    )
+    application.add_handler(bulk_create_conv)
+
+    bulk_admin_conv = ConversationHandler(
+        entry_points=[
+            CallbackQueryHandler(bulk_select, pattern=CallbackRouter.pattern(CB_BULK_SELECT))
+        ],
+        states={
+            BULK_SELECT: [
+                CallbackQueryHandler(bulk_select, pattern=CallbackRouter.pattern(CB_BULK_TOGGLE, 1)),
+                CallbackQueryHandler(bulk_select, pattern=CallbackRouter.pattern(CB_BULK_TOGGLE_PAGE)),
+                CallbackQueryHandler(bulk_select, pattern=CallbackRouter.pattern(CB_BULK_SELECT_NEXT, 1)),
+                CallbackQueryHandler(bulk_select, pattern=CallbackRouter.pattern(CB_BULK_SELECT_PREV, 1)),
+                CallbackQueryHandler(bulk_select, pattern=CallbackRouter.pattern(CB_BULK_CLOSE)),
+                CallbackQueryHandler(bulk_action, pattern=CallbackRouter.pattern(CB_BULK_ACTION, 1))
+            ],
+            BULK_DELETE_CONFIRM: [
+                CallbackQueryHandler(bulk_delete_confirm, pattern=CallbackRouter.pattern(CB_BULK_DELETE_CONFIRM)),
+                CallbackQueryHandler(bulk_delete_confirm, pattern=CallbackRouter.pattern(CB_BULK_DELETE_CANCEL))
+            ],
+            BULK_SHIFT_VALUE: [MessageHandler(filters.TEXT & ~filters.COMMAND, bulk_shift_value)],
+            BULK_MAX_VALUE: [MessageHandler(filters.TEXT & ~filters.COMMAND, bulk_max_value)]
+        },
+        fallbacks=[
+            CommandHandler("cancel", cancel),
+            # Повторное открытие выбора из другого списка управления
+            CallbackQueryHandler(bulk_select, pattern=CallbackRouter.pattern(CB_BULK_SELECT))
+        ],
+        persistent=True,
+        name="bulk_admin_conv"
+    )
+    application.add_handler(bulk_admin_conv)
+
     edit_event_conv = ConversationHandler(
         entry_points=[
-            CallbackQueryHandler(edit_event_start, pattern=r"^edit_\d+$")
+            CallbackQueryHandler(edit_event_start, pattern=CallbackRouter.pattern(CB_EDIT, 1))
         ],
         states={
             EDIT_CHOICE: [
-                CallbackQueryHandler(edit_choice, pattern=r"^field_(max_participants|end_date|event_time|info)$")
+                CallbackQueryHandler(edit_choice, pattern=CallbackRouter.pattern(CB_EDIT_FIELD, 1))
             ],
             EDIT_VALUE: [
                 MessageHandler(filters.TEXT & ~filters.COMMAND, edit_value)
@@ -1493,7 +2552,7 @@ def main():
         },
         fallbacks=[
             CommandHandler("cancel", cancel_edit),
-            CallbackQueryHandler(cancel_edit, pattern="^cancel_edit$")
+            CallbackQueryHandler(cancel_edit, pattern=CallbackRouter.pattern(CB_EDIT_CANCEL))
         ],
         map_to_parent={  # Важно: возврат в родительский ConversationHandler
             ConversationHandler.END: ConversationHandler.END
@@ -1505,12 +2564,12 @@ def main():
 
     delete_event_conv = ConversationHandler(
         entry_points=[
-            CallbackQueryHandler(admin_actions, pattern=r"^delete_\d+$")
+            CallbackQueryHandler(admin_actions, pattern=CallbackRouter.pattern(CB_DELETE, 1))
         ],
         states={
             DELETE_CONFIRM: [
-                CallbackQueryHandler(confirm_delete, pattern="^confirm_delete$"),
-                CallbackQueryHandler(cancel_edit, pattern="^cancel_delete$")
+                CallbackQueryHandler(confirm_delete, pattern=CallbackRouter.pattern(CB_DELETE_CONFIRM)),
+                CallbackQueryHandler(cancel_edit, pattern=CallbackRouter.pattern(CB_DELETE_CANCEL))
             ]
         },
         fallbacks=[],
@@ -1522,10 +2581,7 @@ def main():
 
     send_message_conv = ConversationHandler(
         entry_points=[
-            CallbackQueryHandler(
-                send_message_to_participants,
-                pattern=r"^sendmsg_\d+$"  # Регулярное выражение для sendmsg_ + цифры
-            )
+            CallbackQueryHandler(send_message_to_participants, pattern=CallbackRouter.pattern(CB_SENDMSG, 1))
         ],
         states={
             WAITING_FOR_MESSAGE: [
@@ -1540,14 +2596,14 @@ def main():
 
     send_link_conv = ConversationHandler(
         entry_points=[
-            CallbackQueryHandler(send_link_to_participants, pattern=r"^sendlink_\d+$")
+            CallbackQueryHandler(send_link_to_participants, pattern=CallbackRouter.pattern(CB_SENDLINK, 1))
         ],
         states={
             WAITING_FOR_LINK: [MessageHandler(filters.TEXT & ~filters.COMMAND, process_link_input)],
-            CONFIRM_LINK: [CallbackQueryHandler(confirm_link_sending, pattern="^confirm_link$")]
+            CONFIRM_LINK: [CallbackQueryHandler(confirm_link_sending, pattern=CallbackRouter.pattern(CB_LINK_CONFIRM))]
         },
         fallbacks=[
-            CallbackQueryHandler(lambda u, c: cancel_link(u, c), pattern="^cancel_link$")
+            CallbackQueryHandler(cancel_link, pattern=CallbackRouter.pattern(CB_LINK_CANCEL))
         ],
         map_to_parent={ConversationHandler.END: ConversationHandler.END},
         persistent=True,
@@ -1557,30 +2613,36 @@ def main():
 
     remove_user_conv = ConversationHandler(
         entry_points=[
-            CallbackQueryHandler(remove_user_start, pattern=r"^removeuser_\d+$")
+            CallbackQueryHandler(remove_user_start, pattern=CallbackRouter.pattern(CB_REMOVE_USER_START, 1))
         ],
         states={
             REMOVE_USER_SELECT: [
-                CallbackQueryHandler(remove_user_finish, pattern=r"^remove_")
+                CallbackQueryHandler(remove_user_finish, pattern=CallbackRouter.pattern(CB_REMOVE_USER, 1))
             ],
         },
-        fallbacks = [CommandHandler("cancel", cancel)]
+        fallbacks = [CommandHandler("cancel", cancel)],
+        name="remove_user_conv"
     )
     application.add_handler(remove_user_conv)
 
     export_conv = ConversationHandler(
         entry_points=[
-            CallbackQueryHandler(start_export_flow, pattern="^export_history$")
+            CallbackQueryHandler(start_export_flow, pattern=CallbackRouter.pattern("export_history"))
         ],
         states={
             EXPORT_CHOICE: [
-                CallbackQueryHandler(handle_export_choice, pattern="^(all|custom)$")
+                CallbackQueryHandler(handle_export_choice, pattern=CallbackRouter.pattern(CB_EXPORT_ALL)),
+                CallbackQueryHandler(handle_export_choice, pattern=CallbackRouter.pattern(CB_EXPORT_CUSTOM)),
+                CallbackQueryHandler(handle_export_choice, pattern=CallbackRouter.pattern(CB_EXPORT_CHANGES))
             ],
             EXPORT_START_DATE: [
                 MessageHandler(filters.TEXT | filters.COMMAND, process_start_date)
             ],
             EXPORT_END_DATE: [
                 MessageHandler(filters.TEXT | filters.COMMAND, process_end_date)
+            ],
+            EXPORT_CURSOR: [
+                MessageHandler(filters.TEXT | filters.COMMAND, process_export_cursor)
             ]
         },
         fallbacks=[CommandHandler("cancel", cancel_export)],
@@ -1590,28 +2652,74 @@ def main():
     )
     application.add_handler(export_conv)
 
-    # Обработчики callback-запросов
-    application.add_handler(CallbackQueryHandler(handle_unregistration, pattern=r"^(confirm_unreg_\d+|cancel_unreg)$"))
-    application.add_handler(CallbackQueryHandler(event_button, pattern="^event_"))
-    application.add_handler(CallbackQueryHandler(edit_event_start, pattern="^edit_"))
-    application.add_handler(CallbackQueryHandler(show_event_details, pattern="^detail_"))
-    application.add_handler(CallbackQueryHandler(cancel_registration, pattern="^cancel_"))
+    # Все остальные callback-запросы - через таблицу префиксов
+    application.add_handler(build_callback_router().handler())
+
+    return application
+
+
+def create_election():
+    if CLUSTER_MODE == "lease":
+        return LeaseElection(DATABASE_NAME, instance_id=CLUSTER_INSTANCE_ID, ttl=CLUSTER_LEASE_TTL)
+    if CLUSTER_MODE == "lock":
+        return LockElection(CLUSTER_LOCK_FILE, instance_id=CLUSTER_INSTANCE_ID)
+    return None
+
+
+def wait_for_leadership():
+    """Резерв в режиме polling ждет лидерства до запуска опроса Telegram"""
+    if leader.try_acquire():
+        return
+    logger.info(f"{leader.instance_id} в резерве, лидер: {leader.holder()}")
+    while not leader.try_acquire():
+        time_module.sleep(CLUSTER_RENEW_INTERVAL)
+
+
+def webhook_secret_token():
+    """
+    Секрет для заголовка X-Telegram-Bot-Api-Secret-Token. Без него любой, кто знает
+    адрес webhook, может присылать боту поддельные обновления, поэтому без WEBHOOK_URL
+    и без секрета при нескольких экземплярах бот не запускается. Один экземпляр
+    генерирует секрет сам: Telegram получает его при каждом setWebhook
+    """
+    if not WEBHOOK_URL:
+        raise SystemExit("Режим webhook: не задан [Webhook] WEBHOOK_URL")
+    if WEBHOOK_SECRET_TOKEN:
+        return WEBHOOK_SECRET_TOKEN
+    if CLUSTER_MODE != "single":
+        # Каждый экземпляр зарегистрировал бы свой секрет и отклонял бы обновления для другого
+        raise SystemExit("Режим webhook с [Cluster] MODE: нужен общий [Webhook] SECRET_TOKEN")
+    logger.warning("[Webhook] SECRET_TOKEN не задан, сгенерирован случайный секрет на время работы")
+    return secrets.token_urlsafe(32)
 
-    application.add_handler(
-        CallbackQueryHandler(admin_actions, pattern=r"^delete_\d+$")
-    )
-    application.add_handler(
-        CallbackQueryHandler(admin_actions, pattern=r"^view_\d+$")
-    )
-    application.add_handler(CallbackQueryHandler(send_message_to_participants, pattern=r"^sendmsg_\d+$"))
-    application.add_handler(CallbackQueryHandler(menu_handler))
-    application.add_handler(CallbackQueryHandler(handle_back_button, pattern="^adminevents$"))
-    application.add_handler(
-        CallbackQueryHandler(export_history, pattern="^export_history$")
-    )
+
+def main():
+    global db, leader
+    if UPDATE_MODE == "webhook":
+        secret_token = webhook_secret_token()
+
+    db = open_database()
+    leader = create_election()
+    if leader is not None and UPDATE_MODE != "webhook":
+        wait_for_leadership()
+
+    application = build_application()
 
     # Запуск бота
-    application.run_polling()
+    if UPDATE_MODE == "webhook":
+        logger.info(f"Запуск в режиме webhook на {WEBHOOK_LISTEN}:{WEBHOOK_PORT}/{WEBHOOK_URL_PATH}")
+        application.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=WEBHOOK_URL_PATH,
+            webhook_url=WEBHOOK_URL,
+            secret_token=secret_token,
+            cert=WEBHOOK_CERT,
+            key=WEBHOOK_KEY,
+            allowed_updates=ALLOWED_UPDATES
+        )
+    else:
+        application.run_polling(allowed_updates=ALLOWED_UPDATES)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -1,4 +1,5 @@
 import io
+import json
 import sqlite3
 from datetime import datetime
 from openpyxl import Workbook
@@ -116,4 +117,46 @@ def generate_export_file(
     wb.save(buffer)
     buffer.seek(0)
 
-    return buffer
\ No newline at end of file
+    return buffer
+
+
+def generate_changes_export(
+        db_conn: sqlite3.Connection,
+        since_seq: int = 0
+) -> tuple[io.BytesIO, int]:
+    """
+    Инкрементальная выгрузка: только изменения из change_log с seq > since_seq
+    в формате NDJSON (одна JSON-запись на строку).
+    Возвращает буфер и новый курсор (seq последнего изменения).
+    """
+    buffer = io.BytesIO()
+    new_seq = since_seq
+
+    try:
+        rows = db_conn.execute('''
+            SELECT seq, entity, op, event_id, user_id, data, changed_at
+            FROM change_log
+            WHERE seq > ?
+            ORDER BY seq
+        ''', (since_seq,))
+
+        # Курсор читается построчно, без fetchall - объем зависит только от числа изменений
+        for seq, entity, op, event_id, user_id, data, changed_at in rows:
+            record = {
+                "seq": seq,
+                "entity": entity,
+                "op": op,
+                "event_id": event_id,
+                "user_id": user_id,
+                "data": json.loads(data) if data else None,
+                "changed_at": changed_at
+            }
+            buffer.write(json.dumps(record, ensure_ascii=False).encode("utf-8"))
+            buffer.write(b"\n")
+            new_seq = seq
+
+    except sqlite3.Error as e:
+        raise RuntimeError(f"Database error: {str(e)}")
+
+    buffer.seek(0)
+    return buffer, new_seq
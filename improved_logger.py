@@ -1,27 +1,141 @@
+import atexit
+import gzip
 import logging
 import os
-from logging.handlers import RotatingFileHandler
+import queue
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 from datetime import datetime
 
+LOG_DIR = "logs"
+
+# Сжатие и удаление старых файлов - в отдельном потоке, чтобы не задерживать запись логов
+_maintenance = ThreadPoolExecutor(max_workers=1, thread_name_prefix="log-maintenance")
+
+
 class TimestampedRotatingFileHandler(RotatingFileHandler):
-    def __init__(self, filename, maxBytes=5*1024*1024, backupCount=20):
-        os.makedirs("logs", exist_ok=True)
+    """
+    logs/<filename>.<время запуска>, при превышении maxBytes файл переименовывается
+    в .1, .2, ... и сжимается в .gz в фоне. Хранится не больше backupCount старых файлов
+    (всех запусков) и не больше max_total_bytes суммарно.
+    """
+
+    def __init__(self, filename, maxBytes=5*1024*1024, backupCount=20, max_total_bytes=None, compress=True):
+        os.makedirs(LOG_DIR, exist_ok=True)
+        self.prefix = f"{filename}."
+        self.max_total_bytes = max_total_bytes
+        self.compress = compress
+        self._rotations = 0
         timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        filename_with_timestamp = os.path.join("logs", f"{filename}.{timestamp}")
+        filename_with_timestamp = os.path.join(LOG_DIR, f"{filename}.{timestamp}")
         super().__init__(filename_with_timestamp, maxBytes=maxBytes, backupCount=backupCount)
-        
-        
+        # Файлы прошлых запусков тоже подпадают под ограничения
+        _maintenance.submit(self._clean_old_files)
+
     def doRollover(self):
         # вызывается при превышении maxBytes
-        super().doRollover()
+        if self.stream:
+            self.stream.close()
+            self.stream = None
+
+        self._rotations += 1
+        rotated = f"{self.baseFilename}.{self._rotations}"
+        if os.path.exists(self.baseFilename):
+            os.rename(self.baseFilename, rotated)
+            _maintenance.submit(self._compress_and_clean, rotated)
+
+        self.stream = self._open()
+
+    def _compress_and_clean(self, path):
+        if self.compress:
+            try:
+                with open(path, "rb") as source, gzip.open(f"{path}.gz", "wb") as target:
+                    shutil.copyfileobj(source, target)
+                os.remove(path)
+            except OSError as e:
+                logging.getLogger(__name__).warning(f"Не удалось сжать {path}: {str(e)}")
         self._clean_old_files()
 
     def _clean_old_files(self):
-        # удаление файлов превышающих backupCount
-        files = sorted(
-            [f for f in os.listdir() if f.startswith(self.baseFilename)],
-            key=lambda x: os.path.getctime(x)
-        )
-        while len(files) > self.backupCount:
-            oldest_file = files.pop(0)
-            os.remove(oldest_file)
\ No newline at end of file
+        # удаление файлов сверх backupCount и max_total_bytes, начиная со старых
+        directory = os.path.dirname(self.baseFilename)
+        files = []
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            if name.startswith(self.prefix) and path != self.baseFilename:
+                stat = os.stat(path)
+                files.append((stat.st_mtime, stat.st_size, path))
+        files.sort()
+
+        total = sum(size for _, size, _ in files)
+        while files and (
+            len(files) > self.backupCount
+            or (self.max_total_bytes is not None and total > self.max_total_bytes)
+        ):
+            _, size, oldest_file = files.pop(0)
+            try:
+                os.remove(oldest_file)
+                total -= size
+            except OSError:
+                pass
+
+
+class RateLimitFilter(logging.Filter):
+    """
+    Ограничивает INFO/DEBUG с одного места в коде (файл + строка): burst записей сразу,
+    дальше rate в секунду. Количество пропущенных дописывается к следующей записи.
+    WARNING и выше проходят всегда.
+    """
+
+    def __init__(self, rate=5.0, burst=20):
+        super().__init__()
+        self.rate = rate
+        self.burst = burst
+        # (pathname, lineno) -> [tokens, last_refill, suppressed]
+        self._sites = {}
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+
+        now = time.monotonic()
+        key = (record.pathname, record.lineno)
+        site = self._sites.get(key)
+        if site is None:
+            site = self._sites[key] = [self.burst, now, 0]
+        site[0] = min(self.burst, site[0] + (now - site[1]) * self.rate)
+        site[1] = now
+        if site[0] < 1:
+            site[2] += 1
+            return False
+
+        site[0] -= 1
+        if site[2]:
+            record.msg = f"{record.msg} (пропущено похожих: {site[2]})"
+            site[2] = 0
+        return True
+
+
+def start_queue_logging(logger, handlers, filters=(), level=None):
+    """
+    Вешает на logger QueueHandler: в вызывающем потоке (event loop) запись только
+    кладется в очередь, форматирование и файловый ввод-вывод - в потоке QueueListener.
+    filters применяются к QueueHandler, т.е. еще в вызывающем потоке (нужно для
+    значений из contextvars, например trace_id).
+    """
+    log_queue = queue.SimpleQueue()
+    queue_handler = QueueHandler(log_queue)
+    for log_filter in filters:
+        queue_handler.addFilter(log_filter)
+
+    logger.addHandler(queue_handler)
+    if level is not None:
+        logger.setLevel(level)
+
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    # Записи, оставшиеся в очереди, дописываются при выходе
+    atexit.register(listener.stop)
+    return listener
@@ -0,0 +1,126 @@
+import logging
+import os
+import socket
+import sqlite3
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def default_instance_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class LeaseElection:
+    """
+    Лидерство через аренду строки в таблице leader_lease общей базы.
+
+    try_acquire() захватывает или продлевает аренду одним UPSERT: строка
+    переходит к нам, только если она наша или срок прежнего держателя истек.
+    Если лидер умер, резерв становится лидером не позже чем через ttl + интервал
+    попыток. Лидер сам перестает считать себя лидером за margin секунд до
+    истечения аренды, если не смог ее продлить (например, event loop завис).
+    """
+
+    def __init__(self, path, name="scheduler", instance_id=None, ttl=15.0, margin=1.0):
+        self.name = name
+        self.instance_id = instance_id or default_instance_id()
+        self.ttl = ttl
+        self.margin = margin
+        self.held = False
+        self._valid_until = 0.0
+        # Свое соединение в autocommit: продление не смешивается с транзакциями Database
+        self.conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.conn.execute('''
+            CREATE TABLE IF NOT EXISTS leader_lease (
+                name TEXT PRIMARY KEY,
+                holder TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+        ''')
+
+    def try_acquire(self) -> bool:
+        started = time.monotonic()
+        now = time.time()
+        try:
+            cursor = self.conn.execute('''
+                INSERT INTO leader_lease (name, holder, expires_at) VALUES (?, ?, ?)
+                ON CONFLICT(name) DO UPDATE SET holder = excluded.holder, expires_at = excluded.expires_at
+                WHERE leader_lease.holder = excluded.holder OR leader_lease.expires_at < ?
+            ''', (self.name, self.instance_id, now + self.ttl, now))
+            self.held = cursor.rowcount == 1
+        except sqlite3.Error as e:
+            # База занята или недоступна: аренду не продлили, лидерство истечет само
+            logger.warning(f"Не удалось продлить аренду {self.name}: {str(e)}")
+            self.held = self.is_leader
+            return self.held
+        if self.held:
+            self._valid_until = started + self.ttl - self.margin
+        return self.held
+
+    @property
+    def is_leader(self) -> bool:
+        return self.held and time.monotonic() < self._valid_until
+
+    def holder(self):
+        row = self.conn.execute(
+            "SELECT holder, expires_at FROM leader_lease WHERE name = ?", (self.name,)
+        ).fetchone()
+        return row if row and row[1] > time.time() else None
+
+    def release(self):
+        if self.held:
+            self.conn.execute(
+                "DELETE FROM leader_lease WHERE name = ? AND holder = ?", (self.name, self.instance_id)
+            )
+        self.held = False
+        self._valid_until = 0.0
+
+
+class LockElection:
+    """
+    Лидерство через flock на файле - для нескольких экземпляров на одном хосте
+    (или с общим томом, где flock работает). Блокировку снимает ядро при смерти
+    процесса, поэтому резерв перехватывает ее при следующей попытке.
+    """
+
+    def __init__(self, path, instance_id=None):
+        self.path = path
+        self.instance_id = instance_id or default_instance_id()
+        self.held = False
+        self._file = None
+
+    def try_acquire(self) -> bool:
+        if self._file is not None:
+            return True
+        import fcntl
+        file = open(self.path, "a+")
+        try:
+            fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            file.close()
+            return False
+        file.seek(0)
+        file.truncate()
+        file.write(self.instance_id)
+        file.flush()
+        self._file = file
+        self.held = True
+        return True
+
+    @property
+    def is_leader(self) -> bool:
+        return self._file is not None
+
+    def holder(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                return f.read().strip() or None, None
+        except FileNotFoundError:
+            return None
+
+    def release(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        self.held = False
@@ -0,0 +1,314 @@
+import asyncio
+import contextvars
+import functools
+import logging
+import time
+from contextlib import contextmanager
+
+from telegram.error import Forbidden, RetryAfter, TelegramError
+from telegram.ext import BaseRateLimiter
+
+import tracing
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} counter"
+        for key, value in sorted(self._values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+
+
+class Gauge:
+    """Значение задается через set() или вычисляется при выдаче через set_function()"""
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._function = None
+
+    def set(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        self._values[key] = value
+
+    def set_function(self, function):
+        """function() -> число, либо dict {кортеж значений меток: число}"""
+        self._function = function
+
+    def collect(self):
+        values = self._values
+        if self._function is not None:
+            try:
+                result = self._function()
+                values = result if isinstance(result, dict) else {(): result}
+            except Exception as e:
+                logger.debug(f"Ошибка вычисления метрики {self.name}: {str(e)}")
+                values = {}
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} gauge"
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+
+
+class Histogram:
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # key -> [счетчики по бакетам, сумма, количество]
+        self._values = {}
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        state = self._values.get(key)
+        if state is None:
+            state = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                state[0][index] += 1
+                break
+        state[1] += value
+        state[2] += 1
+
+    def collect(self):
+        yield f"# HELP {self.name} {self.documentation}"
+        yield f"# TYPE {self.name} histogram"
+        for key, (counts, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', bound)])} {cumulative}"
+            yield f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', '+Inf')])} {count}"
+            yield f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}"
+            yield f"{self.name}_count{_format_labels(self.labelnames, key)} {count}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.collect())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+HANDLER_LATENCY = REGISTRY.register(Histogram(
+    "bot_handler_latency_seconds", "Время выполнения обработчика", ("handler",)))
+HANDLER_ERRORS = REGISTRY.register(Counter(
+    "bot_handler_errors_total", "Необработанные исключения в обработчиках", ("handler",)))
+UPDATES_TOTAL = REGISTRY.register(Counter(
+    "bot_updates_total", "Полученные обновления", ("type",)))
+DB_QUERY_SECONDS = REGISTRY.register(Histogram(
+    "bot_db_query_seconds", "Время выполнения методов Database", ("method",),
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)))
+API_REQUESTS = REGISTRY.register(Counter(
+    "bot_api_requests_total", "Запросы к Bot API по результату (ok/retry_after/forbidden/error)",
+    ("endpoint", "result")))
+API_LATENCY = REGISTRY.register(Histogram(
+    "bot_api_latency_seconds", "Время запросов к Bot API", ("endpoint",)))
+JOB_QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "bot_job_queue_depth", "Задачи в JobQueue"))
+PENDING_REMINDERS = REGISTRY.register(Gauge(
+    "bot_pending_reminders", "Запланированные напоминания"))
+ANTIFLOOD_UPDATES = REGISTRY.register(Gauge(
+    "bot_antiflood_updates", "Обновления, пропущенные и отброшенные антифлудом", ("result",)))
+SCHEDULER_LEADER = REGISTRY.register(Gauge(
+    "bot_scheduler_leader", "1, если этот экземпляр - лидер и запускает напоминания"))
+REGISTRATION_BATCH_SIZE = REGISTRY.register(Histogram(
+    "bot_registration_batch_size", "Запросов записи/отмены в одном групповом коммите",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500)))
+EVENT_LOOP_LAG = REGISTRY.register(Gauge(
+    "bot_event_loop_lag_seconds", "Последнее измеренное запаздывание event loop"))
+EVENT_LOOP_LAG_HISTOGRAM = REGISTRY.register(Histogram(
+    "bot_event_loop_lag_histogram_seconds", "Запаздывание event loop",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)))
+HTTP_POOL_SIZE = REGISTRY.register(Gauge(
+    "bot_http_pool_size", "Соединений в пуле запросов к Bot API", ("pool",)))
+HTTP_REQUESTS_IN_FLIGHT = REGISTRY.register(Gauge(
+    "bot_http_requests_in_flight", "Запросы к Bot API, выполняющиеся сейчас", ("pool",)))
+HTTP_POOL_SATURATED = REGISTRY.register(Counter(
+    "bot_http_pool_saturated_total", "Запросы, пришедшие при занятых всех соединениях пула", ("pool",)))
+HTTP_POOL_TIMEOUTS = REGISTRY.register(Counter(
+    "bot_http_pool_timeouts_total", "Запросы, не дождавшиеся свободного соединения (pool timeout)", ("pool",)))
+SNAPSHOT_REFRESH_SECONDS = REGISTRY.register(Histogram(
+    "bot_snapshot_refresh_seconds", "Время копирования базы в снимок для выгрузок",
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)))
+
+_current_handler = contextvars.ContextVar("current_handler", default=None)
+
+
+@contextmanager
+def handler_timer(name):
+    """Замер обработчика. Вложенные вызовы (menu -> show_events) учитываются во внешнем"""
+    if _current_handler.get() is not None:
+        yield
+        return
+    token = _current_handler.set(name)
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        HANDLER_ERRORS.inc(handler=name)
+        raise
+    finally:
+        HANDLER_LATENCY.observe(time.perf_counter() - start, handler=name)
+        _current_handler.reset(token)
+
+
+def observe_db(func):
+    """Декоратор для методов Database"""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            DB_QUERY_SECONDS.observe(time.perf_counter() - start, method=func.__name__)
+    return wrapper
+
+
+async def count_update(update, context):
+    """TypeHandler в самой ранней группе: считает входящие обновления по типу"""
+    UPDATES_TOTAL.inc(type=tracing.update_type(update))
+
+
+class InstrumentedRateLimiter(BaseRateLimiter):
+    """
+    Ограничений не накладывает: через process_request PTB пропускает каждый
+    вызов Bot API (кроме getUpdates), здесь считаем результаты и время.
+    """
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def process_request(self, callback, args, kwargs, endpoint, data, rate_limit_args):
+        start = time.perf_counter()
+        result = "ok"
+        try:
+            return await callback(*args, **kwargs)
+        except RetryAfter:
+            result = "retry_after"
+            raise
+        except Forbidden:
+            result = "forbidden"
+            raise
+        except TelegramError:
+            result = "error"
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            API_LATENCY.observe(elapsed, endpoint=endpoint)
+            API_REQUESTS.inc(endpoint=endpoint, result=result)
+            tracing.record_api(endpoint, elapsed)
+
+
+async def monitor_event_loop_lag(interval=0.5):
+    while True:
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag = max(0.0, time.perf_counter() - start - interval)
+        EVENT_LOOP_LAG.set(lag)
+        EVENT_LOOP_LAG_HISTOGRAM.observe(lag)
+
+
+class MetricsServer:
+    """
+    Минимальный HTTP-сервер на asyncio:
+    /metrics - метрики в текстовом формате Prometheus,
+    /healthz - liveness (event loop отвечает),
+    /readyz - readiness (ready_check() вернул True).
+    """
+
+    def __init__(self, host="0.0.0.0", port=9100, ready_check=None):
+        self.host = host
+        self.port = port
+        self.ready_check = ready_check or (lambda: True)
+        self._server = None
+        self._lag_task = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self._lag_task = asyncio.create_task(monitor_event_loop_lag())
+        logger.info(f"Метрики доступны на http://{self.host}:{self.port}/metrics")
+
+    async def stop(self):
+        if self._lag_task:
+            self._lag_task.cancel()
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        try:
+            request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+            # Заголовки не нужны, но их надо дочитать
+            while (await asyncio.wait_for(reader.readline(), timeout=5)) not in (b"\r\n", b"\n", b""):
+                pass
+
+            parts = request_line.decode("latin-1").split()
+            path = parts[1].split("?")[0] if len(parts) > 1 else "/"
+
+            if path == "/metrics":
+                status, body = "200 OK", REGISTRY.render()
+                content_type = "text/plain; version=0.0.4; charset=utf-8"
+            elif path == "/healthz":
+                status, body, content_type = "200 OK", "ok\n", "text/plain"
+            elif path == "/readyz":
+                try:
+                    ready = self.ready_check()
+                except Exception:
+                    ready = False
+                status = "200 OK" if ready else "503 Service Unavailable"
+                body, content_type = ("ready\n" if ready else "not ready\n"), "text/plain"
+            else:
+                status, body, content_type = "404 Not Found", "not found\n", "text/plain"
+
+            payload = body.encode("utf-8")
+            writer.write(
+                f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+                f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode("latin-1") + payload
+            )
+            await writer.drain()
+        except Exception as e:
+            logger.debug(f"Ошибка обработки запроса метрик: {str(e)}")
+        finally:
+            writer.close()
@@ -0,0 +1,63 @@
+from dataclasses import dataclass
+from datetime import datetime
+
+
+def parse_timestamp(value):
+    """'ГГГГ-ММ-ДД ЧЧ:ММ:СС' из SQLite (starts_at, CURRENT_TIMESTAMP) -> datetime или None"""
+    return datetime.fromisoformat(value) if value else None
+
+
+@dataclass(frozen=True, slots=True)
+class Event:
+    id: int
+    max_participants: int
+    end_date: str  # ГГГГ-ММ-ДД, как в таблице events
+    event_time: str  # ЧЧ:ММ
+    info: str
+    starts_at: datetime
+    current_participants: int = 0
+
+    @property
+    def available(self) -> int:
+        return self.max_participants - self.current_participants
+
+    @property
+    def date_text(self) -> str:
+        """ДД.ММ.ГГГГ для сообщений"""
+        return self.starts_at.strftime("%d.%m.%Y")
+
+    @property
+    def day_month(self) -> str:
+        return self.starts_at.strftime("%d.%m")
+
+
+@dataclass(frozen=True, slots=True)
+class Registration:
+    user_id: int
+    event_id: int
+    username: str
+    registered_at: datetime
+
+
+@dataclass(frozen=True, slots=True)
+class User:
+    user_id: int
+    username: str
+
+
+# Фабрики строк для cursor.row_factory: модель строится сразу из кортежа sqlite3,
+# даты разбираются один раз здесь, а не strptime в каждом обработчике
+
+def event_row(cursor, row):
+    """(id, max_participants, end_date, event_time, info, starts_at[, current_participants])"""
+    return Event(row[0], row[1], row[2], row[3], row[4], parse_timestamp(row[5]), *row[6:])
+
+
+def registration_row(cursor, row):
+    """(user_id, event_id, username, registered_at)"""
+    return Registration(row[0], row[1], row[2], parse_timestamp(row[3]))
+
+
+def user_row(cursor, row):
+    """(user_id, username)"""
+    return User(row[0], row[1])
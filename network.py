@@ -0,0 +1,98 @@
+import contextvars
+import logging
+from contextlib import contextmanager
+
+import httpx
+from telegram.error import TimedOut
+from telegram.request import BaseRequest, HTTPXRequest
+
+from metrics import HTTP_POOL_SATURATED, HTTP_POOL_SIZE, HTTP_POOL_TIMEOUTS, HTTP_REQUESTS_IN_FLIGHT
+
+logger = logging.getLogger(__name__)
+
+_bulk_traffic = contextvars.ContextVar("bulk_traffic", default=False)
+
+
+@contextmanager
+def bulk_traffic():
+    """Вызовы Bot API внутри блока (рассылки участникам) идут через пул рассылок"""
+    token = _bulk_traffic.set(True)
+    try:
+        yield
+    finally:
+        _bulk_traffic.reset(token)
+
+
+class PoolRequest(HTTPXRequest):
+    """
+    HTTPXRequest со своим пулом соединений и метриками его занятости.
+
+    Запрос, пришедший при занятых size соединениях, ждет в httpx до pool_timeout
+    секунд (bot_http_pool_saturated_total), не дождавшийся - TimedOut
+    (bot_http_pool_timeouts_total). Для HTTP/2 size - число соединений, запросы
+    в одном соединении мультиплексируются, поэтому насыщение - ориентир, а не предел.
+    """
+
+    def __init__(self, pool, size, keepalive_expiry=5.0, **kwargs):
+        limits = httpx.Limits(
+            max_connections=size, max_keepalive_connections=size, keepalive_expiry=keepalive_expiry
+        )
+        super().__init__(connection_pool_size=size, httpx_kwargs={"limits": limits}, **kwargs)
+        self.pool = pool
+        self.size = size
+        self.in_flight = 0
+        HTTP_POOL_SIZE.set(size, pool=pool)
+
+    async def do_request(self, *args, **kwargs):
+        if self.in_flight >= self.size:
+            HTTP_POOL_SATURATED.inc(pool=self.pool)
+        self.in_flight += 1
+        HTTP_REQUESTS_IN_FLIGHT.set(self.in_flight, pool=self.pool)
+        try:
+            return await super().do_request(*args, **kwargs)
+        except TimedOut as e:
+            if isinstance(e.__cause__, httpx.PoolTimeout):
+                HTTP_POOL_TIMEOUTS.inc(pool=self.pool)
+            raise
+        finally:
+            self.in_flight -= 1
+            HTTP_REQUESTS_IN_FLIGHT.set(self.in_flight, pool=self.pool)
+
+
+class SplitRequest(BaseRequest):
+    """
+    Запросы бота (кроме getUpdates) через два пула: ответы обработчиков - interactive,
+    рассылки внутри bulk_traffic() - bulk. Рассылка на сотни участников занимает только
+    соединения bulk, и ответы на нажатия не ждут свободного соединения за ней
+    """
+
+    def __init__(self, interactive, bulk):
+        self.interactive = interactive
+        self.bulk = bulk
+
+    @property
+    def read_timeout(self):
+        return self.interactive.read_timeout
+
+    async def initialize(self):
+        await self.interactive.initialize()
+        await self.bulk.initialize()
+
+    async def shutdown(self):
+        await self.interactive.shutdown()
+        await self.bulk.shutdown()
+
+    async def do_request(self, *args, **kwargs):
+        request = self.bulk if _bulk_traffic.get() else self.interactive
+        return await request.do_request(*args, **kwargs)
+
+
+def make_pool(pool, size, http_version="1.1", **kwargs):
+    """PoolRequest; HTTP/2 без пакета h2 - предупреждение и HTTP/1.1"""
+    try:
+        return PoolRequest(pool, size, http_version=http_version, **kwargs)
+    except RuntimeError as e:
+        if http_version == "1.1":
+            raise
+        logger.warning(f"HTTP/{http_version} недоступен для пула {pool}, используется HTTP/1.1: {str(e)}")
+        return PoolRequest(pool, size, http_version="1.1", **kwargs)
@@ -1,15 +1,51 @@
+import argparse
+import json
+import re
 import sqlite3
+import sys
 from datetime import datetime
 
+from read_snapshot import ReadSnapshot
+
 DATABASE_NAME = "events.db"
 
+# Сколько мс ждать блокировку, если бот в этот момент пишет в базу
+BUSY_TIMEOUT_MS = 5000
+
+# Допустимый возраст снимка для list --snapshot, сек
+SNAPSHOT_MAX_AGE = 600
+
+
+def connect(db_path=None, readonly=True):
+    db_path = db_path or DATABASE_NAME
+    if readonly:
+        # mode=ro: утилита не может случайно что-то изменить и не берет write-lock
+        conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, timeout=BUSY_TIMEOUT_MS / 1000)
+    else:
+        # Транзакциями управляем вручную (BEGIN IMMEDIATE на каждую пачку)
+        conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_MS / 1000, isolation_level=None)
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    return conn
+
 
-def get_events(show_all=False, hours=6):
-    conn = sqlite3.connect(DATABASE_NAME)
+def parse_age(value):
+    """'30d', '12h' или просто число дней -> количество часов"""
+    match = re.fullmatch(r"\s*(\d+)\s*([dh]?)\s*", value or "")
+    if not match:
+        raise argparse.ArgumentTypeError(f"Некорректный возраст: {value} (пример: 30d, 12h)")
+    amount, unit = int(match.group(1)), match.group(2) or "d"
+    return amount * 24 if unit == "d" else amount
+
+
+def get_events(show_all=False, hours=6, conn=None, search=None, date_from=None, date_to=None,
+               limit=None, offset=0):
+    own_conn = conn is None
+    if own_conn:
+        conn = connect()
     cursor = conn.cursor()
 
     query = '''
-        SELECT 
+        SELECT
             e.id,
             e.max_participants,
             e.end_date,
@@ -21,21 +57,41 @@ def get_events(show_all=False, hours=6):
         LEFT JOIN registrations r ON e.id = r.event_id
     '''
 
-    params = ()
+    where_clauses = []
+    params = []
     if not show_all:
-        query += " WHERE datetime(e.end_date || ' ' || e.event_time) <= datetime('now', ?)"
-        params = (f"-{hours} hours",)
+        where_clauses.append("datetime(e.end_date || ' ' || e.event_time) <= datetime('now', 'localtime', ?)")
+        params.append(f"-{hours} hours")
+    if search:
+        where_clauses.append("e.info LIKE ?")
+        params.append(f"%{search}%")
+    if date_from:
+        where_clauses.append("e.end_date >= ?")
+        params.append(date_from)
+    if date_to:
+        where_clauses.append("e.end_date <= ?")
+        params.append(date_to)
+
+    if where_clauses:
+        query += " WHERE " + " AND ".join(where_clauses)
 
     query += " GROUP BY e.id ORDER BY event_datetime DESC"
+    if limit is not None:
+        query += " LIMIT ? OFFSET ?"
+        params.extend([limit, offset])
 
-    cursor.execute(query, params)
-    events = cursor.fetchall()
-    conn.close()
-    return events
+    try:
+        cursor.execute(query, tuple(params))
+        return cursor.fetchall()
+    finally:
+        if own_conn:
+            conn.close()
 
 
-def delete_event(event_id):
-    conn = sqlite3.connect(DATABASE_NAME)
+def delete_event(event_id, conn=None):
+    own_conn = conn is None
+    if own_conn:
+        conn = connect(readonly=False)
     cursor = conn.cursor()
 
     try:
@@ -45,15 +101,152 @@ def delete_event(event_id):
             print(f"⚠️ Мероприятие {event_id} не найдено!")
             return
 
-        cursor.execute("DELETE FROM events WHERE id = ?", (event_id,))
+        cursor.execute("BEGIN IMMEDIATE")
         cursor.execute("DELETE FROM registrations WHERE event_id = ?", (event_id,))
-        conn.commit()
+        cursor.execute("DELETE FROM events WHERE id = ?", (event_id,))
+        cursor.execute("COMMIT")
         print(f"✅ Мероприятие {event_id} и связанные записи удалены!")
     except Exception as e:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
         print(f"❌ Ошибка удаления: {str(e)}")
+    finally:
+        if own_conn:
+            conn.close()
+
+
+def purge_events(conn, older_than_hours, chunk_size=500, dry_run=False, progress=print):
+    """
+    Удаляет мероприятия старше older_than_hours вместе с регистрациями.
+    Каждая пачка из chunk_size мероприятий - отдельная короткая транзакция,
+    чтобы не держать write-lock и не блокировать работающего бота.
+    """
+    event_ids = [row[0] for row in conn.execute('''
+        SELECT id FROM events
+        WHERE datetime(end_date || ' ' || event_time) <= datetime('now', 'localtime', ?)
+        ORDER BY id
+    ''', (f"-{older_than_hours} hours",))]
+
+    total = len(event_ids)
+    if dry_run or not total:
+        registrations = 0
+        for start in range(0, total, chunk_size):
+            chunk = event_ids[start:start + chunk_size]
+            placeholders = ",".join("?" * len(chunk))
+            registrations += conn.execute(
+                f"SELECT COUNT(*) FROM registrations WHERE event_id IN ({placeholders})", chunk
+            ).fetchone()[0]
+        progress(f"🔎 Будет удалено мероприятий: {total}, регистраций: {registrations}")
+        return total, registrations
+
+    deleted_events, deleted_registrations = 0, 0
+    for start in range(0, total, chunk_size):
+        chunk = event_ids[start:start + chunk_size]
+        placeholders = ",".join("?" * len(chunk))
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            deleted_registrations += conn.execute(
+                f"DELETE FROM registrations WHERE event_id IN ({placeholders})", chunk
+            ).rowcount
+            deleted_events += conn.execute(
+                f"DELETE FROM events WHERE id IN ({placeholders})", chunk
+            ).rowcount
+            conn.execute("COMMIT")
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        progress(f"🗑 {deleted_events}/{total} мероприятий удалено (регистраций: {deleted_registrations})")
+
+    return deleted_events, deleted_registrations
+
+
+def event_to_dict(event):
+    return {
+        "id": event[0],
+        "max_participants": event[1],
+        "end_date": event[2],
+        "event_time": event[3],
+        "info": event[4],
+        "participants": event[5],
+        "event_datetime": event[6]
+    }
+
+
+def cmd_list(args):
+    if args.snapshot is not None:
+        # Снимок бота (read_snapshot) вместо основной базы; устаревший обновляется
+        snapshot = ReadSnapshot(args.db or DATABASE_NAME, max_age=args.snapshot, factory=sqlite3.Connection)
+        conn, taken_at = snapshot.reader()
+        print(f"Снимок базы на {taken_at.strftime('%d.%m.%Y %H:%M:%S')}", file=sys.stderr)
+    else:
+        conn = connect(args.db)
+    try:
+        show_all = args.older_than is None
+        events = get_events(
+            show_all=show_all,
+            hours=args.older_than or 0,
+            conn=conn,
+            search=args.search,
+            date_from=args.date_from,
+            date_to=args.date_to,
+            limit=args.limit,
+            offset=(args.page - 1) * args.limit
+        )
     finally:
         conn.close()
 
+    if args.json:
+        json.dump([event_to_dict(e) for e in events], sys.stdout, ensure_ascii=False, indent=2)
+        print()
+    else:
+        print_events(events, f"Мероприятия (страница {args.page}):")
+
+
+def cmd_purge(args):
+    conn = connect(args.db, readonly=args.dry_run)
+    try:
+        deleted_events, deleted_registrations = purge_events(
+            conn,
+            older_than_hours=args.older_than,
+            chunk_size=args.chunk_size,
+            dry_run=args.dry_run,
+            progress=(lambda msg: None) if args.quiet else print
+        )
+    finally:
+        conn.close()
+
+    if not args.dry_run:
+        print(f"✅ Удалено мероприятий: {deleted_events}, регистраций: {deleted_registrations}")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Управление прошедшими мероприятиями")
+    parser.add_argument("--db", help="Путь к базе (по умолчанию events.db)")
+    subparsers = parser.add_subparsers(dest="command")
+
+    list_parser = subparsers.add_parser("list", help="Показать мероприятия")
+    list_parser.add_argument("--older-than", type=parse_age, help="Только старше (30d, 12h)")
+    list_parser.add_argument("--search", help="Подстрока в описании")
+    list_parser.add_argument("--from", dest="date_from", help="Дата с (ГГГГ-ММ-ДД)")
+    list_parser.add_argument("--to", dest="date_to", help="Дата по (ГГГГ-ММ-ДД)")
+    list_parser.add_argument("--limit", type=int, default=50, help="Размер страницы")
+    list_parser.add_argument("--page", type=int, default=1, help="Номер страницы (с 1)")
+    list_parser.add_argument("--json", action="store_true", help="Вывод в JSON")
+    list_parser.add_argument("--snapshot", type=float, nargs="?", const=SNAPSHOT_MAX_AGE, metavar="СЕК",
+                             help=f"Читать снимок базы не старше СЕК (по умолчанию {SNAPSHOT_MAX_AGE:.0f})")
+    list_parser.set_defaults(func=cmd_list)
+
+    purge_parser = subparsers.add_parser("purge", help="Удалить старые мероприятия пачками")
+    purge_parser.add_argument("--older-than", type=parse_age, required=True, help="Возраст (30d, 12h)")
+    purge_parser.add_argument("--chunk-size", type=int, default=500, help="Мероприятий в одной транзакции")
+    purge_parser.add_argument("--dry-run", action="store_true", help="Только посчитать, ничего не удалять")
+    purge_parser.add_argument("--quiet", action="store_true", help="Без вывода прогресса")
+    purge_parser.set_defaults(func=cmd_purge)
+
+    subparsers.add_parser("menu", help="Интерактивное меню")
+    return parser
+
 
 def main():
     while True:
@@ -102,4 +295,10 @@ def print_events(events, header):
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    args = build_parser().parse_args()
+    if args.db:
+        DATABASE_NAME = args.db
+    if args.command in (None, "menu"):
+        main()
+    else:
+        args.func(args)
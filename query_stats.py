@@ -0,0 +1,202 @@
+import logging
+import re
+import sqlite3
+import threading
+import time
+
+import tracing
+
+# Отдельный логгер: обработчик с файлом slow_queries.log настраивается в event_bot_main
+slow_logger = logging.getLogger("slow_queries")
+
+
+# План выполнения имеет смысл только для запросов к данным, не для DDL и PRAGMA
+EXPLAINABLE = ("SELECT", "WITH", "INSERT", "UPDATE", "DELETE", "REPLACE")
+
+
+def normalize_sql(sql):
+    return re.sub(r"\s+", " ", sql).strip()
+
+
+class QueryStats:
+    """
+    Статистика по SQL-запросам: количество, суммарное и максимальное время.
+    Запросы дольше threshold_ms пишутся в slow_logger вместе с EXPLAIN QUERY PLAN
+    (план - один раз на запрос, дальше только время).
+    Экспорты выполняются в отдельных потоках, поэтому доступ под блокировкой.
+    """
+
+    def __init__(self, threshold_ms=50.0):
+        self.threshold_ms = threshold_ms
+        self._lock = threading.Lock()
+        # sql -> [count, total_seconds, max_seconds]
+        self._stats = {}
+        self._explained = set()
+
+    def record(self, sql, elapsed, count=1):
+        with self._lock:
+            entry = self._stats.get(sql)
+            if entry is None:
+                entry = self._stats[sql] = [0, 0.0, 0.0]
+            entry[0] += count
+            entry[1] += elapsed
+            return entry
+
+    def update_max(self, sql, elapsed):
+        with self._lock:
+            entry = self._stats.get(sql)
+            if entry is not None and elapsed > entry[2]:
+                entry[2] = elapsed
+
+    def is_slow(self, elapsed):
+        return self.threshold_ms is not None and elapsed * 1000 >= self.threshold_ms
+
+    def log_slow(self, conn, key, raw_sql, params, elapsed):
+        """key - нормализованный текст запроса, raw_sql - исходный (с комментариями) для EXPLAIN"""
+        with self._lock:
+            explain = key not in self._explained and key.upper().startswith(EXPLAINABLE)
+            self._explained.add(key)
+
+        message = f"{elapsed * 1000:.1f} ms [{tracing.current_trace_id() or '-'}]: {key} params={params!r}"
+        if explain:
+            message += "\n" + self.explain(conn, raw_sql, params)
+        slow_logger.warning(message)
+
+    @staticmethod
+    def explain(conn, sql, params):
+        try:
+            # Обычный курсор, чтобы EXPLAIN не попал в статистику
+            cursor = sqlite3.Connection.cursor(conn)
+            rows = cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params or ()).fetchall()
+            return "\n".join(f"  {row[-1]}" for row in rows) or "  (план пуст)"
+        except sqlite3.Error as e:
+            return f"  EXPLAIN QUERY PLAN не выполнен: {str(e)}"
+
+    def top(self, limit=10, order_by="total"):
+        """[(sql, count, total_seconds, max_seconds)] по убыванию order_by (total | max | count)"""
+        index = {"count": 1, "total": 2, "max": 3}[order_by]
+        with self._lock:
+            rows = [(sql, *entry) for sql, entry in self._stats.items()]
+        return sorted(rows, key=lambda row: row[index], reverse=True)[:limit]
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._explained.clear()
+
+
+QUERY_STATS = QueryStats()
+
+
+_next_row = sqlite3.Cursor.__next__
+
+
+class TimedCursor(sqlite3.Cursor):
+    """
+    Курсор с замером execute/executemany. Время выборки строк (fetchall, fetchmany,
+    обход курсора в цикле) добавляется к тому же запросу: SQLite выполняет SELECT по
+    мере выборки, и execute измеряет только первый шаг. Запрос учитывается в максимуме
+    и журнале медленных, когда строки кончились, на fetchall/fetchone, при close()
+    или следующем execute - что раньше.
+    """
+
+    stats = QUERY_STATS
+    # [sql, исходный sql, параметры для EXPLAIN, время execute, время выборки] или None
+    _last = None
+
+    def _timed(self, method, sql, params, count, explain_params):
+        if self._last is not None:
+            self._finish()
+        key = normalize_sql(sql)
+        start = time.perf_counter()
+        try:
+            return method(sql, params)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stats.record(key, elapsed, count)
+            tracing.record_db(elapsed)
+            self._last = [key, sql, explain_params, elapsed, 0.0]
+            if not key.upper().startswith(("SELECT", "WITH")):
+                self._finish()
+
+    def _finish(self):
+        key, sql, params, executed, fetched = self._last
+        self._last = None
+        if fetched:
+            self.stats.record(key, fetched, count=0)
+            tracing.record_db(fetched, calls=0)
+        elapsed = executed + fetched
+        self.stats.update_max(key, elapsed)
+        if self.stats.is_slow(elapsed):
+            self.stats.log_slow(self.connection, key, sql, params, elapsed)
+
+    def _fetch(self, method, *args):
+        last = self._last
+        if last is None:
+            return method(*args)
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            last[4] += time.perf_counter() - start
+
+    def execute(self, sql, params=()):
+        return self._timed(super().execute, sql, params, 1, params)
+
+    def executemany(self, sql, seq_of_params):
+        seq_of_params = list(seq_of_params)
+        # Для пачки параметров EXPLAIN строим по первому набору
+        first = seq_of_params[0] if seq_of_params else ()
+        return self._timed(super().executemany, sql, seq_of_params, len(seq_of_params), first)
+
+    def fetchall(self):
+        rows = self._fetch(super().fetchall)
+        if self._last is not None:
+            self._finish()
+        return rows
+
+    def fetchone(self):
+        row = self._fetch(super().fetchone)
+        if self._last is not None:
+            # Для fetchone (SELECT COUNT, одна запись) остальные строки не нужны
+            self._finish()
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._fetch(super().fetchmany, self.arraysize if size is None else size)
+        if not rows and self._last is not None:
+            self._finish()
+        return rows
+
+    def __next__(self):
+        # Вызывается на каждую строку - без промежуточных вызовов
+        last = self._last
+        if last is None:
+            return _next_row(self)
+        start = time.perf_counter()
+        try:
+            row = _next_row(self)
+        except StopIteration:
+            last[4] += time.perf_counter() - start
+            self._finish()
+            raise
+        last[4] += time.perf_counter() - start
+        return row
+
+    def close(self):
+        if self._last is not None:
+            self._finish()
+        super().close()
+
+
+class TimedConnection(sqlite3.Connection):
+    """Соединение, все курсоры которого (в том числе из conn.execute) - TimedCursor"""
+
+    def cursor(self, factory=TimedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
@@ -0,0 +1,110 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import time
+from datetime import datetime
+from urllib.parse import quote
+
+from metrics import SNAPSHOT_REFRESH_SECONDS
+from query_stats import TimedConnection
+
+logger = logging.getLogger(__name__)
+
+# Сколько мс ждать, если бот в этот момент коммитит
+BUSY_TIMEOUT_MS = 5000
+
+
+class ReadSnapshot:
+    """
+    Снимок базы для выгрузок и отчетов - отдельный файл, скопированный backup API.
+
+    Долгое чтение основной базы (выгрузка в Excel, отчеты) держит разделяемую
+    блокировку все время формирования, и записи на сессии ждут ее снятия.
+    Копирование одним шагом backup занимает блокировку только на время копирования
+    страниц, дальше все чтение идет по снимку. Копия пишется во временный файл и
+    подменяет снимок через os.replace: открытые читатели дочитывают прежний файл.
+
+    Время снимка - mtime файла, поэтому снимок общий для бота и
+    past_events_manager. Снимок старше max_age секунд перед чтением обновляется.
+    """
+
+    def __init__(self, database_name, path=None, max_age=600.0, factory=TimedConnection):
+        self.database_name = database_name
+        self.path = path or f"{database_name}.snapshot"
+        self.max_age = max_age
+        # Класс соединений для читателей: TimedConnection пишет медленные запросы в лог бота
+        self.factory = factory
+        # Одно обновление за раз в пределах процесса
+        self._lock = asyncio.Lock()
+
+    @property
+    def taken_at(self):
+        """Время снимка или None, если снимка еще нет"""
+        try:
+            return datetime.fromtimestamp(os.stat(self.path).st_mtime)
+        except FileNotFoundError:
+            return None
+
+    def age(self):
+        """Возраст снимка в секундах (None - снимка нет)"""
+        try:
+            return time.time() - os.stat(self.path).st_mtime
+        except FileNotFoundError:
+            return None
+
+    def is_stale(self, max_age=None):
+        age = self.age()
+        return age is None or age > (self.max_age if max_age is None else max_age)
+
+    def refresh(self):
+        """Новый снимок. Блокирует поток на время копирования - из event loop только через to_thread"""
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        started = time.perf_counter()
+        # Отметка до начала чтения: данные в снимке не старше нее
+        taken_at = time.time()
+        source = sqlite3.connect(
+            f"file:{quote(self.database_name)}?mode=ro", uri=True, timeout=BUSY_TIMEOUT_MS / 1000
+        )
+        try:
+            target = sqlite3.connect(tmp_path)
+            try:
+                # pages=-1: один шаг, согласованная копия без перезапусков из-за записей бота
+                source.backup(target)
+                # Снимок только читается: без WAL, чтобы открывать его в режиме immutable
+                target.execute("PRAGMA journal_mode = DELETE")
+            finally:
+                target.close()
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        finally:
+            source.close()
+
+        os.utime(tmp_path, (taken_at, taken_at))
+        os.replace(tmp_path, self.path)
+        elapsed = time.perf_counter() - started
+        SNAPSHOT_REFRESH_SECONDS.observe(elapsed)
+        logger.info(f"Снимок базы обновлен за {elapsed * 1000:.0f} мс: {self.path}")
+        return datetime.fromtimestamp(taken_at)
+
+    def connect(self):
+        """Соединение со снимком: immutable - без блокировок и без проверки изменений файла"""
+        return sqlite3.connect(
+            f"file:{quote(self.path)}?immutable=1", uri=True, check_same_thread=False, factory=self.factory
+        )
+
+    def reader(self, max_age=None):
+        """(соединение, время снимка); устаревший снимок сначала обновляется"""
+        if self.is_stale(max_age):
+            self.refresh()
+        return self.connect(), self.taken_at
+
+    async def open_reader(self, max_age=None):
+        async with self._lock:
+            return await asyncio.to_thread(self.reader, max_age)
+
+    async def refresh_async(self):
+        async with self._lock:
+            return await asyncio.to_thread(self.refresh)
@@ -0,0 +1,82 @@
+import asyncio
+import logging
+
+from metrics import REGISTRATION_BATCH_SIZE
+
+logger = logging.getLogger(__name__)
+
+
+class RegistrationQueue:
+    """
+    Групповой коммит записей и отмен. Обработчики ставят запрос в очередь и ждут
+    future, единственный писатель раз в max_delay секунд (или сразу при max_batch
+    запросах) применяет накопленное одной транзакцией Database.apply_registrations.
+    При открытии записи узкое место - fsync на каждый коммит, а не процессор.
+
+    Писатель работает в event loop (соединение Database используется только из него)
+    и завершается, когда очередь пуста, - следующий запрос запускает его снова.
+    """
+
+    def __init__(self, db, max_batch=100, max_delay=0.005):
+        self.db = db
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        # (запрос, future)
+        self._pending = []
+        self._batch_ready = asyncio.Event()
+        self._writer = None
+
+    def submit(self, *request):
+        """
+        ("register", user_id, username, event_id) или ("unregister", user_id, event_id).
+        Future получает результат из Database.apply_registrations для этого запроса
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((request, future))
+        if self._writer is None:
+            self._writer = asyncio.create_task(self._drain(), name="registration-writer")
+        elif len(self._pending) >= self.max_batch:
+            self._batch_ready.set()
+        return future
+
+    async def register(self, user_id, username, event_id):
+        return await self.submit("register", user_id, username, event_id)
+
+    async def unregister(self, user_id, event_id):
+        return await self.submit("unregister", user_id, event_id)
+
+    async def _drain(self):
+        try:
+            while self._pending:
+                if len(self._pending) < self.max_batch:
+                    self._batch_ready.clear()
+                    try:
+                        await asyncio.wait_for(self._batch_ready.wait(), self.max_delay)
+                    except asyncio.TimeoutError:
+                        pass
+                batch = self._pending[:self.max_batch]
+                del self._pending[:self.max_batch]
+                self._apply(batch)
+        finally:
+            self._writer = None
+
+    def _apply(self, batch):
+        REGISTRATION_BATCH_SIZE.observe(len(batch))
+        try:
+            results = self.db.apply_registrations([request for request, _ in batch])
+        except Exception as e:
+            # Транзакция откатилась целиком - ошибка у каждого запроса пачки
+            logger.error(f"Ошибка группового коммита ({len(batch)} запросов): {str(e)}")
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    async def flush(self):
+        """Дожидается применения всего, что уже в очереди"""
+        while self._writer is not None:
+            self._batch_ready.set()
+            await asyncio.shield(self._writer)
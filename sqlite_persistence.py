@@ -0,0 +1,168 @@
+import asyncio
+import json
+import logging
+import pickle
+import sqlite3
+
+from telegram.ext import BasePersistence, PersistenceInput
+
+logger = logging.getLogger(__name__)
+
+
+class SQLitePersistence(BasePersistence):
+    """
+    Persistence в SQLite: по строке на пользователя/чат/состояние диалога.
+
+    В отличие от PicklePersistence не переписывает весь файл при каждом сохранении:
+    update_* только запоминают измененные записи, а запись в базу идет одной
+    транзакцией сразу после очередного прохода Application.update_persistence
+    (раз в update_interval секунд) и при остановке бота.
+    """
+
+    def __init__(self, filepath, update_interval=60):
+        super().__init__(
+            store_data=PersistenceInput(bot_data=True, chat_data=True, user_data=True, callback_data=False),
+            update_interval=update_interval
+        )
+        self.filepath = filepath
+        self._conn = None
+        # (kind, key) -> pickled data или None для удаления
+        self._dirty_data = {}
+        # (name, key) -> pickled state или None для удаления
+        self._dirty_conversations = {}
+        self._write_scheduled = False
+
+    @property
+    def conn(self):
+        # Соединение открывается при первом обращении, а не при импорте модуля
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.filepath)
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS persistence_data (
+                    kind TEXT NOT NULL,  -- user | chat | bot
+                    key INTEGER NOT NULL,
+                    data BLOB NOT NULL,
+                    PRIMARY KEY (kind, key)
+                )
+            ''')
+            self._conn.execute('''
+                CREATE TABLE IF NOT EXISTS persistence_conversations (
+                    name TEXT NOT NULL,
+                    key TEXT NOT NULL,  -- JSON-список (chat_id, user_id, ...)
+                    state BLOB NOT NULL,
+                    PRIMARY KEY (name, key)
+                )
+            ''')
+            self._conn.commit()
+        return self._conn
+
+    def _load(self, kind):
+        rows = self.conn.execute("SELECT key, data FROM persistence_data WHERE kind = ?", (kind,))
+        return {key: pickle.loads(data) for key, data in rows}
+
+    def _mark_dirty(self, storage, key, value):
+        storage[key] = None if value is None else pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if not self._write_scheduled:
+            # Все update_* одного прохода update_persistence выполняются в текущей итерации
+            # event loop, поэтому запись, отложенная через call_soon, попадет в один батч
+            self._write_scheduled = True
+            asyncio.get_running_loop().call_soon(self._write_pending)
+
+    def _write_pending(self):
+        self._write_scheduled = False
+        if not self._dirty_data and not self._dirty_conversations:
+            return
+
+        data, self._dirty_data = self._dirty_data, {}
+        conversations, self._dirty_conversations = self._dirty_conversations, {}
+        try:
+            with self.conn:
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO persistence_data (kind, key, data) VALUES (?, ?, ?)",
+                    [(kind, key, blob) for (kind, key), blob in data.items() if blob is not None]
+                )
+                self.conn.executemany(
+                    "DELETE FROM persistence_data WHERE kind = ? AND key = ?",
+                    [(kind, key) for (kind, key), blob in data.items() if blob is None]
+                )
+                self.conn.executemany(
+                    "INSERT OR REPLACE INTO persistence_conversations (name, key, state) VALUES (?, ?, ?)",
+                    [(name, key, blob) for (name, key), blob in conversations.items() if blob is not None]
+                )
+                self.conn.executemany(
+                    "DELETE FROM persistence_conversations WHERE name = ? AND key = ?",
+                    [(name, key) for (name, key), blob in conversations.items() if blob is None]
+                )
+        except sqlite3.Error as e:
+            logger.error(f"Ошибка записи persistence: {str(e)}", exc_info=True)
+            # Возвращаем записи, которые еще не успели измениться заново
+            for key, blob in data.items():
+                self._dirty_data.setdefault(key, blob)
+            for key, blob in conversations.items():
+                self._dirty_conversations.setdefault(key, blob)
+
+    async def get_user_data(self):
+        return self._load("user")
+
+    async def get_chat_data(self):
+        return self._load("chat")
+
+    async def get_bot_data(self):
+        return self._load("bot").get(0, {})
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name):
+        rows = self.conn.execute(
+            "SELECT key, state FROM persistence_conversations WHERE name = ?", (name,)
+        )
+        return {tuple(json.loads(key)): pickle.loads(state) for key, state in rows}
+
+    async def update_conversation(self, name, key, new_state):
+        self._mark_dirty(self._dirty_conversations, (name, json.dumps(list(key))), new_state)
+
+    async def update_user_data(self, user_id, data):
+        self._mark_dirty(self._dirty_data, ("user", user_id), data)
+
+    async def update_chat_data(self, chat_id, data):
+        self._mark_dirty(self._dirty_data, ("chat", chat_id), data)
+
+    async def update_bot_data(self, data):
+        self._mark_dirty(self._dirty_data, ("bot", 0), data)
+
+    async def update_callback_data(self, data):
+        pass
+
+    async def drop_user_data(self, user_id=None):
+        # Без user_id - сброс строк всех пользователей. Данные в памяти приложения этим
+        # не сбрасываются: см. drop_all_persistent_data в event_bot_main
+        if user_id is not None:
+            self._mark_dirty(self._dirty_data, ("user", user_id), None)
+            return
+        self._dirty_data = {k: v for k, v in self._dirty_data.items() if k[0] != "user"}
+        with self.conn:
+            self.conn.execute("DELETE FROM persistence_data WHERE kind = 'user'")
+
+    async def drop_chat_data(self, chat_id=None):
+        if chat_id is not None:
+            self._mark_dirty(self._dirty_data, ("chat", chat_id), None)
+            return
+        self._dirty_data = {k: v for k, v in self._dirty_data.items() if k[0] != "chat"}
+        with self.conn:
+            self.conn.execute("DELETE FROM persistence_data WHERE kind = 'chat'")
+
+    async def refresh_user_data(self, user_id, user_data):
+        pass
+
+    async def refresh_chat_data(self, chat_id, chat_data):
+        pass
+
+    async def refresh_bot_data(self, bot_data):
+        pass
+
+    async def flush(self):
+        self._write_pending()
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
@@ -0,0 +1,155 @@
+import contextvars
+import json
+import logging
+import random
+import time
+from contextlib import contextmanager
+
+from telegram import Update
+
+# Отдельный логгер: одна JSON-строка на обновление, файл настраивается в event_bot_main
+trace_logger = logging.getLogger("trace")
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+class Span:
+    """Время одного обновления: ожидание в очереди чата, обработчик, БД и Bot API"""
+
+    __slots__ = (
+        "trace_id", "update_id", "update_type", "chat_id", "user_id", "handler", "error",
+        "created", "started", "handler_seconds", "db_seconds", "db_calls",
+        "api_seconds", "api_calls", "api_endpoints",
+    )
+
+    def __init__(self, update: object):
+        self.trace_id = f"{random.getrandbits(64):016x}"
+        self.update_id = getattr(update, "update_id", None)
+        self.update_type = update_type(update)
+        chat = getattr(update, "effective_chat", None)
+        user = getattr(update, "effective_user", None)
+        self.chat_id = chat.id if chat else None
+        self.user_id = user.id if user else None
+        self.handler = None
+        self.error = None
+        self.created = time.perf_counter()
+        self.started = None
+        self.handler_seconds = 0.0
+        self.db_seconds = 0.0
+        self.db_calls = 0
+        self.api_seconds = 0.0
+        self.api_calls = 0
+        self.api_endpoints = {}
+
+    def to_dict(self, finished):
+        return {
+            "trace_id": self.trace_id,
+            "update_id": self.update_id,
+            "type": self.update_type,
+            "chat_id": self.chat_id,
+            "user_id": self.user_id,
+            "handler": self.handler,
+            "error": self.error,
+            "queued_ms": round((self.started - self.created) * 1000, 3),
+            "total_ms": round((finished - self.started) * 1000, 3),
+            "handler_ms": round(self.handler_seconds * 1000, 3),
+            "db_ms": round(self.db_seconds * 1000, 3),
+            "db_calls": self.db_calls,
+            "api_ms": round(self.api_seconds * 1000, 3),
+            "api_calls": self.api_calls,
+            "api_endpoints": self.api_endpoints,
+        }
+
+
+class Tracer:
+    """
+    Span создается на каждое обновление (ради trace_id в обычных логах), а JSON-запись
+    пишется только для доли sample_rate, а также для всех медленных (slow_ms) и упавших.
+    """
+
+    def __init__(self, enabled=True, sample_rate=0.1, slow_ms=1000.0):
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.slow_ms = slow_ms
+
+    def wrap(self, update: object, coroutine):
+        """Оборачивает корутину обработки обновления, пока оно еще ждет в очереди чата"""
+        if not self.enabled:
+            return coroutine
+        return self._traced(Span(update), coroutine)
+
+    async def _traced(self, span, coroutine):
+        span.started = time.perf_counter()
+        token = _current_span.set(span)
+        try:
+            await coroutine
+        except BaseException as e:
+            span.error = span.error or type(e).__name__
+            raise
+        finally:
+            _current_span.reset(token)
+            self._emit(span, time.perf_counter())
+
+    def _emit(self, span, finished):
+        slow = self.slow_ms is not None and (finished - span.started) * 1000 >= self.slow_ms
+        if span.error or slow or random.random() < self.sample_rate:
+            trace_logger.info(json.dumps(span.to_dict(finished), ensure_ascii=False))
+
+
+TRACER = Tracer()
+
+
+def update_type(update: object):
+    if not isinstance(update, Update):
+        return type(update).__name__
+    return next(
+        (name for name in ("callback_query", "message", "edited_message", "inline_query")
+         if getattr(update, name, None) is not None),
+        "other"
+    )
+
+
+def current_trace_id():
+    span = _current_span.get()
+    return span.trace_id if span else None
+
+
+@contextmanager
+def handler_span(name):
+    """Время обработчика (внешнего, вложенные вызовы учитываются в нем)"""
+    span = _current_span.get()
+    if span is None or span.handler is not None:
+        yield
+        return
+    span.handler = name
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception as e:
+        span.error = type(e).__name__
+        raise
+    finally:
+        span.handler_seconds += time.perf_counter() - start
+
+
+def record_db(elapsed, calls=1):
+    span = _current_span.get()
+    if span is not None:
+        span.db_seconds += elapsed
+        span.db_calls += calls
+
+
+def record_api(endpoint, elapsed):
+    span = _current_span.get()
+    if span is not None:
+        span.api_seconds += elapsed
+        span.api_calls += 1
+        span.api_endpoints[endpoint] = span.api_endpoints.get(endpoint, 0) + 1
+
+
+class TraceIdFilter(logging.Filter):
+    """Добавляет %(trace_id)s в записи обычных логов, чтобы их можно было связать с span"""
+
+    def filter(self, record):
+        record.trace_id = current_trace_id() or "-"
+        return True
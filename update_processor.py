@@ -0,0 +1,75 @@
+import logging
+from collections import deque
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """
+    Параллельная обработка обновлений с сохранением порядка внутри одного чата.
+
+    Обновления разных чатов обрабатываются одновременно (не больше max_concurrent_updates),
+    а обновления одного чата - строго по очереди. Иначе шаги ConversationHandler
+    (CREATE_MAX ... EXPORT_END_DATE) одного пользователя могли бы обгонять друг друга.
+    """
+
+    def __init__(self, max_concurrent_updates: int, tracer=None, recorder=None):
+        super().__init__(max_concurrent_updates)
+        # Tracer оборачивает корутину до постановки в очередь, чтобы учесть время ожидания
+        self.tracer = tracer
+        # UpdateRecorder фиксирует момент прихода обновления, до очереди чата и антифлуда
+        self.recorder = recorder
+        # chat_id -> очередь корутин, ожидающих обработки
+        self._pending = {}
+
+    @staticmethod
+    def ordering_key(update: object):
+        if not isinstance(update, Update):
+            return None
+        if update.effective_chat:
+            return update.effective_chat.id
+        if update.effective_user:
+            return update.effective_user.id
+        return None
+
+    async def do_process_update(self, update: object, coroutine) -> None:
+        if self.recorder is not None:
+            self.recorder.record(update)
+        if self.tracer is not None:
+            coroutine = self.tracer.wrap(update, coroutine)
+
+        key = self.ordering_key(update)
+        if key is None:
+            await coroutine
+            return
+
+        queue = self._pending.get(key)
+        if queue is not None:
+            # Чат уже обрабатывается: ставим в очередь и сразу освобождаем слот,
+            # обновление выполнит задача, которая сейчас обслуживает этот чат
+            queue.append(coroutine)
+            return
+
+        queue = self._pending[key] = deque([coroutine])
+        try:
+            while queue:
+                try:
+                    await queue[0]
+                except Exception as e:
+                    logger.error(f"Ошибка обработки обновления чата {key}: {str(e)}", exc_info=True)
+                finally:
+                    queue.popleft()
+        finally:
+            # При отмене задачи оставшиеся корутины уже не будут выполнены
+            for pending in queue:
+                pending.close()
+            del self._pending[key]
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
@@ -0,0 +1,166 @@
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import os
+import queue
+import re
+import secrets
+import threading
+import time
+from datetime import datetime
+
+from telegram import Update
+
+from callback_router import pack, unpack
+
+logger = logging.getLogger(__name__)
+
+TRACE_VERSION = 1
+
+# Строковые поля с персональными данными
+NAME_FIELDS = {"first_name", "last_name", "username", "title", "bio", "phone_number"}
+TEXT_FIELDS = {"text", "caption", "query"}  # query - текст inline-запроса
+# Ответы на шаги диалогов (числа, даты, время) сохраняются как есть - без них не воспроизвести сценарий
+SAFE_TEXT = re.compile(r"[\d\s.:,\-]{1,16}")
+
+
+class Anonymizer:
+    """
+    Заменяет id пользователей и чатов на псевдонимы (HMAC с солью записи, поэтому
+    один и тот же пользователь внутри записи остается одним и тем же), имена - на
+    заглушки, свободный текст - на 'x' той же длины. Команды, callback_data и ответы
+    из цифр сохраняются. Администраторы получают id 1..N, чтобы при воспроизведении
+    их можно было назначить администраторами.
+    """
+
+    def __init__(self, salt: bytes, admin_ids=(), user_id_callbacks=()):
+        self.salt = salt
+        self.admin_map = {admin_id: index for index, admin_id in enumerate(sorted(admin_ids), start=1)}
+        # Префиксы callback_data, в которых число - это id пользователя
+        self.user_id_callbacks = set(user_id_callbacks)
+
+    def pseudonym(self, value: int) -> int:
+        if value in self.admin_map:
+            return self.admin_map[value]
+        digest = hmac.new(self.salt, str(abs(value)).encode(), hashlib.sha256).digest()
+        # Не пересекается с id администраторов и сохраняет знак (группы < 0)
+        result = 1000 + int.from_bytes(digest[:5], "big")
+        return -result if value < 0 else result
+
+    @staticmethod
+    def mask_text(value: str) -> str:
+        if value.startswith("/"):
+            command, _, rest = value.partition(" ")
+            return command + (" " + re.sub(r"\w", "x", rest) if rest else "")
+        if SAFE_TEXT.fullmatch(value):
+            return value
+        return re.sub(r"\w", "x", value)
+
+    def callback_data(self, value: str) -> str:
+        prefix, values = unpack(value)
+        if prefix in self.user_id_callbacks and values:
+            return pack(prefix, *(self.pseudonym(v) for v in values))
+        return value
+
+    def anonymize(self, data, key=None):
+        if isinstance(data, dict):
+            # User и Chat: есть id и имя/тип. У бота id оставляем
+            is_person = "id" in data and ("first_name" in data or "type" in data) and not data.get("is_bot")
+            result = {}
+            for field, value in data.items():
+                if (is_person and field == "id") or field == "user_id":
+                    result[field] = self.pseudonym(value)
+                elif field == "username" and is_person:
+                    result[field] = f"user{self.pseudonym(data['id'])}"
+                elif field in NAME_FIELDS and isinstance(value, str) and not data.get("is_bot"):
+                    result[field] = "User"
+                elif field in TEXT_FIELDS and isinstance(value, str):
+                    result[field] = self.mask_text(value)
+                elif field == "callback_data" or (field == "data" and key == "callback_query"):
+                    result[field] = self.callback_data(value)
+                else:
+                    result[field] = self.anonymize(value, field)
+            return result
+        if isinstance(data, list):
+            return [self.anonymize(item, key) for item in data]
+        return data
+
+
+class UpdateRecorder:
+    """
+    Запись входящих обновлений (обезличенных) с временем прихода в gzip JSONL.
+    Первая строка - заголовок записи, далее {"t": unix time, "update": {...}}.
+    Сжатие и запись в файл - в отдельном потоке, в event loop только json.dumps.
+    """
+
+    def __init__(self, directory="recordings", salt=None, admin_ids=(), user_id_callbacks=()):
+        self.directory = directory
+        salt = salt.encode() if isinstance(salt, str) and salt else secrets.token_bytes(16)
+        self.admin_ids = sorted(admin_ids)
+        self.anonymizer = Anonymizer(salt, admin_ids, user_id_callbacks)
+        self.path = None
+        self.recorded = 0
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+
+    def start(self):
+        os.makedirs(self.directory, exist_ok=True)
+        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+        self.path = os.path.join(self.directory, f"traffic_{timestamp}.jsonl.gz")
+        self._queue.put(json.dumps({
+            "trace_version": TRACE_VERSION,
+            "started_at": time.time(),
+            "admin_ids": list(range(1, len(self.admin_ids) + 1)),
+        }))
+        self._thread = threading.Thread(target=self._write, name="update-recorder", daemon=True)
+        self._thread.start()
+        logger.info(f"Запись обновлений в {self.path}")
+
+    def record(self, update: object):
+        if self._thread is None or not isinstance(update, Update):
+            return
+        try:
+            data = self.anonymizer.anonymize(update.to_dict())
+            self._queue.put(json.dumps({"t": time.time(), "update": data}, ensure_ascii=False))
+            self.recorded += 1
+        except Exception as e:
+            logger.warning(f"Не удалось записать обновление {getattr(update, 'update_id', None)}: {str(e)}")
+
+    def _write(self):
+        with gzip.open(self.path, "at", encoding="utf-8") as f:
+            while True:
+                line = self._queue.get()
+                if line is None:
+                    break
+                f.write(line)
+                f.write("\n")
+                # Сбрасываем буфер gzip, когда очередь опустела, чтобы запись не терялась при падении
+                if self._queue.empty():
+                    f.flush()
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._queue.put(None)
+        self._thread.join(timeout=10)
+        self._thread = None
+        logger.info(f"Запись обновлений остановлена: {self.recorded} обновлений в {self.path}")
+
+
+def read_trace(path):
+    """(заголовок, итератор записей) из файла UpdateRecorder"""
+    f = gzip.open(path, "rt", encoding="utf-8")
+    header = json.loads(f.readline())
+    if header.get("trace_version") != TRACE_VERSION:
+        f.close()
+        raise ValueError(f"Неподдерживаемая версия записи: {header.get('trace_version')}")
+
+    def records():
+        with f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    return header, records()